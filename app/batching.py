@@ -0,0 +1,162 @@
+# app/batching.py
+"""
+Micro-batching des appels au modèle : les requêtes /predict qui arrivent en
+même temps (dans une fenêtre de quelques millisecondes) sont regroupées en un
+seul appel au modèle, puis chaque requête récupère son propre score.
+"""
+import bisect
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class _Histogram:
+    """Histogramme cumulatif minimal (bornes fixes) avec somme et maximum."""
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def snapshot(self) -> dict:
+        labels = [f"<={bound:g}" for bound in self.bounds] + [f">{self.bounds[-1]:g}"]
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class MicroBatcherStopped(RuntimeError):
+    """Le micro-batcher est arrêté : plus aucun thread ne consommera la ligne."""
+
+
+class MicroBatcher:
+    """
+    Regroupe les lignes soumises par plusieurs threads : un thread de fond
+    attend la première ligne, collecte les suivantes pendant au plus
+    'max_wait_ms' (ou jusqu'à 'max_batch_size' lignes), appelle 'predict_fn'
+    une seule fois sur la matrice empilée et distribue les résultats.
+    'batch_size_observer' et 'queue_delay_observer' (optionnels) reçoivent la
+    taille de chaque lot et l'attente de chaque ligne en secondes (/metrics).
+    """
+
+    def __init__(self, predict_fn, max_batch_size: int = 64, max_wait_ms: float = 2.0,
+                 batch_size_observer=None, queue_delay_observer=None):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = _Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256])
+        self._queue_delay_ms = _Histogram([0.5, 1, 2, 5, 10, 20, 50, 100])
+        self.batch_size_observer = batch_size_observer
+        self.queue_delay_observer = queue_delay_observer
+        self._running = True
+        self._stopped = False
+        self._submit_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, row: np.ndarray) -> Future:
+        """Soumet une ligne (déjà alignée sur le modèle) ; retourne un Future du score."""
+        future = Future()
+        with self._submit_lock:
+            if self._stopped:
+                raise MicroBatcherStopped("Micro-batcher arrêté.")
+            self._queue.put((row, future, time.perf_counter()))
+        return future
+
+    def predict(self, row: np.ndarray, timeout: float = None) -> float:
+        return self.submit(row).result(timeout=timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._running = False
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while self._running:
+            batch = self._collect()
+            if not batch:
+                break
+            started = time.perf_counter()
+            delays = [started - submitted for _, _, submitted in batch]
+            with self._lock:
+                self._batch_sizes.observe(len(batch))
+                for delay in delays:
+                    self._queue_delay_ms.observe(delay * 1000.0)
+            if self.batch_size_observer is not None:
+                self.batch_size_observer(len(batch))
+            if self.queue_delay_observer is not None:
+                for delay in delays:
+                    self.queue_delay_observer(delay)
+
+            try:
+                scores = self.predict_fn(np.vstack([row for row, _, _ in batch]))
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), score in zip(batch, scores):
+                future.set_result(float(score))
+
+    def stop(self):
+        """
+        Arrête le thread de fond après le traitement des lignes déjà soumises.
+        Les soumissions suivantes lèvent MicroBatcherStopped ; si le thread ne
+        s'est pas terminé à temps, les lignes restées dans la file échouent
+        plutôt que d'attendre indéfiniment.
+        """
+        with self._submit_lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._queue.put(None)
+        self._worker.join(timeout=5)
+        if not self._worker.is_alive():
+            self._fail_pending()
+
+    def _fail_pending(self):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                item[1].set_exception(MicroBatcherStopped("Micro-batcher arrêté avant le traitement de la ligne."))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "pending": self._queue.qsize(),
+                "batch_size": self._batch_sizes.snapshot(),
+                "queue_delay_ms": self._queue_delay_ms.snapshot(),
+            }
@@ -0,0 +1,97 @@
+# app/cache.py
+"""
+Cache LRU borné en nombre d'entrées et en mémoire, avec expiration (TTL).
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_size(value) -> int:
+    """Estimation (en octets) de la taille d'une valeur mise en cache."""
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        return int(nbytes)
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        size += sum(sys.getsizeof(item) for item in value)
+    return size
+
+
+class LRUCache:
+    """
+    Cache thread-safe : les entrées les moins récemment utilisées sont évincées
+    dès que 'max_entries' ou 'max_bytes' est dépassé, et une entrée plus vieille
+    que 'ttl' secondes est considérée comme absente.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = None, ttl: float = None,
+                 sizeof=estimate_size, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sizeof = sizeof
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return default
+            value, size, expires_at = entry
+            if expires_at is not None and self._clock() >= expires_at:
+                del self._entries[key]
+                self._bytes -= size
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expires_at = self._clock() + self.ttl if self.ttl else None
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        """Vide le cache (comptabilisé comme une invalidation)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._stats["invalidations"] += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["max_bytes"] = self.max_bytes
+        stats["ttl"] = self.ttl
+        return stats
@@ -0,0 +1,103 @@
+# app/concurrency.py
+"""
+Limitation de concurrence par endpoint.
+
+Chaque groupe d'endpoints (prédiction, explications SHAP, lots) dispose de son
+propre pool de threads : un afflux de calculs SHAP, coûteux, ne peut plus
+occuper les threads dont /predict a besoin. Au-delà du pool, les requêtes
+attendent dans une file bornée ; elles sont rejetées tout de suite si la file
+est pleine (429), ou au moment d'être servies si elles ont attendu plus que
+le délai prévu (503) : le client a probablement déjà abandonné, inutile de
+calculer pour rien. Les deux réponses portent un en-tête Retry-After.
+"""
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Overloaded(Exception):
+    """Requête rejetée par un limiteur (file pleine ou délai d'attente dépassé)."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class EndpointLimiter:
+    """
+    Pool de 'max_concurrency' threads précédé d'une file de 'max_queue'
+    requêtes au plus, chacune pouvant attendre 'max_wait_ms' avant d'être
+    abandonnée.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, max_wait_ms: float):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait_ms / 1000.0
+        self._executor = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix=f"{name}-worker")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        # Durée moyenne (lissée) d'une requête, pour estimer Retry-After
+        self._service_time = 0.0
+        self._stats = {"completed": 0, "shed_queue_full": 0, "shed_deadline": 0}
+
+    def _retry_after(self) -> int:
+        """Temps estimé (en secondes, au moins 1) pour écouler la file actuelle."""
+        backlog = (self._queued + self._running) / self.max_concurrency
+        return max(1, math.ceil(backlog * self._service_time))
+
+    async def run(self, fn, *args):
+        """Exécute fn(*args) dans le pool de l'endpoint, ou lève Overloaded."""
+        with self._lock:
+            if self._queued + self._running >= self.max_concurrency + self.max_queue:
+                self._stats["shed_queue_full"] += 1
+                raise Overloaded(429, f"Trop de requêtes en attente sur '{self.name}'.", self._retry_after())
+            self._queued += 1
+        deadline = time.monotonic() + self.max_wait
+        future = self._executor.submit(self._call, fn, args, deadline)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Client parti avant d'être servi : la requête quitte la file
+            if future.cancel():
+                with self._lock:
+                    self._queued -= 1
+            raise
+
+    def _call(self, fn, args, deadline: float):
+        started = time.monotonic()
+        with self._lock:
+            self._queued -= 1
+            if started > deadline:
+                self._stats["shed_deadline"] += 1
+                raise Overloaded(503, f"Délai d'attente dépassé sur '{self.name}'.", self._retry_after())
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._running -= 1
+                self._stats["completed"] += 1
+                self._service_time = elapsed if not self._service_time else 0.9 * self._service_time + 0.1 * elapsed
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queued": self._queued,
+                "running": self._running,
+                "mean_service_ms": self._service_time * 1000.0,
+                **self._stats,
+            }
@@ -0,0 +1,161 @@
+# app/config.py
+"""
+Paramètres de réglage de l'API, lus depuis les variables d'environnement.
+Les valeurs par défaut conviennent à un déploiement Docker standard.
+"""
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# --- Emplacement des artefacts ---
+# Vides : model/model.pkl et le dossier data/ du projet (base, journaux, magasins)
+MODEL_PATH = os.getenv("MODEL_PATH", "")
+DATA_DIR = os.getenv("DATA_DIR", "")
+
+# --- Feature store ---
+# 'sqlite' : lecture ligne à ligne dans la base
+# 'array'  : table chargée au démarrage dans une matrice float32 (mmap)
+# 'vectors': table de service construite par scripts/build_feature_vectors.py
+#            (un BLOB float32 par client, ordonné comme le modèle)
+FEATURE_STORE_BACKEND = os.getenv("FEATURE_STORE_BACKEND", "sqlite").strip().lower()
+# Répertoire où persister la matrice du backend 'array' (vide = data/feature_store_array)
+FEATURE_STORE_ARRAY_DIR = os.getenv("FEATURE_STORE_ARRAY_DIR", "")
+# Base de la table de service du backend 'vectors' (vide = data/feature_vectors.db)
+FEATURE_STORE_VECTORS_PATH = os.getenv("FEATURE_STORE_VECTORS_PATH", "")
+# Nombre maximal de connexions ouvertes simultanément sur la base
+FEATURE_STORE_POOL_SIZE = _env_int("FEATURE_STORE_POOL_SIZE", 8)
+# Taille de la zone mmap utilisée par SQLite (en octets)
+FEATURE_STORE_MMAP_SIZE = _env_int("FEATURE_STORE_MMAP_SIZE", 256 * 1024 * 1024)
+# Taille du cache de pages SQLite par connexion (en Ko)
+FEATURE_STORE_CACHE_SIZE_KB = _env_int("FEATURE_STORE_CACHE_SIZE_KB", 64 * 1024)
+# 'immutable=1' : SQLite ne vérifie plus les verrous ni les modifications du fichier
+FEATURE_STORE_IMMUTABLE = _env_bool("FEATURE_STORE_IMMUTABLE", True)
+
+# --- Cache des lignes clients (devant le feature store SQLite) ---
+# 0 désactive le cache
+FEATURE_CACHE_MAX_ENTRIES = _env_int("FEATURE_CACHE_MAX_ENTRIES", 10000)
+FEATURE_CACHE_MAX_BYTES = _env_int("FEATURE_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+FEATURE_CACHE_TTL_SECONDS = _env_int("FEATURE_CACHE_TTL_SECONDS", 600)
+# Intervalle minimal (en secondes) entre deux vérifications du fichier de base
+FEATURE_CACHE_CHECK_INTERVAL = _env_int("FEATURE_CACHE_CHECK_INTERVAL", 1)
+
+# --- Scoring par lot (/predict_batch) ---
+# Nombre maximal de demandes acceptées dans un lot
+PREDICT_BATCH_MAX_SIZE = _env_int("PREDICT_BATCH_MAX_SIZE", 10000)
+# Taille des paquets traités d'un coup (lecture des lignes + predict)
+PREDICT_BATCH_CHUNK_SIZE = _env_int("PREDICT_BATCH_CHUNK_SIZE", 1000)
+
+# --- Micro-batching des appels /predict concurrents (désactivé par défaut) ---
+MICRO_BATCHING_ENABLED = _env_bool("MICRO_BATCHING_ENABLED", False)
+MICRO_BATCH_MAX_SIZE = _env_int("MICRO_BATCH_MAX_SIZE", 64)
+# Attente maximale (en ms) pour compléter un lot après la première requête
+MICRO_BATCH_MAX_WAIT_MS = _env_float("MICRO_BATCH_MAX_WAIT_MS", 2.0)
+# Attente maximale (en s) du score d'une requête micro-batchée (503 au-delà)
+MICRO_BATCH_TIMEOUT_SECONDS = _env_float("MICRO_BATCH_TIMEOUT_SECONDS", 10.0)
+
+# --- Moteur d'inférence ---
+# 'lightgbm' : booster LightGBM standard
+# 'numpy'    : arbres compilés en tableaux NumPy au démarrage (app/tree_engine.py),
+#              environ 2 à 3 fois plus lent que LightGBM : à réserver aux essais
+INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "lightgbm").strip().lower()
+
+# --- Journal des prédictions (écriture en arrière-plan) ---
+PREDICTION_LOG_CSV = _env_bool("PREDICTION_LOG_CSV", True)
+PREDICTION_LOG_SEGMENTS = _env_bool("PREDICTION_LOG_SEGMENTS", True)
+PREDICTION_LOG_QUEUE_SIZE = _env_int("PREDICTION_LOG_QUEUE_SIZE", 10000)
+# Écriture dès N lignes en attente, ou au plus tard après N secondes
+PREDICTION_LOG_FLUSH_ROWS = _env_int("PREDICTION_LOG_FLUSH_ROWS", 500)
+PREDICTION_LOG_FLUSH_INTERVAL = _env_float("PREDICTION_LOG_FLUSH_INTERVAL", 1.0)
+# Nouveau segment Parquet après N lignes ou N secondes
+PREDICTION_LOG_SEGMENT_ROWS = _env_int("PREDICTION_LOG_SEGMENT_ROWS", 100000)
+PREDICTION_LOG_SEGMENT_SECONDS = _env_int("PREDICTION_LOG_SEGMENT_SECONDS", 3600)
+# File pleine : 'block' (attendre), 'drop' (ignorer) ou 'sample' (garder une fraction)
+PREDICTION_LOG_BACKPRESSURE = os.getenv("PREDICTION_LOG_BACKPRESSURE", "block").strip().lower()
+PREDICTION_LOG_SAMPLE_RATE = _env_float("PREDICTION_LOG_SAMPLE_RATE", 0.1)
+
+# --- Explications SHAP ---
+# 'shap'     : shap.TreeExplainer
+# 'lightgbm' : contributions natives du booster (pred_contrib), sans importer 'shap'
+EXPLAINER_BACKEND = os.getenv("EXPLAINER_BACKEND", "shap").strip().lower()
+# Nombre maximal de clients par appel à /shap_explanation_batch
+SHAP_BATCH_MAX_SIZE = _env_int("SHAP_BATCH_MAX_SIZE", 1000)
+# Cache des réponses
+SHAP_CACHE_MAX_ENTRIES = _env_int("SHAP_CACHE_MAX_ENTRIES", 2000)
+SHAP_CACHE_MAX_BYTES = _env_int("SHAP_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+SHAP_CACHE_TTL_SECONDS = _env_int("SHAP_CACHE_TTL_SECONDS", 3600)
+# Créer l'explainer juste après la mise en service plutôt qu'à la première explication
+EXPLAINER_PRELOAD = _env_bool("EXPLAINER_PRELOAD", False)
+
+# --- Démarrage ---
+# Chargement du modèle en arrière-plan : uvicorn ouvre le port sans attendre
+STARTUP_BACKGROUND_LOADING = _env_bool("STARTUP_BACKGROUND_LOADING", True)
+# Attente maximale (en secondes) d'une requête arrivée pendant le chargement
+STARTUP_REQUEST_TIMEOUT = _env_float("STARTUP_REQUEST_TIMEOUT", 30.0)
+
+# --- Service multi-processus (python -m app.serve --workers N) ---
+# Répertoire des artefacts préparés une fois par le processus parent (matrice des
+# features, arbres compilés) ; les workers s'y attachent en lecture seule (mmap)
+SHARED_ARTIFACTS_DIR = os.getenv("SHARED_ARTIFACTS_DIR", "")
+
+# --- Instrumentation ---
+# Métriques Prometheus (/metrics) : durées par route et par étape, erreurs, requêtes en cours
+METRICS_ENABLED = _env_bool("METRICS_ENABLED", True)
+# Autorise le profileur par échantillonnage (/profiler/start, /profiler/stop)
+PROFILER_ENABLED = _env_bool("PROFILER_ENABLED", False)
+PROFILER_INTERVAL_MS = _env_float("PROFILER_INTERVAL_MS", 5.0)
+
+# --- Limites de concurrence par endpoint ---
+# Chaque groupe a son pool de threads ; au-delà, une file bornée. Une requête est
+# rejetée (429) si la file est pleine, ou (503) si elle a attendu plus de N ms.
+CONCURRENCY_LIMITS_ENABLED = _env_bool("CONCURRENCY_LIMITS_ENABLED", True)
+PREDICT_MAX_CONCURRENCY = _env_int("PREDICT_MAX_CONCURRENCY", os.cpu_count() or 4)
+PREDICT_MAX_QUEUE = _env_int("PREDICT_MAX_QUEUE", 128)
+PREDICT_MAX_WAIT_MS = _env_float("PREDICT_MAX_WAIT_MS", 1000.0)
+# Explications SHAP (/shap_explanation, /shap_explanation_batch) : calculs lourds
+SHAP_MAX_CONCURRENCY = _env_int("SHAP_MAX_CONCURRENCY", 2)
+SHAP_MAX_QUEUE = _env_int("SHAP_MAX_QUEUE", 16)
+SHAP_MAX_WAIT_MS = _env_float("SHAP_MAX_WAIT_MS", 5000.0)
+# Scoring par lot (/predict_batch)
+BATCH_MAX_CONCURRENCY = _env_int("BATCH_MAX_CONCURRENCY", 2)
+BATCH_MAX_QUEUE = _env_int("BATCH_MAX_QUEUE", 8)
+BATCH_MAX_WAIT_MS = _env_float("BATCH_MAX_WAIT_MS", 10000.0)
+
+# --- Registre des modèles (rechargement à chaud, POST /model/reload) ---
+# Version enregistrée avec chaque prédiction ; vide : dérivée du fichier et de l'empreinte du modèle
+MODEL_VERSION = os.getenv("MODEL_VERSION", "")
+# Délai avant de fermer l'ancien modèle après un échange (requêtes en cours)
+MODEL_SWAP_GRACE_SECONDS = _env_float("MODEL_SWAP_GRACE_SECONDS", 30.0)
+# Nombre de features du modèle absentes du feature store au-delà duquel un rechargement est refusé
+MODEL_MAX_MISSING_FEATURES = _env_int("MODEL_MAX_MISSING_FEATURES", 0)
+
+# --- Suivi de la dérive en ligne (GET /drift) ---
+# Histogrammes des lignes scorées, comparés au profil de référence
+# (monitoring/build_reference_profile.py) ; inactif si le profil est absent
+DRIFT_ENABLED = _env_bool("DRIFT_ENABLED", True)
+# Profil de référence (vide = data/drift_reference.json)
+DRIFT_PROFILE_PATH = os.getenv("DRIFT_PROFILE_PATH", "")
+# Durée d'une tranche d'histogrammes et durée de conservation (en secondes)
+DRIFT_BUCKET_SECONDS = _env_int("DRIFT_BUCKET_SECONDS", 300)
+DRIFT_RETENTION_SECONDS = _env_int("DRIFT_RETENTION_SECONDS", 86400)
+# Fenêtre par défaut de GET /drift (en secondes)
+DRIFT_WINDOW_SECONDS = _env_int("DRIFT_WINDOW_SECONDS", 3600)
+# PSI au-delà duquel une feature est signalée en dérive
+DRIFT_PSI_THRESHOLD = _env_float("DRIFT_PSI_THRESHOLD", 0.2)
+# Lignes minimales dans la fenêtre pour que les scores soient jugés fiables
+DRIFT_MIN_ROWS = _env_int("DRIFT_MIN_ROWS", 200)
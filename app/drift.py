@@ -0,0 +1,441 @@
+# app/drift.py
+"""
+Suivi de la dérive des données au fil des prédictions.
+
+Un profil de référence, calculé une fois sur les données d'entraînement
+(monitoring/build_reference_profile.py), fixe pour chaque feature des
+intervalles (quantiles de la référence), la répartition de la référence dans
+ces intervalles et son taux de valeurs manquantes, ainsi que la distribution
+des scores du modèle.
+
+L'API range chaque ligne scorée dans des histogrammes de mêmes intervalles,
+cumulés par tranches de temps : une comparaison avec les seuils et une
+addition par requête. GET /drift additionne les tranches de la fenêtre
+demandée et calcule, par feature et pour le score, le PSI (Population
+Stability Index) et la statistique de Kolmogorov-Smirnov sur les intervalles.
+
+Les scores dépendent du modèle : leurs histogrammes sont tenus par empreinte
+de modèle, et ne sont comparés à la référence que pour le modèle qui l'a
+scorée (empreinte enregistrée dans le profil).
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+PROFILE_VERSION = 1
+# Proportion plancher d'un intervalle vide dans le calcul du PSI
+PSI_EPSILON = 1e-4
+# Distribution des scores : intervalles fixes de largeur 0,05 sur [0, 1]
+SCORE_EDGES = np.linspace(0.0, 1.0, 21)[1:-1]
+
+
+def column_profile(values, n_bins: int = 10):
+    """
+    Intervalles d'une colonne de référence (seuils intérieurs, aux quantiles
+    des valeurs présentes ; les seuils confondus, fréquents pour les features
+    discrètes, sont fusionnés), effectif de chaque intervalle et nombre de
+    valeurs manquantes.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(values)
+    present = values[~missing]
+    finite = present[np.isfinite(present)]
+    if len(finite):
+        edges = np.unique(np.quantile(finite, np.linspace(0.0, 1.0, n_bins + 1)[1:-1]))
+    else:
+        edges = np.empty(0)
+    counts = np.bincount(np.searchsorted(edges, present, side="right"), minlength=len(edges) + 1)
+    return edges, counts, int(missing.sum())
+
+
+def psi(reference: np.ndarray, current: np.ndarray) -> np.ndarray:
+    """PSI ligne par ligne entre deux matrices de proportions (même forme)."""
+    p = np.maximum(reference, PSI_EPSILON)
+    q = np.maximum(current, PSI_EPSILON)
+    return np.sum((q - p) * np.log(q / p), axis=-1)
+
+
+def ks(reference: np.ndarray, current: np.ndarray) -> np.ndarray:
+    """Écart maximal entre fonctions de répartition, calculé sur les intervalles."""
+    ref_total = reference.sum(axis=-1, keepdims=True)
+    cur_total = current.sum(axis=-1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ref_cdf = np.cumsum(reference, axis=-1) / ref_total
+        cur_cdf = np.cumsum(current, axis=-1) / cur_total
+    return np.max(np.abs(ref_cdf - cur_cdf), axis=-1)
+
+
+def _proportions(counts: np.ndarray) -> np.ndarray:
+    return counts / np.maximum(counts.sum(axis=-1, keepdims=True), 1)
+
+
+def _number(value):
+    """Flottant JSON (None pour une valeur non définie)."""
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+class ReferenceProfile:
+    """
+    Profil de référence : par feature, seuils intérieurs des intervalles et
+    matrice des effectifs (une ligne par feature, une colonne par intervalle,
+    la dernière pour les valeurs manquantes), plus l'histogramme des scores.
+    """
+
+    def __init__(self, features, edges, counts, score_counts=None, metadata: dict = None):
+        self.features = list(features)
+        self.edges = [np.asarray(e, dtype=np.float64) for e in edges]
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.score_counts = None if score_counts is None else np.asarray(score_counts, dtype=np.int64)
+        self.metadata = dict(metadata or {})
+
+        # Seuils complétés par +inf : une seule comparaison vectorisée donne
+        # l'intervalle de chaque feature d'une ligne
+        width = max((len(e) for e in self.edges), default=0)
+        self.padded_edges = np.full((len(self.features), width), np.inf)
+        for i, e in enumerate(self.edges):
+            self.padded_edges[i, :len(e)] = e
+        self.last_bin = np.array([len(e) for e in self.edges], dtype=np.intp)
+        self.missing_bin = self.counts.shape[1] - 1
+
+    @classmethod
+    def from_columns(cls, columns: dict, n_bins: int = 10, scores=None, metadata: dict = None):
+        """Profil de colonnes complètes {nom: valeurs} (et des scores de la référence)."""
+        profiles = [column_profile(values, n_bins) for values in columns.values()]
+        return cls.from_column_profiles(list(columns), profiles, scores, metadata)
+
+    @classmethod
+    def from_column_profiles(cls, features, profiles, scores=None, metadata: dict = None):
+        """Assemble des résultats de column_profile (calculés séparément, éventuellement en parallèle)."""
+        width = max((len(edges) + 1 for edges, _, _ in profiles), default=1)
+        counts = np.zeros((len(profiles), width + 1), dtype=np.int64)
+        for i, (edges, bin_counts, missing) in enumerate(profiles):
+            counts[i, :len(bin_counts)] = bin_counts
+            counts[i, -1] = missing
+        score_counts = None if scores is None else cls.score_histogram(scores)
+        metadata = dict(metadata or {})
+        metadata.setdefault("created_at", datetime.now(timezone.utc).isoformat(timespec="seconds"))
+        metadata.setdefault("rows", int(counts[0].sum()) if len(counts) else 0)
+        return cls(features, [edges for edges, _, _ in profiles], counts, score_counts, metadata)
+
+    # --- Répartition de nouvelles lignes ---
+
+    def bin_index(self, values: np.ndarray) -> np.ndarray:
+        """Intervalle de chaque valeur d'une matrice (lignes x features du profil)."""
+        values = np.atleast_2d(values)
+        if values.shape[0] == 1:
+            index = (values[0][:, None] >= self.padded_edges).sum(axis=1)[None, :]
+            index = np.minimum(index, self.last_bin)  # +inf
+        else:
+            index = np.empty(values.shape, dtype=np.intp)
+            for j, edges in enumerate(self.edges):
+                index[:, j] = np.searchsorted(edges, values[:, j], side="right")
+        index[np.isnan(values)] = self.missing_bin
+        return index
+
+    def histogram(self, values: np.ndarray) -> np.ndarray:
+        """Effectifs de nouvelles lignes, même forme que 'counts'."""
+        return self.count_bins(self.bin_index(values))
+
+    def count_bins(self, index: np.ndarray) -> np.ndarray:
+        """Effectifs à partir des intervalles déjà calculés par bin_index."""
+        offsets = np.arange(len(self.features), dtype=np.intp) * self.counts.shape[1]
+        flat = np.bincount((index + offsets).ravel(), minlength=self.counts.size)
+        return flat.reshape(self.counts.shape)
+
+    @staticmethod
+    def score_histogram(scores) -> np.ndarray:
+        """Effectifs des scores dans les intervalles fixes SCORE_EDGES."""
+        scores = np.asarray(scores, dtype=np.float64)
+        return np.bincount(np.searchsorted(SCORE_EDGES, scores, side="right"), minlength=len(SCORE_EDGES) + 1)
+
+    # --- Comparaison ---
+
+    def compare(self, counts: np.ndarray, score_counts: np.ndarray = None, psi_threshold: float = 0.2,
+                top: int = None, compare_scores: bool = True) -> dict:
+        """
+        Scores de dérive d'effectifs courants par rapport à la référence. Les
+        features sont triées par PSI décroissant ('top' premières seulement).
+        Sans 'compare_scores' (scores d'un autre modèle que celui de la
+        référence), seul l'histogramme des scores est rendu.
+        """
+        counts = np.asarray(counts, dtype=np.float64)
+        reference = self.counts.astype(np.float64)
+        feature_psi = psi(_proportions(reference), _proportions(counts))
+        feature_ks = ks(reference[:, :-1], counts[:, :-1])
+        rows = counts.sum(axis=1)
+        null_rate = counts[:, -1] / np.maximum(rows, 1)
+        reference_null_rate = reference[:, -1] / np.maximum(reference.sum(axis=1), 1)
+        drifted = feature_psi >= psi_threshold
+
+        order = np.argsort(-feature_psi, kind="stable")
+        if top:
+            order = order[:top]
+        features = [{
+            "feature": self.features[i],
+            "psi": _number(feature_psi[i]),
+            "ks": _number(feature_ks[i]),
+            "null_rate": _number(null_rate[i]),
+            "reference_null_rate": _number(reference_null_rate[i]),
+            "drifted": bool(drifted[i]),
+        } for i in order]
+
+        result = {
+            "features_monitored": len(self.features),
+            "drifted_features": int(drifted.sum()),
+            "drifted_share": _number(drifted.mean()) if len(self.features) else 0.0,
+            "psi_threshold": psi_threshold,
+            "features": features,
+        }
+        if score_counts is not None:
+            score_counts = np.asarray(score_counts, dtype=np.float64)
+            score = {"histogram": [int(c) for c in score_counts]}
+            if self.score_counts is not None and compare_scores:
+                reference_scores = self.score_counts.astype(np.float64)
+                score["psi"] = _number(psi(_proportions(reference_scores), _proportions(score_counts)))
+                score["ks"] = _number(ks(reference_scores, score_counts))
+                score["drifted"] = bool(score["psi"] is not None and score["psi"] >= psi_threshold)
+            result["score"] = score
+        return result
+
+    # --- Persistance ---
+
+    def save(self, path):
+        """Écrit le profil en JSON (écriture atomique)."""
+        data = {
+            "version": PROFILE_VERSION,
+            "features": self.features,
+            "edges": [e.tolist() for e in self.edges],
+            "counts": self.counts.tolist(),
+            "score_edges": SCORE_EDGES.tolist(),
+            "score_counts": None if self.score_counts is None else self.score_counts.tolist(),
+            "metadata": self.metadata,
+        }
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        if data.get("version") != PROFILE_VERSION:
+            raise ValueError(f"Version de profil non prise en charge : {data.get('version')!r}")
+        return cls(data["features"], data["edges"], data["counts"], data.get("score_counts"),
+                   data.get("metadata"))
+
+    @classmethod
+    def from_parquet(cls, path, columns=None, n_bins: int = 10, columns_per_read: int = 64,
+                     model=None, batch_size: int = 65536, workers: int = 1):
+        """
+        Profil du fichier de référence complet, lu par paquets de colonnes
+        (numériques seulement), répartis sur 'workers' processus. Avec 'model',
+        les features du modèle sont profilées et la référence est scorée pour
+        l'histogramme des scores (valeurs manquantes remplacées par 0, comme
+        dans l'API).
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        schema = parquet_file.schema_arrow
+        numeric = [field.name for field in schema
+                   if pa.types.is_integer(field.type) or pa.types.is_floating(field.type)
+                   or pa.types.is_boolean(field.type)]
+        if columns is None:
+            columns = list(model.feature_name_) if model is not None else \
+                [name for name in numeric if name not in ("SK_ID_CURR", "TARGET")]
+        columns = [name for name in columns if name in numeric]
+
+        groups = [columns[start:start + columns_per_read] for start in range(0, len(columns), columns_per_read)]
+        if workers > 1 and len(groups) > 1:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=min(workers, len(groups)),
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                results = list(pool.map(profile_columns, [str(path)] * len(groups), groups,
+                                        [n_bins] * len(groups)))
+        else:
+            results = [profile_columns(path, group, n_bins) for group in groups]
+        profiles = [profile for result in results for profile in result]
+
+        scores = None
+        if model is not None:
+            scores = np.concatenate(list(score_batches(parquet_file, model, batch_size)) or [np.empty(0)])
+        metadata = {"source": Path(path).name, "source_signature": file_signature(path),
+                    "rows": parquet_file.metadata.num_rows, "bins": n_bins}
+        if model is not None:
+            from .explanations import model_fingerprint
+
+            metadata["model_fingerprint"] = model_fingerprint(model)
+        return cls.from_column_profiles(columns, profiles, scores, metadata)
+
+
+def file_signature(path) -> str:
+    """Taille et date de modification d'un fichier (détecte son remplacement)."""
+    st = Path(path).stat()
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def profile_columns(path, columns, n_bins: int = 10) -> list:
+    """column_profile de quelques colonnes d'un Parquet (exécutable dans un processus séparé)."""
+    import pyarrow.parquet as pq
+
+    table = pq.ParquetFile(path).read(columns=list(columns))
+    return [column_profile(column_values(column), n_bins) for column in table.columns]
+
+
+def column_values(column) -> np.ndarray:
+    """Colonne Arrow en float64 (valeurs nulles en NaN)."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    return pc.cast(column, pa.float64()).to_numpy(zero_copy_only=False)
+
+
+def score_batches(parquet_file, model, batch_size: int = 65536):
+    """Scores du modèle sur le fichier, lot par lot."""
+    import pandas as pd
+
+    feature_names = list(model.feature_name_)
+    available = [name for name in feature_names if name in parquet_file.schema_arrow.names]
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=available):
+        matrix = np.full((batch.num_rows, len(feature_names)), np.nan)
+        for name, column in zip(batch.schema.names, batch.columns):
+            matrix[:, feature_names.index(name)] = column_values(column)
+        np.nan_to_num(matrix, copy=False, nan=0.0)
+        yield model.predict_proba(pd.DataFrame(matrix, columns=feature_names))[:, 1]
+
+
+class DriftMonitor:
+    """
+    Histogrammes des lignes scorées, par tranche de 'bucket_seconds', gardés
+    'retention_seconds'. observe() ne fait qu'un rangement vectorisé et une
+    addition sous verrou ; les scores de dérive sont calculés à la lecture.
+    """
+
+    def __init__(self, profile: ReferenceProfile, bucket_seconds: int = 300, retention_seconds: int = 86400,
+                 clock=time.time):
+        self.profile = profile
+        self.bucket_seconds = max(1, int(bucket_seconds))
+        self.retention_seconds = max(self.bucket_seconds, int(retention_seconds))
+        self._max_buckets = math.ceil(self.retention_seconds / self.bucket_seconds)
+        self._clock = clock
+        self._lock = threading.Lock()
+        # index de tranche -> [effectifs des features, {empreinte du modèle: effectifs des scores}, lignes]
+        self._buckets = OrderedDict()
+        self._feature_range = np.arange(len(profile.features), dtype=np.intp)
+        self._columns = None
+        self._rows_total = 0
+
+    def _positions(self, source_columns):
+        """Position de chaque feature du profil dans les lignes sources (calculée une fois par schéma)."""
+        cached = self._columns
+        if cached is not None and (cached[0] is source_columns or cached[0] == source_columns):
+            return cached[1], cached[2]
+        index = {name: i for i, name in enumerate(source_columns)}
+        positions = np.array([index.get(name, 0) for name in self.profile.features], dtype=np.intp)
+        absent = np.array([name not in index for name in self.profile.features], dtype=bool)
+        self._columns = (source_columns, positions, absent if absent.any() else None)
+        return positions, self._columns[2]
+
+    def _bucket(self, bucket_index: int):
+        bucket = self._buckets.get(bucket_index)
+        if bucket is None:
+            bucket = [np.zeros_like(self.profile.counts), {}, 0]
+            self._buckets[bucket_index] = bucket
+            for old in [index for index in self._buckets if index <= bucket_index - self._max_buckets]:
+                del self._buckets[old]
+        return bucket
+
+    def observe(self, source_columns, source_rows, scores, model_fingerprint: str = None):
+        """
+        Ajoute des lignes sources (avant remplissage des manquants) et leurs
+        scores, rangés à part pour chaque modèle ('model_fingerprint').
+        """
+        positions, absent = self._positions(source_columns)
+        values = np.atleast_2d(source_rows)[:, positions]
+        if absent is not None:
+            values[:, absent] = np.nan  # feature absente de la base : valeur manquante
+        n_rows = values.shape[0]
+        index = self.profile.bin_index(values)
+        score_index = np.searchsorted(SCORE_EDGES, np.asarray(scores, dtype=np.float64), side="right")
+        counts = None if n_rows == 1 else self.profile.count_bins(index)
+
+        bucket_index = int(self._clock() // self.bucket_seconds)
+        with self._lock:
+            bucket = self._bucket(bucket_index)
+            bucket_scores = bucket[1].get(model_fingerprint)
+            if bucket_scores is None:
+                bucket_scores = bucket[1][model_fingerprint] = np.zeros(len(SCORE_EDGES) + 1, dtype=np.int64)
+            if counts is None:
+                bucket[0][self._feature_range, index[0]] += 1
+                bucket_scores[score_index] += 1
+            else:
+                bucket[0] += counts
+                bucket_scores += np.bincount(score_index, minlength=len(bucket_scores))
+            bucket[2] += n_rows
+            self._rows_total += n_rows
+
+    def window_counts(self, window_seconds: int, model_fingerprint: str = None):
+        """
+        Effectifs cumulés des tranches de la fenêtre (features, scores, lignes).
+        Avec 'model_fingerprint', seuls les scores de ce modèle sont comptés.
+        """
+        now_index = int(self._clock() // self.bucket_seconds)
+        first = now_index - math.ceil(window_seconds / self.bucket_seconds) + 1
+        counts = np.zeros_like(self.profile.counts)
+        score_counts = np.zeros(len(SCORE_EDGES) + 1, dtype=np.int64)
+        rows = 0
+        with self._lock:
+            for bucket_index, (bucket_counts, bucket_scores, bucket_rows) in self._buckets.items():
+                if first <= bucket_index <= now_index:
+                    counts += bucket_counts
+                    for fingerprint, model_scores in bucket_scores.items():
+                        if model_fingerprint is None or fingerprint == model_fingerprint:
+                            score_counts += model_scores
+                    rows += bucket_rows
+        return counts, score_counts, rows
+
+    def report(self, window_seconds: int, psi_threshold: float = 0.2, top: int = None,
+               min_rows: int = 0, model_fingerprint: str = None) -> dict:
+        """
+        Rapport de la fenêtre. Les scores comptés sont ceux du modèle
+        'model_fingerprint' ; ils ne sont comparés à la référence (PSI, KS)
+        que si elle a été scorée par ce même modèle.
+        """
+        counts, score_counts, rows = self.window_counts(window_seconds, model_fingerprint)
+        reference_model = self.profile.metadata.get("model_fingerprint")
+        compare_scores = reference_model is not None and reference_model == model_fingerprint
+        report = {
+            "window_seconds": int(window_seconds),
+            "bucket_seconds": self.bucket_seconds,
+            "rows": rows,
+            "enough_data": rows >= max(min_rows, 1),
+            "reference": self.profile.metadata,
+        }
+        if rows:
+            report.update(self.profile.compare(counts, score_counts, psi_threshold, top, compare_scores))
+            report["score"].update(model_fingerprint=model_fingerprint, comparable=compare_scores)
+        else:
+            report.update({"features_monitored": len(self.profile.features), "features": []})
+        return report
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rows": self._rows_total,
+                "buckets": len(self._buckets),
+                "bucket_seconds": self.bucket_seconds,
+                "retention_seconds": self.retention_seconds,
+                "features": len(self.profile.features),
+            }
@@ -0,0 +1,253 @@
+# app/explanations.py
+"""
+Explications SHAP : choix du backend (package 'shap' ou contributions natives
+de LightGBM), calcul robuste aux différentes versions de SHAP, et magasin de
+valeurs SHAP pré-calculées, relu en mmap et indexé par SK_ID_CURR.
+"""
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def model_fingerprint(model) -> str:
+    """Empreinte courte du modèle (contenu du booster LightGBM)."""
+    booster = getattr(model, "booster_", model)
+    return hashlib.sha1(booster.model_to_string().encode("utf-8")).hexdigest()[:16]
+
+
+def source_fingerprint(db_path) -> str:
+    """Empreinte du feature store (taille, date de modification), ou "" s'il est absent."""
+    try:
+        st = os.stat(db_path)
+    except OSError:
+        return ""
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+class LightGBMContribExplainer:
+    """
+    Explainer basé sur les contributions natives de LightGBM
+    (predict(pred_contrib=True), TreeSHAP implémenté dans le booster). Il
+    expose la même interface que shap.TreeExplainer ('shap_values' et
+    'expected_value'), sans importer le package 'shap'.
+    """
+
+    def __init__(self, model):
+        self.booster = getattr(model, "booster_", model)
+        self._expected_value = None
+
+    def contributions(self, X) -> np.ndarray:
+        """Matrice (n, n_features + 1) : la dernière colonne est la valeur de base."""
+        return self.booster.predict(np.atleast_2d(X), pred_contrib=True)
+
+    @property
+    def expected_value(self) -> float:
+        # La valeur de base est la même pour toutes les lignes
+        if self._expected_value is None:
+            row = np.zeros((1, self.booster.num_feature()))
+            self._expected_value = float(self.contributions(row)[0, -1])
+        return self._expected_value
+
+    def shap_values(self, X) -> np.ndarray:
+        return self.contributions(X)[:, :-1]
+
+
+def make_explainer(model, backend: str = "shap"):
+    """
+    Crée l'explainer du modèle : 'shap' (shap.TreeExplainer, importé seulement
+    dans ce cas) ou 'lightgbm' (contributions natives du booster).
+    """
+    if backend == "lightgbm":
+        return LightGBMContribExplainer(model)
+    if backend != "shap":
+        raise ValueError(f"Backend d'explication inconnu : {backend!r} ('shap' ou 'lightgbm')")
+    import shap
+    return shap.TreeExplainer(model)
+
+
+def base_value_of(explainer) -> float:
+    """Valeur de base (expected_value) de la classe 1, quelle que soit la version de SHAP."""
+    expected_value = explainer.expected_value
+    if isinstance(expected_value, (list, np.ndarray)) and np.ndim(expected_value) > 0:
+        return float(expected_value[1] if len(expected_value) > 1 else expected_value[0])
+    return float(expected_value)
+
+
+def compute_shap_values(explainer, model_rows: np.ndarray):
+    """
+    Calcule les valeurs SHAP de la classe 1 (défaut) pour des lignes déjà
+    alignées sur le modèle. Retourne (base_value, matrice (n, n_features)).
+    """
+    shap_values_output = explainer.shap_values(model_rows)
+
+    # --- Logique robuste pour gérer les différentes versions de SHAP ---
+    base_value = base_value_of(explainer)
+
+    # Pour les valeurs SHAP (une liste par classe dans les anciennes versions)
+    if isinstance(shap_values_output, list):
+        shap_values = shap_values_output[1]
+    else:
+        shap_values = shap_values_output
+    if shap_values.ndim == 3:
+        shap_values = shap_values[:, :, 1]
+    return base_value, np.asarray(shap_values)
+
+
+def top_k_indices(shap_values: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices des k features de plus grande contribution absolue, pour chaque
+    ligne, triés par importance décroissante. Retourne une matrice (n, k).
+    """
+    k = min(k, shap_values.shape[1])
+    magnitude = np.abs(shap_values)
+    candidates = np.argpartition(-magnitude, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(magnitude, candidates, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def explanations_to_arrow(client_ids, base_value: float, feature_names, shap_values: np.ndarray,
+                          feature_values: np.ndarray, indices: np.ndarray = None) -> bytes:
+    """
+    Encode un lot d'explications en flux Arrow IPC : une ligne par client,
+    vecteurs en float32. Les noms de features et la valeur de base sont
+    envoyés une seule fois, dans les métadonnées du schéma.
+    """
+    import pyarrow as pa
+
+    width = shap_values.shape[1]
+    columns = {
+        "SK_ID_CURR": pa.array(np.asarray(client_ids, dtype=np.int64)),
+        "shap_values": pa.FixedSizeListArray.from_arrays(
+            pa.array(shap_values.astype(np.float32, copy=False).ravel()), width),
+        "feature_values": pa.FixedSizeListArray.from_arrays(
+            pa.array(feature_values.astype(np.float32, copy=False).ravel()), width),
+    }
+    if indices is not None:
+        columns["feature_indices"] = pa.FixedSizeListArray.from_arrays(
+            pa.array(indices.astype(np.int32, copy=False).ravel()), width)
+    metadata = {"feature_names": json.dumps(list(feature_names)), "base_value": repr(float(base_value))}
+    batch = pa.RecordBatch.from_pydict(columns).replace_schema_metadata(metadata)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+class ShapStore:
+    """
+    Valeurs SHAP pré-calculées pour toute la table 'features' : une matrice
+    float32 (une ligne par client, dans l'ordre de SK_ID_CURR) et le tableau
+    trié des identifiants. Produit par scripts/precompute_shap.py, pour un
+    modèle ('fingerprint') et un état du feature store ('source_fingerprint').
+    """
+
+    SHAP_FILE = "shap.npy"
+    IDS_FILE = "ids.npy"
+    META_FILE = "meta.json"
+
+    def __init__(self, ids, shap_values, base_value: float, feature_names, fingerprint: str,
+                 source_fingerprint: str = None):
+        self.ids = ids
+        self.shap_values = shap_values
+        self.base_value = base_value
+        self.feature_names = list(feature_names)
+        self.fingerprint = fingerprint
+        self.source_fingerprint = source_fingerprint
+
+    def lookup(self, client_id: int):
+        """Vecteur SHAP du client (vue sur la matrice), ou None s'il est absent."""
+        pos = int(np.searchsorted(self.ids, client_id))
+        if pos < len(self.ids) and self.ids[pos] == client_id:
+            return self.shap_values[pos]
+        return None
+
+    def lookup_many(self, client_ids):
+        """
+        Recherche vectorisée : retourne (vecteurs SHAP des clients trouvés,
+        masque des clients trouvés), dans l'ordre demandé.
+        """
+        client_ids = np.asarray(client_ids, dtype=np.int64)
+        positions = np.searchsorted(self.ids, client_ids)
+        found = positions < len(self.ids)
+        found[found] = self.ids[positions[found]] == client_ids[found]
+        return np.asarray(self.shap_values[positions[found]]), found
+
+    def stats(self) -> dict:
+        return {
+            "rows": int(self.shap_values.shape[0]),
+            "features": int(self.shap_values.shape[1]),
+            "nbytes": int(self.shap_values.nbytes),
+            "fingerprint": self.fingerprint,
+            "source_fingerprint": self.source_fingerprint,
+        }
+
+    @classmethod
+    def load(cls, directory, fingerprint: str = None, source_fingerprint: str = None):
+        """
+        Ouvre un magasin en mmap (lecture seule). Retourne None s'il n'existe
+        pas, s'il a été calculé avec un autre modèle ou sur un autre état du
+        feature store (magasins antérieurs sans empreinte de la base compris).
+        """
+        directory = Path(directory)
+        meta_path = directory / cls.META_FILE
+        if not meta_path.exists():
+            return None
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if fingerprint is not None and meta["fingerprint"] != fingerprint:
+            return None
+        if source_fingerprint is not None and meta.get("source_fingerprint") != source_fingerprint:
+            return None
+        rows = meta["rows"]
+        return cls(
+            ids=np.load(directory / cls.IDS_FILE, mmap_mode="r")[:rows],
+            shap_values=np.load(directory / cls.SHAP_FILE, mmap_mode="r")[:rows],
+            base_value=meta["base_value"],
+            feature_names=meta["feature_names"],
+            fingerprint=meta["fingerprint"],
+            source_fingerprint=meta.get("source_fingerprint"),
+        )
+
+    @classmethod
+    def build(cls, directory, n_rows: int, chunks, explainer, feature_names, fingerprint: str,
+              progress=None, source_fingerprint: str = None):
+        """
+        Écrit un magasin à partir d'un itérable de paquets (ids, lignes alignées
+        sur le modèle) triés par SK_ID_CURR. La matrice est remplie paquet par
+        paquet directement sur disque, puis le répertoire est remplacé d'un coup.
+        'progress' est appelé avec le nombre de lignes traitées après chaque paquet.
+        """
+        directory = Path(directory)
+        tmp_dir = directory.with_name(directory.name + ".tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        shap_values = np.lib.format.open_memmap(
+            tmp_dir / cls.SHAP_FILE, mode="w+", dtype=np.float32, shape=(n_rows, len(feature_names))
+        )
+        ids = np.lib.format.open_memmap(tmp_dir / cls.IDS_FILE, mode="w+", dtype=np.int64, shape=(n_rows,))
+        base_value, start = 0.0, 0
+        for chunk_ids, model_rows in chunks:
+            base_value, values = compute_shap_values(explainer, model_rows)
+            shap_values[start:start + len(chunk_ids)] = values
+            ids[start:start + len(chunk_ids)] = chunk_ids
+            start += len(chunk_ids)
+            if progress is not None:
+                progress(start)
+        shap_values.flush()
+        ids.flush()
+        del shap_values, ids
+
+        meta = {"fingerprint": fingerprint, "source_fingerprint": source_fingerprint,
+                "base_value": base_value, "feature_names": list(feature_names), "rows": start}
+        (tmp_dir / cls.META_FILE).write_text(json.dumps(meta), encoding="utf-8")
+        if directory.exists():
+            shutil.rmtree(directory)
+        os.replace(tmp_dir, directory)
+        return cls.load(directory)
@@ -0,0 +1,606 @@
+# app/feature_store.py
+"""
+Couche d'accès au feature store (table 'features' de la base SQLite).
+
+Les connexions sont ouvertes une seule fois, en lecture seule, puis réutilisées
+d'une requête à l'autre grâce à un pool : chaque thread du serveur emprunte une
+connexion le temps de sa requête et la rend ensuite.
+
+Un second backend, optionnel, charge la table une fois pour toutes dans une
+matrice float32 (ordonnée comme les features du modèle) et la persiste en .npy
+pour pouvoir la relire en mémoire partagée (mmap) aux démarrages suivants.
+
+Un troisième backend lit une table de service compagnon ('feature_vectors'),
+construite hors ligne : un BLOB float32 par client, déjà réduit et ordonné
+selon les features du modèle.
+"""
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from . import config
+from .cache import LRUCache
+
+FEATURES_TABLE = "features"
+ID_COLUMN = "SK_ID_CURR"
+VECTORS_TABLE = "feature_vectors"
+VECTORS_META_TABLE = "feature_vectors_meta"
+# Petit-boutiste explicite : la base reste lisible d'une machine à l'autre
+VECTOR_DTYPE = np.dtype("<f4")
+
+
+class SQLiteFeatureStore:
+    """
+    Pool de connexions SQLite en lecture seule sur le feature store.
+    """
+
+    # Nombre d'identifiants par requête 'IN (...)' (limite de variables SQLite)
+    SQL_IN_CHUNK = 500
+
+    def __init__(self, db_path, pool_size: int = None, mmap_size: int = None,
+                 cache_size_kb: int = None, immutable: bool = None):
+        self.db_path = Path(db_path)
+        self.pool_size = pool_size or config.FEATURE_STORE_POOL_SIZE
+        self.mmap_size = config.FEATURE_STORE_MMAP_SIZE if mmap_size is None else mmap_size
+        self.cache_size_kb = config.FEATURE_STORE_CACHE_SIZE_KB if cache_size_kb is None else cache_size_kb
+        self.immutable = config.FEATURE_STORE_IMMUTABLE if immutable is None else immutable
+
+        # La requête est toujours la même : sqlite3 la garde compilée dans le
+        # cache d'instructions de chaque connexion.
+        self._query = f"SELECT * FROM {FEATURES_TABLE} WHERE {ID_COLUMN} = ?"
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._generation = 0
+        self._columns = None
+        self._stats = {"hits": 0, "misses": 0, "waits": 0}
+
+    # --- Gestion des connexions ---
+
+    def _connect(self) -> sqlite3.Connection:
+        uri = f"{self.db_path.resolve().as_uri()}?mode=ro"
+        if self.immutable:
+            uri += "&immutable=1"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        conn.execute("PRAGMA query_only = 1")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """
+        Emprunte une connexion au pool (en ouvre une nouvelle si le pool n'est
+        pas plein, attend qu'une connexion se libère sinon).
+        """
+        generation = self._generation
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self._stats["hits"] += 1
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.pool_size
+                if can_open:
+                    self._opened += 1
+                    self._stats["misses"] += 1
+                else:
+                    self._stats["waits"] += 1
+            if can_open:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            if generation == self._generation:
+                self._idle.put(conn)
+            else:
+                # La base a été remplacée pendant la requête : on jette la connexion
+                conn.close()
+                with self._lock:
+                    self._opened -= 1
+
+    def reset(self):
+        """
+        À appeler quand le fichier de base a été remplacé : ferme les
+        connexions inactives, oublie le schéma, et les connexions en cours
+        d'utilisation seront fermées à leur retour dans le pool.
+        """
+        with self._lock:
+            self._generation += 1
+            self._columns = None
+        self.close()
+
+    def close(self):
+        """Ferme toutes les connexions inactives du pool."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+    # --- Lecture des données ---
+
+    @property
+    def columns(self) -> list:
+        """Liste des colonnes de la table 'features', lue une seule fois."""
+        if self._columns is None:
+            with self.connection() as conn:
+                cursor = conn.execute(f"SELECT * FROM {FEATURES_TABLE} LIMIT 0")
+                self._columns = [desc[0] for desc in cursor.description]
+        return self._columns
+
+    def fetch_row(self, client_id: int):
+        """Retourne la ligne brute (tuple) du client, ou None s'il est absent."""
+        # On charge le schéma avant d'emprunter une connexion pour ne jamais
+        # en tenir deux à la fois (ce qui bloquerait un pool de taille 1).
+        self.columns
+        with self.connection() as conn:
+            row = conn.execute(self._query, (client_id,)).fetchone()
+        return row if row is None else tuple(row)
+
+    def fetch_rows(self, client_ids) -> dict:
+        """
+        Retourne {SK_ID_CURR: ligne brute} pour plusieurs clients, avec une
+        requête indexée 'IN (...)' par paquet de 'SQL_IN_CHUNK' identifiants.
+        Les clients absents ne figurent pas dans le résultat.
+        """
+        unique_ids = list(dict.fromkeys(int(client_id) for client_id in client_ids))
+        id_position = self.columns.index(ID_COLUMN)
+        rows = {}
+        with self.connection() as conn:
+            for start in range(0, len(unique_ids), self.SQL_IN_CHUNK):
+                chunk = unique_ids[start:start + self.SQL_IN_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                query = f"SELECT * FROM {FEATURES_TABLE} WHERE {ID_COLUMN} IN ({placeholders})"
+                for row in conn.execute(query, chunk):
+                    rows[int(row[id_position])] = tuple(row)
+        return rows
+
+    def stats(self) -> dict:
+        """Statistiques d'utilisation du pool."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["open_connections"] = self._opened
+        stats["backend"] = "sqlite"
+        stats["idle_connections"] = self._idle.qsize()
+        stats["pool_size"] = self.pool_size
+        return stats
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class ArrayFeatureStore:
+    """
+    Feature store en mémoire : une matrice float32 contiguë (une ligne par
+    client, colonnes dans l'ordre de model.feature_name_) et le tableau trié
+    des SK_ID_CURR, interrogé par recherche dichotomique.
+    """
+
+    MATRIX_FILE = "matrix.npy"
+    IDS_FILE = "ids.npy"
+    META_FILE = "meta.json"
+
+    def __init__(self, ids: np.ndarray, matrix: np.ndarray, feature_names: list,
+                 missing_columns: list = None):
+        self.ids = ids
+        self.matrix = matrix
+        self.feature_names = list(feature_names)
+        self.missing_columns = list(missing_columns or [])
+        self._columns = [ID_COLUMN] + self.feature_names
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    @property
+    def columns(self) -> list:
+        return self._columns
+
+    def _position(self, client_id: int):
+        pos = int(np.searchsorted(self.ids, client_id))
+        if pos < len(self.ids) and self.ids[pos] == client_id:
+            return pos
+        return None
+
+    def row_view(self, client_id: int):
+        """
+        Retourne la ligne du client (vue sur la matrice, sans copie), ou None
+        s'il est absent. La vue est en lecture seule si la matrice est mappée.
+        """
+        pos = self._position(client_id)
+        with self._lock:
+            self._stats["hits" if pos is not None else "misses"] += 1
+        return None if pos is None else self.matrix[pos]
+
+    def rows(self, client_ids):
+        """
+        Recherche vectorisée de plusieurs clients. Retourne (lignes, masque) :
+        'lignes' contient les lignes trouvées (copie), dans l'ordre des
+        identifiants demandés, et 'masque' indique lesquels ont été trouvés.
+        """
+        client_ids = np.asarray(client_ids, dtype=np.int64)
+        positions = np.searchsorted(self.ids, client_ids)
+        found = positions < len(self.ids)
+        found[found] = self.ids[positions[found]] == client_ids[found]
+        n_found = int(found.sum())
+        with self._lock:
+            self._stats["hits"] += n_found
+            self._stats["misses"] += len(client_ids) - n_found
+        return self.matrix[positions[found]], found
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            "backend": "array",
+            "rows": int(self.matrix.shape[0]),
+            "features": int(self.matrix.shape[1]),
+            "nbytes": int(self.matrix.nbytes),
+            "memory_mapped": isinstance(self.matrix, np.memmap),
+            "missing_columns": len(self.missing_columns),
+        })
+        return stats
+
+    # --- Construction et persistance ---
+
+    @staticmethod
+    def fingerprint(db_path, feature_names) -> str:
+        """Empreinte de la base (taille, date de modification) et du schéma du modèle."""
+        st = Path(db_path).stat()
+        digest = hashlib.sha1("\x1f".join(feature_names).encode("utf-8"))
+        digest.update(f"{st.st_size}:{st.st_mtime_ns}".encode("ascii"))
+        return digest.hexdigest()
+
+    @classmethod
+    def from_sqlite(cls, store: SQLiteFeatureStore, feature_names, chunk_size: int = 10000):
+        """
+        Lit toute la table 'features' (triée par SK_ID_CURR) dans une matrice
+        float32. Les features du modèle absentes de la base restent à NaN.
+        """
+        feature_names = list(feature_names)
+        available = set(store.columns)
+        present = [name for name in feature_names if name in available]
+        missing = [name for name in feature_names if name not in available]
+        positions = [feature_names.index(name) for name in present]
+
+        select = ", ".join(_quote(name) for name in [ID_COLUMN] + present)
+        with store.connection() as conn:
+            n_rows = conn.execute(f"SELECT COUNT(*) FROM {FEATURES_TABLE}").fetchone()[0]
+            ids = np.empty(n_rows, dtype=np.int64)
+            matrix = np.full((n_rows, len(feature_names)), np.nan, dtype=np.float32)
+            buffer = np.empty((chunk_size, len(present) + 1), dtype=np.float64)
+            cursor = conn.execute(f"SELECT {select} FROM {FEATURES_TABLE} ORDER BY {ID_COLUMN}")
+            start = 0
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                chunk = buffer[:len(rows)]
+                chunk[:] = rows
+                ids[start:start + len(rows)] = chunk[:, 0]
+                matrix[start:start + len(rows), positions] = chunk[:, 1:]
+                start += len(rows)
+
+        return cls(ids[:start], matrix[:start], feature_names, missing)
+
+    def save(self, directory, fingerprint: str = ""):
+        """Écrit la matrice et l'index en .npy (écriture atomique)."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, array in ((self.MATRIX_FILE, self.matrix), (self.IDS_FILE, self.ids)):
+            tmp = directory / (name + ".tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(tmp, directory / name)
+        meta = {
+            "fingerprint": fingerprint,
+            "feature_names": self.feature_names,
+            "missing_columns": self.missing_columns,
+        }
+        tmp = directory / (self.META_FILE + ".tmp")
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp, directory / self.META_FILE)
+
+    @classmethod
+    def load(cls, directory, fingerprint: str = None):
+        """
+        Relit une matrice persistée en mode mmap (lecture seule, pages partagées
+        entre processus). Retourne None si le cache est absent ou périmé.
+        """
+        directory = Path(directory)
+        meta_path = directory / cls.META_FILE
+        if not meta_path.exists():
+            return None
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if fingerprint is not None and meta.get("fingerprint") != fingerprint:
+            return None
+        matrix = np.load(directory / cls.MATRIX_FILE, mmap_mode="r")
+        ids = np.load(directory / cls.IDS_FILE, mmap_mode="r")
+        return cls(ids, matrix, meta["feature_names"], meta.get("missing_columns"))
+
+    @classmethod
+    def load_or_build(cls, db_path, feature_names, cache_dir=None):
+        """
+        Charge la matrice depuis le cache si elle correspond à la base et au
+        modèle, sinon la reconstruit depuis SQLite (et la persiste si un
+        répertoire de cache est fourni).
+        """
+        feature_names = list(feature_names)
+        fingerprint = cls.fingerprint(db_path, feature_names)
+        if cache_dir is not None:
+            cached = cls.load(cache_dir, fingerprint)
+            if cached is not None:
+                return cached
+
+        sqlite_store = SQLiteFeatureStore(db_path)
+        try:
+            built = cls.from_sqlite(sqlite_store, feature_names)
+        finally:
+            sqlite_store.close()
+
+        if cache_dir is None:
+            return built
+        built.save(cache_dir, fingerprint)
+        return cls.load(cache_dir, fingerprint)
+
+
+class VectorFeatureStore(SQLiteFeatureStore):
+    """
+    Table de service 'feature_vectors' (scripts/build_feature_vectors.py) :
+    pour chaque client, uniquement les features du modèle, dans l'ordre de
+    model.feature_name_, rangées dans un seul BLOB float32. Une lecture ne
+    ramène qu'une colonne, convertie sans décodage colonne par colonne par
+    np.frombuffer. Même interface de lecture que ArrayFeatureStore.
+    """
+
+    def __init__(self, db_path, **kwargs):
+        super().__init__(db_path, **kwargs)
+        self._query = f"SELECT VECTOR FROM {VECTORS_TABLE} WHERE {ID_COLUMN} = ?"
+        meta = self.metadata()
+        if meta.get("dtype") != VECTOR_DTYPE.str:
+            raise ValueError(f"Type des vecteurs non pris en charge : {meta.get('dtype')!r}")
+        self.feature_names = list(meta["feature_names"])
+        self.missing_columns = list(meta.get("missing_columns", []))
+        self.source_fingerprint = meta.get("fingerprint", "")
+        self.model_fingerprint = meta.get("model_fingerprint", "")
+        self._vector_columns = [ID_COLUMN] + self.feature_names
+        self._lookups = {"found": 0, "not_found": 0}
+
+    def metadata(self) -> dict:
+        """Description de la table (features, empreinte, type) écrite à la construction."""
+        with self.connection() as conn:
+            rows = conn.execute(f"SELECT key, value FROM {VECTORS_META_TABLE}").fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    @property
+    def columns(self) -> list:
+        return self._vector_columns
+
+    def _count(self, found: int, not_found: int):
+        with self._lock:
+            self._lookups["found"] += found
+            self._lookups["not_found"] += not_found
+
+    def row_view(self, client_id: int):
+        """Vecteur float32 du client (lecture seule), ou None s'il est absent."""
+        with self.connection() as conn:
+            row = conn.execute(self._query, (client_id,)).fetchone()
+        self._count(row is not None, row is None)
+        return None if row is None else np.frombuffer(row[0], dtype=VECTOR_DTYPE)
+
+    def rows(self, client_ids):
+        """
+        Plusieurs clients en une requête 'IN (...)' par paquet. Retourne
+        (lignes, masque) comme ArrayFeatureStore.rows : les BLOBs trouvés sont
+        concaténés puis convertis d'un seul np.frombuffer.
+        """
+        client_ids = [int(client_id) for client_id in client_ids]
+        unique_ids = list(dict.fromkeys(client_ids))
+        blobs = {}
+        with self.connection() as conn:
+            for start in range(0, len(unique_ids), self.SQL_IN_CHUNK):
+                chunk = unique_ids[start:start + self.SQL_IN_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                query = f"SELECT {ID_COLUMN}, VECTOR FROM {VECTORS_TABLE} WHERE {ID_COLUMN} IN ({placeholders})"
+                blobs.update(conn.execute(query, chunk).fetchall())
+        found = np.array([client_id in blobs for client_id in client_ids], dtype=bool)
+        n_found = int(found.sum())
+        self._count(n_found, len(client_ids) - n_found)
+        data = b"".join(blobs[client_id] for client_id in client_ids if client_id in blobs)
+        return np.frombuffer(data, dtype=VECTOR_DTYPE).reshape(n_found, len(self.feature_names)), found
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        with self._lock:
+            stats.update(self._lookups)
+        stats.update({
+            "backend": "vectors",
+            "features": len(self.feature_names),
+            "missing_columns": len(self.missing_columns),
+        })
+        return stats
+
+    # --- Construction ---
+
+    @classmethod
+    def build(cls, db_path, feature_names, output_path, chunk_size: int = 10000,
+              model_fingerprint: str = "") -> int:
+        """
+        Écrit la table de service depuis la table 'features' (lue par paquets,
+        triée par SK_ID_CURR, en ne sélectionnant que les colonnes du modèle).
+        Les features absentes de la base restent à NaN. La base est construite
+        dans un fichier temporaire puis renommée. Retourne le nombre de clients.
+        """
+        feature_names = list(feature_names)
+        fingerprint = ArrayFeatureStore.fingerprint(db_path, feature_names)
+        source = SQLiteFeatureStore(db_path, pool_size=1)
+        tmp_path = f"{output_path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        out = sqlite3.connect(tmp_path, isolation_level=None)
+        try:
+            available = set(source.columns)
+            present = [name for name in feature_names if name in available]
+            missing = [name for name in feature_names if name not in available]
+            positions = [feature_names.index(name) for name in present]
+
+            out.execute("PRAGMA journal_mode = OFF")
+            out.execute("PRAGMA synchronous = OFF")
+            # INTEGER PRIMARY KEY : SK_ID_CURR est le rowid, une lecture = une
+            # descente dans le B-tree de la table
+            out.execute(f"CREATE TABLE {VECTORS_TABLE} ({ID_COLUMN} INTEGER PRIMARY KEY, VECTOR BLOB NOT NULL)")
+            out.execute(f"CREATE TABLE {VECTORS_META_TABLE} (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+            select = ", ".join(_quote(name) for name in [ID_COLUMN] + present)
+            insert = f"INSERT INTO {VECTORS_TABLE} VALUES (?, ?)"
+            vectors = np.empty((chunk_size, len(feature_names)), dtype=VECTOR_DTYPE)
+            n_rows = 0
+            out.execute("BEGIN")
+            with source.connection() as conn:
+                cursor = conn.execute(f"SELECT {select} FROM {FEATURES_TABLE} ORDER BY {ID_COLUMN}")
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    chunk = np.array(rows, dtype=np.float64).reshape(len(rows), len(present) + 1)
+                    block = vectors[:len(rows)]
+                    block[:] = np.nan
+                    block[:, positions] = chunk[:, 1:]
+                    out.executemany(insert, zip((int(row[0]) for row in rows), map(bytes, block)))
+                    n_rows += len(rows)
+
+            meta = {
+                "fingerprint": fingerprint,
+                "model_fingerprint": model_fingerprint,
+                "feature_names": feature_names,
+                "missing_columns": missing,
+                "dtype": VECTOR_DTYPE.str,
+                "rows": n_rows,
+            }
+            out.executemany(f"INSERT INTO {VECTORS_META_TABLE} VALUES (?, ?)",
+                            [(key, json.dumps(value)) for key, value in meta.items()])
+            out.execute("COMMIT")
+        except BaseException:
+            out.close()
+            source.close()
+            os.remove(tmp_path)
+            raise
+        out.close()
+        source.close()
+        os.replace(tmp_path, output_path)
+        return n_rows
+
+
+class CachedFeatureStore:
+    """
+    Cache LRU/TTL des lignes de base (avant surcharge par la demande de prêt)
+    devant un SQLiteFeatureStore. Le cache est vidé automatiquement lorsque le
+    fichier de base est remplacé (changement d'inode, de taille ou de date).
+    """
+
+    def __init__(self, store: SQLiteFeatureStore, cache: LRUCache, check_interval: float = 1.0):
+        self.store = store
+        self.cache = cache
+        self.check_interval = check_interval
+        self._signature = self._file_signature()
+        self._next_check = time.monotonic() + check_interval
+        self._lock = threading.Lock()
+
+    def _file_signature(self):
+        try:
+            st = os.stat(self.store.db_path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def check_source(self):
+        """Invalide le cache (et le pool) si le fichier de base a changé."""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+            signature = self._file_signature()
+            if signature == self._signature:
+                return
+            self._signature = signature
+        print(f"🔄 Feature store modifié sur disque, invalidation du cache : {self.store.db_path}")
+        self.store.reset()
+        self.cache.clear()
+
+    @property
+    def db_path(self):
+        return self.store.db_path
+
+    @property
+    def columns(self) -> list:
+        self.check_source()
+        return self.store.columns
+
+    def fetch_row(self, client_id: int):
+        self.check_source()
+        row = self.cache.get(client_id)
+        if row is None:
+            row = self.store.fetch_row(client_id)
+            if row is not None:
+                self.cache.put(client_id, row)
+        return row
+
+    def fetch_rows(self, client_ids) -> dict:
+        self.check_source()
+        rows, to_fetch = {}, []
+        for client_id in dict.fromkeys(int(client_id) for client_id in client_ids):
+            row = self.cache.get(client_id)
+            if row is None:
+                to_fetch.append(client_id)
+            else:
+                rows[client_id] = row
+        if to_fetch:
+            fetched = self.store.fetch_rows(to_fetch)
+            for client_id, row in fetched.items():
+                self.cache.put(client_id, row)
+            rows.update(fetched)
+        return rows
+
+    def stats(self) -> dict:
+        stats = self.store.stats()
+        stats["cache"] = self.cache.stats()
+        return stats
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_feature_store(db_path) -> SQLiteFeatureStore:
+    """
+    Retourne le feature store associé à un chemin de base, en le créant au
+    premier appel. Un seul pool est partagé par fichier.
+    """
+    key = str(Path(db_path).resolve())
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = SQLiteFeatureStore(db_path)
+            _stores[key] = store
+    return store
@@ -0,0 +1,367 @@
+# app/log_export.py
+"""
+Export du journal des prédictions, morceau par morceau.
+
+Le journal n'est plus chargé en mémoire pour être téléchargé. Le CSV historique
+est envoyé par blocs, avec prise en charge des requêtes HTTP Range pour
+reprendre un téléchargement interrompu. Les segments Parquet sont relus groupe
+de lignes par groupe de lignes, filtrés sur une plage de temps et réduits aux
+colonnes demandées. Un curseur opaque permet au job de monitoring de ne
+récupérer que les lignes écrites depuis son dernier passage ; seuls les
+segments terminés (fermés) sont exportés.
+La réponse peut être compressée (gzip, ou zstd si le package 'zstandard' est
+installé).
+"""
+import base64
+import io
+import json
+import zlib
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from .prediction_log import TIMESTAMP_COLUMN, list_segments, segment_time_prefix
+
+try:
+    import zstandard
+except ImportError:  # zstd indisponible : seul gzip est proposé
+    zstandard = None
+
+CHUNK_SIZE = 1 << 20
+# Délai au-delà duquel un segment daté est forcément visible : son nom est
+# choisi juste avant son renommage, mais deux workers peuvent renommer leurs
+# segments dans l'ordre inverse de leurs noms. Les segments plus récents déjà
+# exportés sont listés dans le curseur plutôt que couverts par une borne.
+SEGMENT_SETTLE_SECONDS = 60
+
+
+# --- Compression ---
+
+def available_encodings() -> list:
+    """Compressions proposées, de la préférée à la moins bonne."""
+    return ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+
+def negotiate_encoding(accept_encoding: str = None, requested: str = None):
+    """
+    Compression de la réponse : celle demandée explicitement ('gzip', 'zstd',
+    'none'), sinon la meilleure annoncée par l'en-tête Accept-Encoding.
+    Retourne None pour une réponse non compressée.
+    """
+    if requested:
+        requested = requested.strip().lower()
+        if requested in ("none", "identity"):
+            return None
+        if requested not in available_encodings():
+            raise ValueError(f"Compression non disponible : {requested!r} (disponibles : {available_encodings()})")
+        return requested
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        name, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(name.lower())
+    for encoding in available_encodings():
+        if encoding in accepted:
+            return encoding
+    return None
+
+
+def compress_chunks(chunks, encoding: str = None):
+    """Compresse un flux de blocs d'octets au fil de l'eau."""
+    if encoding is None:
+        yield from chunks
+        return
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 : format gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# --- CSV historique : blocs d'octets et requêtes Range ---
+
+def parse_range(header: str, size: int):
+    """
+    Intervalle (début, fin incluse) d'un en-tête 'Range: bytes=...'. Retourne
+    None si l'en-tête est absent ou non pris en charge (plusieurs intervalles) :
+    le fichier est alors envoyé en entier. Lève ValueError si l'intervalle est
+    hors du fichier (416).
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # 'bytes=-N' : les N derniers octets
+            start = max(0, size - int(last))
+            end = size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start >= size or start > end:
+        raise ValueError(f"Intervalle non satisfiable pour un fichier de {size} octets.")
+    return start, end
+
+
+def iter_file(path, start: int = 0, stop: int = None, chunk_size: int = CHUNK_SIZE):
+    """Octets [start, stop[ d'un fichier, par blocs de 'chunk_size'."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = None if stop is None else stop - start
+        while remaining is None or remaining > 0:
+            chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+# --- Segments Parquet : filtres, colonnes et curseur ---
+
+def encode_cursor(before: str, seen=(), segment: str = None, row: int = 0) -> str:
+    state = {"before": before, "seen": sorted(seen), "segment": segment, "row": row}
+    raw = json.dumps(state, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    État d'un export : segments aux noms inférieurs à 'before' et segments de
+    'seen' déjà envoyés en entier, 'row' premières lignes de 'segment' déjà
+    envoyées. Les anciens curseurs (segment, ligne) restent acceptés.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if "before" not in data:
+            return {"before": str(data["segment"]), "seen": set(), "segment": str(data["segment"]),
+                    "row": int(data["row"])}
+        segment = data["segment"]
+        return {"before": str(data["before"]), "seen": {str(name) for name in data["seen"]},
+                "segment": None if segment is None else str(segment), "row": int(data["row"])}
+    except (ValueError, KeyError, TypeError):
+        raise ValueError(f"Curseur invalide : {cursor!r}")
+
+
+def normalize_timestamp(value: str) -> str:
+    """
+    Date ISO 8601 ramenée au format des horodatages du journal (UTC, en
+    millisecondes), qui se comparent alors comme des chaînes.
+    """
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Date invalide : {value!r} (format ISO 8601 attendu).")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).isoformat(timespec="milliseconds")
+
+
+class SegmentExport:
+    """
+    Sélection de lignes dans les segments Parquet terminés : plage de temps
+    [start, end[, colonnes, reprise après un curseur et nombre maximal de
+    lignes. Le segment en cours d'écriture n'est pas exporté : ses lignes le
+    seront au passage qui suit sa fermeture.
+
+    La sélection est calculée à la construction, pour que le curseur suivant
+    soit connu avant l'envoi de la réponse : seule la colonne TIMESTAMP est
+    lue, et les groupes de lignes hors de la plage sont écartés d'après leurs
+    statistiques. Les colonnes demandées ne sont lues qu'à l'envoi, groupe par
+    groupe.
+    """
+
+    def __init__(self, segments_dir, columns=None, start: str = None, end: str = None,
+                 cursor: str = None, limit: int = None):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        self.start = normalize_timestamp(start) if start else None
+        self.end = normalize_timestamp(end) if end else None
+        state = decode_cursor(cursor) if cursor else {"before": "", "seen": set(), "segment": None, "row": 0}
+        self.has_more = False
+        self.rows = 0
+        # (chemin du segment, groupe de lignes, positions retenues dans le groupe)
+        self.parts = []
+
+        schemas = []
+        done = set(state["seen"])
+        # Premier segment pas encore lu en entier : (nom, lignes déjà envoyées)
+        pending = None
+        for path in list_segments(segments_dir):
+            if path.name < state["before"] or path.name in done:
+                continue
+            skip = state["row"] if path.name == state["segment"] else 0
+            if limit is not None and self.rows >= limit:
+                self.has_more = True
+                pending = (path.name, skip)
+                break
+            parquet_file = pq.ParquetFile(path)
+            schemas.append(parquet_file.schema_arrow)
+            metadata = parquet_file.metadata
+            ts_index = parquet_file.schema_arrow.get_field_index(TIMESTAMP_COLUMN)
+
+            # 'position' : lignes du segment couvertes par cet export ou les précédents
+            position = skip
+            group_start = 0
+            for group in range(metadata.num_row_groups):
+                num_rows = metadata.row_group(group).num_rows
+                first = max(0, skip - group_start)
+                if first >= num_rows or self._outside(metadata.row_group(group), ts_index):
+                    group_start += num_rows
+                    position = max(skip, group_start)
+                    continue
+                if limit is not None and self.rows >= limit:
+                    self.has_more = True
+                    break
+
+                if self.start is None and self.end is None:
+                    positions = np.arange(first, num_rows)
+                else:
+                    timestamps = parquet_file.read_row_group(group, columns=[TIMESTAMP_COLUMN]).column(0)
+                    mask = pc.fill_null(self._time_mask(pc, timestamps), False)
+                    positions = np.flatnonzero(mask.to_numpy(zero_copy_only=False))
+                    positions = positions[positions >= first]
+
+                stop = group_start + num_rows
+                if limit is not None and len(positions) > limit - self.rows:
+                    positions = positions[:limit - self.rows]
+                    stop = group_start + int(positions[-1]) + 1
+                    self.has_more = True
+                if len(positions):
+                    self.parts.append((path, group, positions))
+                    self.rows += len(positions)
+                position = stop
+                group_start += num_rows
+                if self.has_more:
+                    break
+            if position < metadata.num_rows:
+                pending = (path.name, position)
+                break
+            done.add(path.name)
+
+        # La borne n'avance que jusqu'aux segments assez anciens pour être tous
+        # visibles, et jamais au-delà du premier segment pas encore lu en entier
+        horizon = segment_time_prefix(datetime.now(timezone.utc) - timedelta(seconds=SEGMENT_SETTLE_SECONDS))
+        before = max(state["before"], min(horizon, pending[0]) if pending else horizon)
+        self.next_cursor = encode_cursor(before, {name for name in done if name >= before},
+                                         *(pending or (None, 0)))
+
+        unified = pa.unify_schemas(schemas, promote_options="permissive") if schemas else pa.schema([])
+        if columns:
+            unknown = [name for name in columns if name not in unified.names]
+            if unknown:
+                raise ValueError(f"Colonnes inconnues dans le journal : {unknown}")
+            unified = pa.schema([unified.field(name) for name in columns])
+        self.schema = unified
+
+    def _outside(self, row_group, ts_index: int) -> bool:
+        """Vrai si les statistiques du groupe le placent hors de la plage de temps."""
+        if self.start is None and self.end is None:
+            return False
+        if ts_index < 0:
+            return True  # segment sans horodatage : aucune ligne datée à retenir
+        stats = row_group.column(ts_index).statistics
+        if stats is None or not stats.has_min_max:
+            return False
+        return (self.start is not None and stats.max < self.start) \
+            or (self.end is not None and stats.min >= self.end)
+
+    def _time_mask(self, pc, timestamps):
+        mask = None
+        if self.start is not None:
+            mask = pc.greater_equal(timestamps, self.start)
+        if self.end is not None:
+            before_end = pc.less(timestamps, self.end)
+            mask = before_end if mask is None else pc.and_(mask, before_end)
+        return mask
+
+    def iter_tables(self):
+        """Lignes retenues, groupe par groupe, toutes au schéma de l'export."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        parquet_file, current = None, None
+        for path, group, positions in self.parts:
+            if path != current:
+                parquet_file, current = pq.ParquetFile(path), path
+            available = [name for name in self.schema.names if name in parquet_file.schema_arrow.names]
+            table = parquet_file.read_row_group(group, columns=available).take(positions)
+            for field in self.schema:
+                if field.name not in table.column_names:
+                    table = table.append_column(field, pa.nulls(table.num_rows, field.type))
+            yield table.select(self.schema.names).cast(self.schema)
+
+
+class _ChunkSink:
+    """Fichier en écriture seule dont le contenu est récupéré au fur et à mesure."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def csv_chunks(export: SegmentExport):
+    """Export en CSV, un bloc par groupe de lignes (en-tête dans le premier)."""
+    import pyarrow.csv as pa_csv
+
+    header = True
+    for table in export.iter_tables():
+        buffer = io.BytesIO()
+        pa_csv.write_csv(table, buffer, pa_csv.WriteOptions(include_header=header))
+        header = False
+        yield buffer.getvalue()
+    if header and export.schema.names:
+        buffer = io.BytesIO()
+        pa_csv.write_csv(export.schema.empty_table(), buffer)
+        yield buffer.getvalue()
+
+
+def parquet_chunks(export: SegmentExport):
+    """Export en Parquet, écrit groupe de lignes par groupe de lignes."""
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, export.schema, compression="zstd")
+    for table in export.iter_tables():
+        writer.write_table(table)
+        data = sink.take()
+        if data:
+            yield data
+    writer.close()
+    yield sink.take()
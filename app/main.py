@@ -1,44 +1,479 @@
 # app/main.py (Version finale avec SHAP)
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse, FileResponse
-import pandas as pd
-import joblib
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import numpy as np
 import os
-import shap
-import threading
+import time
 from pathlib import Path
+from typing import List, Optional
 
-from .preprocessing import prepare_data_for_prediction
-from .models import NewLoanRequest, PredictionResponse
+from .preprocessing import ColumnPlan, fetch_source_row, fetch_source_rows
+from .feature_store import ID_COLUMN, ArrayFeatureStore, CachedFeatureStore, VectorFeatureStore, get_feature_store
+from .cache import LRUCache, estimate_size
+from .explanations import (
+    ARROW_MEDIA_TYPE, ShapStore, base_value_of, compute_shap_values, explanations_to_arrow, make_explainer,
+    model_fingerprint, source_fingerprint, top_k_indices,
+)
+from .tree_engine import TreeEnsemble
+from .prediction_log import MODEL_VERSION_COLUMN, PredictionLogWriter, list_segments
+from .log_export import (
+    SegmentExport, compress_chunks, csv_chunks, iter_file, negotiate_encoding, parquet_chunks, parse_range,
+)
+from .startup import StartupTracker
+from .drift import DriftMonitor, ReferenceProfile
+from .registry import ModelBundle, ModelRegistry, default_version
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, Registry, StageTimer
+from .profiling import SamplingProfiler
+from .concurrency import EndpointLimiter, Overloaded
+from .serialization import (
+    JSON_MEDIA_TYPE, available_media_types, columns_to_arrow, encode, negotiate,
+)
+from .serve import SHARED_FEATURES_SUBDIR, SHARED_TREE_ENGINE_SUBDIR
+from . import config
+from .models import BatchPredictionResponse, ModelReloadRequest, NewLoanRequest, PredictionResponse, ShapBatchRequest
 
 app = FastAPI(
     title="API de Scoring de Crédit",
     version="1.0.0"
 )
 
+# --- Instrumentation : métriques Prometheus (/metrics) et profileur à la demande ---
+metrics = Registry()
+request_duration = metrics.histogram(
+    "scoring_api_request_duration_seconds", "Durée des requêtes HTTP.", ("route", "method"))
+requests_in_flight = metrics.gauge(
+    "scoring_api_requests_in_flight", "Requêtes HTTP en cours de traitement.", ("route",))
+responses_total = metrics.counter(
+    "scoring_api_responses_total", "Réponses HTTP par code de statut.", ("route", "method", "status"))
+errors_total = metrics.counter(
+    "scoring_api_errors_total", "Réponses HTTP en erreur (4xx/5xx) par code de statut.", ("route", "status"))
+stage_duration = metrics.histogram(
+    "scoring_api_stage_duration_seconds", "Durée de chaque étape des handlers.", ("endpoint", "stage"))
+log_wait = metrics.histogram(
+    "scoring_api_prediction_log_wait_seconds",
+    "Attente (file et verrou) lors du dépôt d'une ligne dans le journal des prédictions.",
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0))
+micro_batch_size = metrics.histogram(
+    "scoring_api_micro_batch_size", "Nombre de lignes par appel groupé au modèle (micro-batching).",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+micro_batch_queue_delay = metrics.histogram(
+    "scoring_api_micro_batch_queue_delay_seconds",
+    "Attente d'une ligne avant l'appel groupé au modèle (micro-batching).",
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1))
+
+if config.METRICS_ENABLED:
+    app.add_middleware(
+        MetricsMiddleware, routes=app.router.routes, duration=request_duration,
+        in_flight=requests_in_flight, responses=responses_total, errors=errors_total,
+    )
+
+profiler = SamplingProfiler(interval_ms=config.PROFILER_INTERVAL_MS)
+
 # --- Chargement du modèle et de l'explainer SHAP ---
+# L'import de ce module doit rester rapide pour que uvicorn ouvre le port tout
+# de suite : le modèle et les artefacts lourds sont chargés en arrière-plan
+# (load_artifacts), l'explainer SHAP à la première explication demandée.
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-MODEL_PATH = BASE_DIR / "model" / "model.pkl"
-DATA_PATH = BASE_DIR / "data" / "feature_store.db"
-PREDICTIONS_LOG_PATH = BASE_DIR / "data" / "predictions_log.csv"
+MODEL_PATH = Path(config.MODEL_PATH or BASE_DIR / "model" / "model.pkl")
+# Modèles que POST /model/reload peut charger
+MODEL_DIR = MODEL_PATH.parent
+DATA_DIR = Path(config.DATA_DIR or BASE_DIR / "data")
+DATA_PATH = DATA_DIR / "feature_store.db"
+PREDICTIONS_LOG_PATH = DATA_DIR / "predictions_log.csv"
+PREDICTIONS_SEGMENTS_DIR = DATA_DIR / "predictions_log"
+SHAP_STORE_DIR = DATA_DIR / "shap_store"
+DRIFT_PROFILE_PATH = Path(config.DRIFT_PROFILE_PATH or DATA_DIR / "drift_reference.json")
+FEATURE_ARRAY_DIR = Path(config.FEATURE_STORE_ARRAY_DIR or DATA_DIR / "feature_store_array")
+FEATURE_VECTORS_PATH = Path(config.FEATURE_STORE_VECTORS_PATH or DATA_DIR / "feature_vectors.db")
+# Artefacts partagés entre workers, préparés par app/serve.py
+SHARED_ARTIFACTS_DIR = Path(config.SHARED_ARTIFACTS_DIR) if config.SHARED_ARTIFACTS_DIR else None
+
+startup = StartupTracker()
+
+# Modèle servi (bundle courant) ; None tant que le premier chargement n'est pas fini
+registry = ModelRegistry(grace_seconds=config.MODEL_SWAP_GRACE_SECONDS)
+
+# Suivi de la dérive en ligne ; None tant que le profil de référence n'est pas chargé
+drift_monitor = None
+
+# Pool de connexions en lecture seule sur le feature store (ouvertes à la demande)
+feature_store = get_feature_store(DATA_PATH)
+
+# Cache des lignes clients : le dashboard interroge souvent les mêmes clients
+if config.FEATURE_CACHE_MAX_ENTRIES > 0:
+    feature_store = CachedFeatureStore(
+        feature_store,
+        LRUCache(
+            max_entries=config.FEATURE_CACHE_MAX_ENTRIES,
+            max_bytes=config.FEATURE_CACHE_MAX_BYTES or None,
+            ttl=config.FEATURE_CACHE_TTL_SECONDS or None,
+        ),
+        check_interval=config.FEATURE_CACHE_CHECK_INTERVAL,
+    )
+
+# Empreinte du feature store (taille, date) : les valeurs SHAP pré-calculées
+# ou en cache ne servent que pour l'état de la base dont elles proviennent
+_source_state = {"fingerprint": source_fingerprint(DATA_PATH), "next_check": 0.0}
 
-try:
-    # 2. UTILISER LE CHEMIN ABSOLU
-    model = joblib.load(MODEL_PATH)
-    print("✅ Modèle chargé avec succès.")
 
-    explainer = shap.TreeExplainer(model)
-    print("✅ Explainer SHAP créé avec succès.")
+def current_source_fingerprint() -> str:
+    """Empreinte du feature store, relue au plus toutes les FEATURE_CACHE_CHECK_INTERVAL secondes."""
+    now = time.monotonic()
+    if now >= _source_state["next_check"]:
+        _source_state["fingerprint"] = source_fingerprint(DATA_PATH)
+        _source_state["next_check"] = now + config.FEATURE_CACHE_CHECK_INTERVAL
+    return _source_state["fingerprint"]
 
-except Exception as e:
-    print(f"❌ Erreur lors du chargement du modèle ou de l'explainer : {e}")
-    model = None
-    explainer = None
 
-# Un verrou pour éviter les problèmes d'écriture simultanée sur le fichier
-file_lock = threading.Lock()
+def usable_shap_store(bundle):
+    """Magasin SHAP du bundle, ou None s'il a été calculé sur un autre état du feature store."""
+    shap_store = bundle.shap_store
+    if shap_store is None or shap_store.source_fingerprint != current_source_fingerprint():
+        return None
+    return shap_store
+
+
+def get_column_plan(bundle) -> ColumnPlan:
+    try:
+        columns = feature_store.columns
+    except Exception as e:
+        raise RuntimeError(f"Erreur de base de données : {e}")
+    return bundle.plan_for(columns, NewLoanRequest.model_fields)
+
+
+def warm_up(bundle, explainer: bool = False):
+    """
+    Inférence de chauffe sur des lignes synthétiques (une seule, puis un
+    petit lot) : les premiers appels au booster et à NumPy allouent leurs
+    tampons ici plutôt que pendant la première vraie requête. Avec
+    'explainer', l'explainer SHAP est aussi créé et chauffé.
+    """
+    plan = get_column_plan(bundle)
+    source_rows = np.full((8, len(plan.source_columns)), np.nan)
+    model_rows = plan.to_model_rows(source_rows)
+    bundle.score(model_rows[:1])
+    bundle.score(model_rows)
+    if bundle.micro_batcher is not None:
+        bundle.micro_batcher.predict(model_rows[:1], timeout=10)
+    if explainer:
+        compute_shap_values(bundle.explainer(), model_rows[:1])
+
+
+def create_explainer(model):
+    explainer = make_explainer(model, config.EXPLAINER_BACKEND)
+    print(f"✅ Explainer SHAP créé avec succès (backend '{config.EXPLAINER_BACKEND}').")
+    return explainer
+
+
+def check_compatibility(bundle):
+    """
+    Refuse un modèle qui n'est pas un classifieur binaire ou dont trop de
+    features manquent dans le feature store (MODEL_MAX_MISSING_FEATURES).
+    """
+    classes = getattr(bundle.model, "classes_", None)
+    if classes is not None and len(classes) != 2:
+        raise ValueError(f"Le modèle doit être un classifieur binaire ({len(classes)} classes).")
+    plan = get_column_plan(bundle)
+    if len(plan.missing_features) > config.MODEL_MAX_MISSING_FEATURES:
+        raise ValueError(f"{len(plan.missing_features)} features du modèle absentes du feature store : "
+                         f"{plan.missing_features[:10]}")
+
+
+def build_bundle(loaded_model, path, version: str, tracker, shared: bool = False):
+    """
+    Construit le bundle d'un modèle déjà chargé : moteur NumPy (optionnel),
+    micro-batching (optionnel) et valeurs SHAP pré-calculées. Avec 'shared',
+    le moteur préparé par app/serve.py est réutilisé s'il correspond.
+    """
+    fingerprint = model_fingerprint(loaded_model)
+
+    # Moteur d'inférence NumPy optionnel (repli sur LightGBM s'il ne peut être compilé)
+    tree_engine = None
+    if config.INFERENCE_ENGINE == "numpy":
+        try:
+            with tracker.phase("moteur NumPy"):
+                shared_engine = None
+                if shared and SHARED_ARTIFACTS_DIR is not None:
+                    shared_engine = TreeEnsemble.load(SHARED_ARTIFACTS_DIR / SHARED_TREE_ENGINE_SUBDIR, fingerprint)
+                tree_engine = shared_engine or TreeEnsemble.from_booster(loaded_model)
+            origin = "partagé" if shared_engine is not None else "compilé"
+            print(f"✅ Moteur d'inférence NumPy {origin} ({tree_engine.num_trees} arbres).")
+        except Exception as e:
+            print(f"❌ Moteur d'inférence NumPy indisponible, repli sur LightGBM : {e}")
+
+    # Magasin produit par scripts/precompute_shap.py (ignoré s'il vient d'un
+    # autre modèle ou d'un autre état du feature store)
+    with tracker.phase("magasin SHAP"):
+        shap_store = ShapStore.load(SHAP_STORE_DIR, fingerprint, current_source_fingerprint())
+    if shap_store is not None:
+        print(f"✅ Valeurs SHAP pré-calculées chargées ({shap_store.shap_values.shape[0]} clients).")
+    elif (SHAP_STORE_DIR / ShapStore.META_FILE).exists():
+        print("⚠️ Magasin SHAP ignoré : calculé pour un autre modèle ou un autre feature store "
+              "(relancez scripts/precompute_shap.py).")
+
+    bundle = ModelBundle(
+        loaded_model, version or default_version(path, fingerprint), fingerprint, path=path,
+        tree_engine=tree_engine, shap_store=shap_store, explainer_factory=create_explainer,
+    )
+
+    # Regroupement optionnel des /predict concurrents en un seul appel au modèle
+    if config.MICRO_BATCHING_ENABLED:
+        bundle.enable_micro_batching(
+            config.MICRO_BATCH_MAX_SIZE, config.MICRO_BATCH_MAX_WAIT_MS, config.MICRO_BATCH_TIMEOUT_SECONDS,
+            batch_size_observer=micro_batch_size.observe if config.METRICS_ENABLED else None,
+            queue_delay_observer=micro_batch_queue_delay.observe if config.METRICS_ENABLED else None,
+        )
+        print(f"✅ Micro-batching activé (lots de {config.MICRO_BATCH_MAX_SIZE} max, "
+              f"attente {config.MICRO_BATCH_MAX_WAIT_MS} ms max).")
+    return bundle
+
+
+def load_model_file(path):
+    import joblib
+    return joblib.load(path)
+
+
+def load_artifacts():
+    """
+    Charge le modèle et tout ce qui en dépend, phase par phase. Exécuté dans
+    un thread de fond (ou directement si STARTUP_BACKGROUND_LOADING=0).
+    """
+    global feature_store, drift_monitor
+
+    try:
+        with startup.phase("modèle"):
+            loaded_model = load_model_file(MODEL_PATH)
+        print("✅ Modèle chargé avec succès.")
+    except Exception as e:
+        print(f"❌ Erreur lors du chargement du modèle : {e}")
+        startup.finish(error=f"Modèle non disponible : {e}")
+        return
+
+    # Backend optionnel : toute la table en mémoire, dans l'ordre des features du modèle
+    if config.FEATURE_STORE_BACKEND == "array":
+        try:
+            with startup.phase("feature store en mémoire"):
+                if SHARED_ARTIFACTS_DIR is not None:
+                    # Worker de app/serve.py : matrice préparée par le parent, jamais reconstruite ici
+                    array_store = ArrayFeatureStore.load(
+                        SHARED_ARTIFACTS_DIR / SHARED_FEATURES_SUBDIR,
+                        ArrayFeatureStore.fingerprint(DATA_PATH, loaded_model.feature_name_),
+                    )
+                    if array_store is None:
+                        raise RuntimeError(f"matrice partagée absente ou périmée dans '{SHARED_ARTIFACTS_DIR}'")
+                else:
+                    array_store = ArrayFeatureStore.load_or_build(DATA_PATH, loaded_model.feature_name_,
+                                                                  FEATURE_ARRAY_DIR)
+            feature_store = array_store
+            print(f"✅ Feature store en mémoire chargé ({array_store.matrix.shape[0]} clients).")
+            if array_store.missing_columns:
+                print(f"⚠️ Features du modèle absentes de la base : {array_store.missing_columns}")
+        except Exception as e:
+            print(f"❌ Erreur lors du chargement du feature store en mémoire, repli sur SQLite : {e}")
+
+    # Backend optionnel : table de service, un vecteur float32 par client
+    elif config.FEATURE_STORE_BACKEND == "vectors":
+        try:
+            with startup.phase("table de vecteurs"):
+                vector_store = VectorFeatureStore(FEATURE_VECTORS_PATH)
+                expected = ArrayFeatureStore.fingerprint(DATA_PATH, loaded_model.feature_name_)
+                if vector_store.source_fingerprint != expected:
+                    vector_store.close()
+                    raise RuntimeError(f"table '{FEATURE_VECTORS_PATH}' périmée (base ou features du modèle "
+                                       "modifiées), relancer scripts/build_feature_vectors.py")
+            feature_store = vector_store
+            print(f"✅ Table de vecteurs chargée ({len(vector_store.feature_names)} features par client).")
+            if vector_store.missing_columns:
+                print(f"⚠️ Features du modèle absentes de la base : {vector_store.missing_columns}")
+        except Exception as e:
+            print(f"❌ Erreur lors du chargement de la table de vecteurs, repli sur SQLite : {e}")
+
+    if config.DRIFT_ENABLED:
+        if DRIFT_PROFILE_PATH.exists():
+            try:
+                with startup.phase("profil de dérive"):
+                    drift_monitor = DriftMonitor(
+                        ReferenceProfile.load(DRIFT_PROFILE_PATH),
+                        bucket_seconds=config.DRIFT_BUCKET_SECONDS,
+                        retention_seconds=config.DRIFT_RETENTION_SECONDS,
+                    )
+                print(f"✅ Profil de référence chargé ({len(drift_monitor.profile.features)} features) : "
+                      "suivi de la dérive actif.")
+            except Exception as e:
+                print(f"❌ Erreur lors du chargement du profil de référence, suivi de la dérive désactivé : {e}")
+        else:
+            print(f"ℹ️ Profil de référence absent ('{DRIFT_PROFILE_PATH}') : suivi de la dérive désactivé.")
+
+    bundle = build_bundle(loaded_model, MODEL_PATH, config.MODEL_VERSION, startup, shared=True)
+    if drift_monitor is not None:
+        reference_model = drift_monitor.profile.metadata.get("model_fingerprint")
+        if reference_model != bundle.fingerprint:
+            print("⚠️ Profil de référence scoré par un autre modèle (ou sans empreinte) : "
+                  "la dérive du score ne sera pas comparée.")
+
+    with startup.phase("schéma du feature store"):
+        try:
+            get_column_plan(bundle)
+        except RuntimeError as e:
+            print(f"❌ Impossible de lire le schéma du feature store : {e}")
+
+    try:
+        with startup.phase("chauffe"):
+            warm_up(bundle)
+    except Exception as e:
+        # La chauffe est une optimisation : l'API reste utilisable sans elle
+        print(f"⚠️ Inférence de chauffe impossible : {e}")
+
+    registry.swap(bundle)
+    startup.finish()
+
+    # Explainer créé juste après la mise en service si demandé (sinon à la
+    # première explication)
+    if config.EXPLAINER_PRELOAD:
+        try:
+            get_explainer(bundle)
+        except HTTPException:
+            pass
+
+
+def reload_model(path, version: str = None):
+    """
+    Prépare un nouveau modèle en arrière-plan puis l'échange avec le modèle
+    courant : chargement, vérification de compatibilité, explainer, chauffe.
+    Une erreur à n'importe quelle étape laisse le modèle courant en place.
+    """
+    def loader(tracker):
+        with tracker.phase("modèle"):
+            loaded_model = load_model_file(path)
+        bundle = build_bundle(loaded_model, path, version, tracker)
+        try:
+            with tracker.phase("compatibilité"):
+                check_compatibility(bundle)
+            with tracker.phase("explainer et chauffe"):
+                warm_up(bundle, explainer=True)
+        except Exception:
+            bundle.close()
+            raise
+        return bundle
+
+    return registry.reload_in_background(loader)
+
+
+def current_model():
+    """
+    Bundle du modèle courant, pris une seule fois par requête. Les requêtes
+    arrivées pendant le chargement attendent sa fin (au plus
+    STARTUP_REQUEST_TIMEOUT secondes) au lieu d'échouer aussitôt.
+    """
+    if not startup.wait(config.STARTUP_REQUEST_TIMEOUT):
+        raise HTTPException(status_code=503, detail="Modèle en cours de chargement.",
+                            headers={"Retry-After": "1"})
+    bundle = registry.current
+    if bundle is None:
+        raise HTTPException(status_code=503, detail="Modèle non disponible.")
+    return bundle
+
+
+def get_explainer(bundle):
+    """Explainer SHAP du bundle, créé à la première demande (l'import de 'shap' est coûteux)."""
+    if bundle.explainer_ready:
+        return bundle.explainer()
+    try:
+        with startup.phase("explainer"):
+            return bundle.explainer()
+    except Exception as e:
+        print(f"❌ Erreur lors de la création de l'explainer : {e}")
+        raise HTTPException(status_code=503, detail="Explainer SHAP non disponible.")
+
+
+# Journal des prédictions : écrit en arrière-plan, par paquets, dans le CSV
+# historique et dans des segments Parquet
+prediction_log = PredictionLogWriter(
+    csv_path=PREDICTIONS_LOG_PATH if config.PREDICTION_LOG_CSV else None,
+    segments_dir=PREDICTIONS_SEGMENTS_DIR if config.PREDICTION_LOG_SEGMENTS else None,
+    queue_size=config.PREDICTION_LOG_QUEUE_SIZE,
+    flush_rows=config.PREDICTION_LOG_FLUSH_ROWS,
+    flush_interval=config.PREDICTION_LOG_FLUSH_INTERVAL,
+    segment_max_rows=config.PREDICTION_LOG_SEGMENT_ROWS,
+    segment_max_seconds=config.PREDICTION_LOG_SEGMENT_SECONDS,
+    backpressure=config.PREDICTION_LOG_BACKPRESSURE,
+    sample_rate=config.PREDICTION_LOG_SAMPLE_RATE,
+    wait_observer=log_wait.observe if config.METRICS_ENABLED else None,
+)
+
+
+def collect_component_metrics():
+    """Valeurs lues dans les statistiques des composants au moment du rendu de /metrics."""
+    log_stats = prediction_log.stats()
+    samples = [
+        ("scoring_api_ready", "gauge", "1 si le modèle est chargé et chauffé.",
+         [({}, int(startup.ready.is_set()))]),
+        ("scoring_api_prediction_log_rows_total", "counter", "Lignes du journal des prédictions.",
+         [({"state": state}, log_stats[f"rows_{state}"]) for state in ("logged", "written", "dropped")]),
+        ("scoring_api_prediction_log_queue_depth", "gauge", "Lignes en attente d'écriture.",
+         [({}, log_stats["queue_depth"])]),
+    ]
+    if limiters:
+        pools = {limiter.name: limiter.stats() for limiter in limiters}
+        samples.append(("scoring_api_queue_depth", "gauge", "Requêtes en attente d'un thread, par pool.",
+                        [({"pool": name}, stats["queued"]) for name, stats in pools.items()]))
+        samples.append(("scoring_api_shed_total", "counter", "Requêtes rejetées par surcharge, par pool.",
+                        [({"pool": name, "reason": reason}, stats[f"shed_{reason}"])
+                         for name, stats in pools.items() for reason in ("queue_full", "deadline")]))
+    cache_stats = feature_store.stats().get("cache")
+    if cache_stats is not None:
+        samples.append(("scoring_api_feature_cache_requests_total", "counter",
+                        "Lectures du cache des lignes clients.",
+                        [({"result": "hit"}, cache_stats["hits"]), ({"result": "miss"}, cache_stats["misses"])]))
+    return samples
+
+
+metrics.add_collector(collect_component_metrics)
+
+if config.STARTUP_BACKGROUND_LOADING:
+    startup.run_in_background(load_artifacts)
+else:
+    load_artifacts()
+
+
+# --- Limites de concurrence : un pool de threads et une file bornée par groupe d'endpoints ---
+predict_limiter = shap_limiter = batch_limiter = None
+if config.CONCURRENCY_LIMITS_ENABLED:
+    predict_limiter = EndpointLimiter("predict", config.PREDICT_MAX_CONCURRENCY,
+                                      config.PREDICT_MAX_QUEUE, config.PREDICT_MAX_WAIT_MS)
+    shap_limiter = EndpointLimiter("shap", config.SHAP_MAX_CONCURRENCY,
+                                   config.SHAP_MAX_QUEUE, config.SHAP_MAX_WAIT_MS)
+    batch_limiter = EndpointLimiter("batch", config.BATCH_MAX_CONCURRENCY,
+                                    config.BATCH_MAX_QUEUE, config.BATCH_MAX_WAIT_MS)
+limiters = [limiter for limiter in (predict_limiter, shap_limiter, batch_limiter) if limiter is not None]
+
+
+async def run_limited(limiter, fn, *args):
+    """Exécute un handler synchrone dans le pool de son endpoint (ou celui de Starlette sans limites)."""
+    if limiter is None:
+        return await run_in_threadpool(fn, *args)
+    return await limiter.run(fn, *args)
+
+
+def encoded_response(content, media_type: str = JSON_MEDIA_TYPE, headers: dict = None) -> Response:
+    """Réponse encodée directement (tableaux NumPy compris), sans jsonable_encoder."""
+    return Response(content=encode(content, media_type), media_type=media_type, headers=headers)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail},
+                        headers={"Retry-After": str(exc.retry_after)})
+
+
+@app.on_event("shutdown")
+def flush_prediction_log():
+    prediction_log.stop()
+    for limiter in limiters:
+        limiter.shutdown()
 
 
 @app.api_route("/", methods=["GET", "HEAD"])
@@ -46,112 +481,523 @@ def read_root():
     return JSONResponse(content={"message": "API de scoring en ligne et fonctionnelle."})
 
 
+@app.get("/ready")
+def read_ready():
+    """
+    Sonde de disponibilité (readiness) : 200 une fois le modèle chargé et
+    l'inférence de chauffe faite, 503 avant (ou si le chargement a échoué).
+    L'endpoint "/" reste la sonde de vie (liveness).
+    """
+    report = startup.report()
+    if not report["ready"]:
+        return JSONResponse(status_code=503, content=report, headers={"Retry-After": "1"})
+    return report
+
+
 @app.post("/predict", response_model=PredictionResponse)
-def predict(request: NewLoanRequest):
-    if model is None:
-        raise HTTPException(status_code=503, detail="Modèle non disponible.")
+async def predict(request: NewLoanRequest):
+    """Score une demande de prêt (pool de threads dédié aux prédictions)."""
+    return await run_limited(predict_limiter, predict_sync, request)
 
+
+def predict_sync(request: NewLoanRequest):
+    bundle = current_model()
+    timer = StageTimer(stage_duration, "predict")
+
+    new_loan_data = request.model_dump()
     try:
-        client_data_df = prepare_data_for_prediction(
-            client_id=request.SK_ID_CURR,
-            new_loan_data=request.dict(),
-            db_path=DATA_PATH
-        )
+        plan = get_column_plan(bundle)
+        source_row = fetch_source_row(feature_store, request.SK_ID_CURR, plan)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
+    timer.lap("fetch")
 
-    data_to_log = client_data_df.copy()
+    # Surcharge sur place par les champs de la demande, puis alignement sur le modèle
+    plan.apply_overrides(source_row, new_loan_data)
+    model_rows = plan.to_model_rows(source_row)
+    timer.lap("align")
+    try:
+        score = bundle.score_one(model_rows)
+    except TimeoutError:
+        raise HTTPException(status_code=503, detail="Délai dépassé pour le calcul du score.")
+    prediction = 1 if score > 0.5 else 0
+    timer.lap("score")
 
-    client_data_df.fillna(0, inplace=True)
-    model_features = model.feature_name_
-    client_data_df = client_data_df.reindex(columns=model_features, fill_value=0)
+    # On journalise la ligne (colonnes de la base) avec le score et la prédiction
+    prediction_log.log(plan.source_columns, source_row, {
+        ID_COLUMN: [request.SK_ID_CURR],
+        'SCORE': [score],
+        'PREDICTION': [prediction],
+        MODEL_VERSION_COLUMN: [bundle.version],
+    })
+    timer.lap("log")
+    if drift_monitor is not None:
+        drift_monitor.observe(plan.source_columns, source_row, [score], bundle.fingerprint)
+        timer.lap("drift")
 
-    score = model.predict_proba(client_data_df)[:, 1][0]
-    prediction = 1 if score > 0.5 else 0
+    return encoded_response({"prediction": prediction, "score": score, "model_version": bundle.version})
 
-    # On ajoute le score et la prédiction au DataFrame à sauvegarder
-    data_to_log['SCORE'] = score
-    data_to_log['PREDICTION'] = prediction
-
-    # On sauvegarde dans le fichier CSV en utilisant un verrou
-    with file_lock:
-        data_to_log.to_csv(
-            PREDICTIONS_LOG_PATH,
-            mode='a',
-            header=not os.path.exists(PREDICTIONS_LOG_PATH),
-            index=False
+
+@app.post("/predict_batch", response_model=BatchPredictionResponse)
+async def predict_batch(requests: List[NewLoanRequest], accept: Optional[str] = Header(None)):
+    """Score un lot de demandes (pool de threads dédié aux lots)."""
+    return await run_limited(batch_limiter, predict_batch_sync, requests, accept)
+
+
+def predict_batch_sync(requests: List[NewLoanRequest], accept: str = None):
+    """
+    Score un lot de demandes : lecture groupée des lignes clients, surcharge
+    vectorisée et un seul appel au modèle par paquet. Les clients inconnus
+    sont signalés individuellement. Réponse JSON, ou selon l'en-tête Accept
+    MessagePack ou Arrow IPC (une ligne par demande).
+    """
+    bundle = current_model()
+    if len(requests) > config.PREDICT_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Lot trop volumineux : {len(requests)} demandes (maximum {config.PREDICT_BATCH_MAX_SIZE})."
         )
 
-    return {"prediction": prediction, "score": float(score)}
+    try:
+        plan = get_column_plan(bundle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    results = []
+    chunk_size = max(1, config.PREDICT_BATCH_CHUNK_SIZE)
+    for start in range(0, len(requests), chunk_size):
+        chunk = requests[start:start + chunk_size]
+        client_ids = [request.SK_ID_CURR for request in chunk]
+        try:
+            source_rows, found = fetch_source_rows(feature_store, client_ids, plan)
+        except RuntimeError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+        new_loan_data = [request.model_dump() for request, ok in zip(chunk, found) if ok]
+        plan.apply_overrides_batch(source_rows, new_loan_data)
+        scores = bundle.score(plan.to_model_rows(source_rows)) if len(source_rows) else []
+        predictions = [1 if score > 0.5 else 0 for score in scores]
+
+        if len(source_rows):
+            prediction_log.log(plan.source_columns, source_rows, {
+                ID_COLUMN: [client_id for client_id, ok in zip(client_ids, found) if ok],
+                'SCORE': list(scores),
+                'PREDICTION': predictions,
+                MODEL_VERSION_COLUMN: [bundle.version] * len(predictions),
+            })
+            if drift_monitor is not None:
+                drift_monitor.observe(plan.source_columns, source_rows, scores, bundle.fingerprint)
+
+        scored = iter(zip(scores, predictions))
+        for client_id, ok in zip(client_ids, found):
+            if ok:
+                score, prediction = next(scored)
+                results.append({"SK_ID_CURR": client_id, "prediction": prediction, "score": float(score),
+                                "model_version": bundle.version, "error": None})
+            else:
+                results.append({
+                    "SK_ID_CURR": client_id,
+                    "prediction": None,
+                    "score": None,
+                    "model_version": None,
+                    "error": f"Client avec SK_ID_CURR {client_id} non trouvé dans la base de données."
+                })
+
+    media_type = negotiate(accept, available_media_types())
+    if media_type == ARROW_MEDIA_TYPE:
+        names = ("SK_ID_CURR", "prediction", "score", "model_version", "error")
+        return Response(content=columns_to_arrow({name: [item[name] for item in results] for name in names}),
+                        media_type=ARROW_MEDIA_TYPE)
+    return encoded_response({"results": results}, media_type)
+
+
+# --- Explications SHAP : cache des réponses (magasin pré-calculé chargé avec le modèle) ---
+explanation_cache = LRUCache(
+    max_entries=config.SHAP_CACHE_MAX_ENTRIES,
+    max_bytes=config.SHAP_CACHE_MAX_BYTES or None,
+    ttl=config.SHAP_CACHE_TTL_SECONDS or None,
+    sizeof=lambda response: estimate_size(response["shap_values"]) + estimate_size(response["feature_values"]),
+)
 
 
 # --- 3. NOUVEL ENDPOINT POUR LES EXPLICATIONS SHAP ---
 @app.get("/shap_explanation/{client_id}")
-def get_shap_explanation(client_id: int):
+async def get_shap_explanation(client_id: int, accept: Optional[str] = Header(None)):
+    """Explication SHAP d'un client (pool de threads dédié aux explications)."""
+    return await run_limited(shap_limiter, shap_explanation_sync, client_id, accept)
+
+
+def shap_explanation_sync(client_id: int, accept: str = None):
     """
     Fournit les données nécessaires pour une explication SHAP pour un client donné.
     Cette version est robuste aux changements de format de la librairie SHAP.
+    Les réponses sont mises en cache par (client, empreinte du modèle,
+    empreinte du feature store), avec
+    les vecteurs gardés en NumPy : ils sont encodés directement dans le
+    format demandé par l'en-tête Accept (JSON par défaut).
     """
-    if explainer is None or model is None:
-        raise HTTPException(status_code=503, detail="Explainer SHAP non disponible.")
-
-    try:
-        # On récupère les données du client
-        client_data_df = prepare_data_for_prediction(
-            client_id=client_id,
-            new_loan_data={"SK_ID_CURR": client_id},
-            db_path=DATA_PATH
-        )
-        client_data_df.fillna(0, inplace=True)
-        model_features = model.feature_name_
-        client_data_df = client_data_df.reindex(columns=model_features, fill_value=0)
+    bundle = current_model()
+    timer = StageTimer(stage_duration, "shap_explanation")
 
-        # Calculer les valeurs SHAP pour ce client
-        shap_values_output = explainer.shap_values(client_data_df)
+    cache_key = (client_id, bundle.fingerprint, current_source_fingerprint())
+    media_type = negotiate(accept, available_media_types())
+    cached = explanation_cache.get(cache_key)
+    timer.lap("cache")
+    if cached is not None:
+        return explanation_response(client_id, cached, media_type, bundle)
 
-        # --- Logique robuste pour gérer les différentes versions de SHAP ---
-        # Pour la valeur de base (expected_value)
-        if isinstance(explainer.expected_value, list):
-            base_value = explainer.expected_value[1]  # On prend la valeur pour la classe 1 (défaut)
-        else:
-            base_value = explainer.expected_value
+    try:
+        # On récupère les données du client, alignées sur le modèle
+        plan = get_column_plan(bundle)
+        model_rows = plan.to_model_rows(fetch_source_row(feature_store, client_id, plan))
+        timer.lap("fetch")
 
-        # Pour les valeurs SHAP
-        if isinstance(shap_values_output, list):
-            shap_values_for_prediction = shap_values_output[1][0]  # On prend les valeurs pour la classe 1
+        # Valeurs SHAP pré-calculées si le client est dans le magasin,
+        # calcul à la volée sinon
+        shap_store = usable_shap_store(bundle)
+        precomputed = shap_store.lookup(client_id) if shap_store is not None else None
+        if precomputed is not None:
+            base_value, shap_values_for_prediction = shap_store.base_value, precomputed
+            timer.lap("shap_store")
         else:
-            shap_values_for_prediction = shap_values_output[0]
+            base_value, shap_values = compute_shap_values(get_explainer(bundle), model_rows)
+            shap_values_for_prediction = shap_values[0]
+            timer.lap("shap_compute")
 
-        # Formater la réponse pour qu'elle soit facile à utiliser
+        # Formater la réponse pour qu'elle soit facile à utiliser (float64
+        # contigus : mêmes valeurs JSON que l'ancien .tolist())
         response_data = {
             "base_value": base_value,
-            "shap_values": shap_values_for_prediction.tolist(),
-            "feature_names": client_data_df.columns.tolist(),
-            "feature_values": client_data_df.iloc[0].tolist()
+            "shap_values": np.ascontiguousarray(shap_values_for_prediction, dtype=np.float64),
+            "feature_names": plan.feature_names,
+            "feature_values": model_rows[0]
         }
-        return response_data
+        explanation_cache.put(cache_key, response_data)
+        response = explanation_response(client_id, response_data, media_type, bundle)
+        timer.lap("format")
+        return response
 
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         # Cette ligne aidera à voir l'erreur précise dans les logs de Render si elle persiste
         import traceback
         print(f"Erreur détaillée dans get_shap_explanation: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Erreur lors du calcul SHAP : {e}")
 
+def explanation_response(client_id: int, explanation: dict, media_type: str, bundle) -> Response:
+    headers = {"X-Model-Version": bundle.version}
+    if media_type == ARROW_MEDIA_TYPE:
+        content = explanations_to_arrow([client_id], explanation["base_value"], explanation["feature_names"],
+                                        explanation["shap_values"][None, :], explanation["feature_values"][None, :])
+        return Response(content=content, media_type=ARROW_MEDIA_TYPE, headers=headers)
+    return encoded_response(explanation, media_type, headers)
+
+
+@app.post("/shap_explanation_batch")
+async def get_shap_explanation_batch(request: ShapBatchRequest, accept: Optional[str] = Header(None)):
+    """Explications SHAP d'un lot de clients (pool de threads dédié aux explications)."""
+    return await run_limited(shap_limiter, shap_explanation_batch_sync, request, accept)
+
+
+def shap_explanation_batch_sync(request: ShapBatchRequest, accept: str = None):
+    """
+    Explications SHAP pour plusieurs clients, calculées en une seule passe
+    vectorisée. Les noms de features ne sont envoyés qu'une fois ; avec
+    'top_k', chaque client ne reçoit que ses k features les plus influentes
+    (indices dans 'feature_names'). Réponse JSON, MessagePack ou flux Arrow
+    IPC (champ 'format' ou en-tête Accept).
+    """
+    bundle = current_model()
+    shap_store = usable_shap_store(bundle)
+    if len(request.client_ids) > config.SHAP_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Lot trop volumineux : {len(request.client_ids)} clients (maximum {config.SHAP_BATCH_MAX_SIZE})."
+        )
+
+    try:
+        plan = get_column_plan(bundle)
+        source_rows, found = fetch_source_rows(feature_store, request.client_ids, plan)
+        model_rows = plan.to_model_rows(source_rows)
+        client_ids = [client_id for client_id, ok in zip(request.client_ids, found) if ok]
+        not_found = [client_id for client_id, ok in zip(request.client_ids, found) if not ok]
+
+        # Valeurs pré-calculées quand elles existent, un seul calcul pour les autres
+        shap_values = np.empty(model_rows.shape, dtype=np.float64)
+        in_store = np.zeros(len(client_ids), dtype=bool)
+        base_value = None
+        if shap_store is not None and client_ids:
+            stored, in_store = shap_store.lookup_many(client_ids)
+            shap_values[in_store] = stored
+            base_value = shap_store.base_value
+        if not in_store.all():
+            base_value, live = compute_shap_values(get_explainer(bundle), model_rows[~in_store])
+            shap_values[~in_store] = live
+        if base_value is None:
+            base_value = base_value_of(get_explainer(bundle))
+
+        feature_values = model_rows
+        indices = None
+        if request.top_k is not None:
+            indices = top_k_indices(shap_values, request.top_k)
+            shap_values = np.take_along_axis(shap_values, indices, axis=1)
+            feature_values = np.take_along_axis(model_rows, indices, axis=1)
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    media_type = ARROW_MEDIA_TYPE if request.format == "arrow" else negotiate(accept, available_media_types())
+    if media_type == ARROW_MEDIA_TYPE:
+        content = explanations_to_arrow(client_ids, base_value, plan.feature_names,
+                                        shap_values, feature_values, indices)
+        headers = {"X-Not-Found": ",".join(str(client_id) for client_id in not_found),
+                   "X-Model-Version": bundle.version}
+        return Response(content=content, media_type=ARROW_MEDIA_TYPE, headers=headers)
+
+    explanations = []
+    for i, client_id in enumerate(client_ids):
+        item = {
+            "SK_ID_CURR": client_id,
+            "shap_values": shap_values[i],
+            "feature_values": feature_values[i],
+        }
+        if indices is not None:
+            item["feature_indices"] = indices[i]
+        explanations.append(item)
+    return encoded_response({
+        "base_value": base_value,
+        "feature_names": plan.feature_names,
+        "explanations": explanations,
+        "not_found": not_found,
+    }, media_type, {"X-Model-Version": bundle.version})
+
+
+# --- Endpoints de Maintenance : modèle servi et rechargement à chaud ---
+@app.get("/model")
+def model_info():
+    """Modèle courant, historique des échanges et état du dernier rechargement."""
+    return registry.stats()
+
+
+@app.post("/model/reload", status_code=202)
+def model_reload(request: ModelReloadRequest = None):
+    """
+    Charge un modèle du dossier du modèle courant en arrière-plan ; il remplace le
+    modèle courant une fois vérifié et chauffé. L'avancement se suit sur GET /model.
+    """
+    if not startup.ready.is_set():
+        raise HTTPException(status_code=503, detail="Le modèle initial n'est pas encore chargé.")
+    request = request or ModelReloadRequest()
+    path = MODEL_PATH
+    if request.file_name:
+        path = (MODEL_DIR / request.file_name).resolve()
+        if path.parent != MODEL_DIR.resolve():
+            raise HTTPException(status_code=400, detail="Le fichier doit se trouver dans le dossier des modèles.")
+        if not path.is_file():
+            raise HTTPException(status_code=404, detail=f"Fichier de modèle '{request.file_name}' introuvable.")
+    if not reload_model(path, request.version):
+        raise HTTPException(status_code=409, detail="Un rechargement est déjà en cours.")
+    return {"status": "rechargement lancé", "path": str(path)}
+
+
+# --- Endpoint de Maintenance : statistiques internes ---
+@app.get("/stats")
+def get_stats():
+    """
+    Expose les statistiques d'utilisation du feature store (pool de connexions,
+    taux de succès et évictions du cache), du journal des prédictions, des
+    explications SHAP et du micro-batching s'il est actif.
+    """
+    stats = {
+        "startup": startup.report(),
+        "model": registry.stats(),
+        "feature_store": feature_store.stats(),
+        "prediction_log": prediction_log.stats(),
+        "shap_cache": explanation_cache.stats(),
+    }
+    bundle = registry.current
+    if bundle is not None and bundle.shap_store is not None:
+        stats["shap_store"] = bundle.shap_store.stats()
+    if bundle is not None and bundle.micro_batcher is not None:
+        stats["micro_batching"] = bundle.micro_batcher.stats()
+    if limiters:
+        stats["concurrency"] = {limiter.name: limiter.stats() for limiter in limiters}
+    if drift_monitor is not None:
+        stats["drift"] = drift_monitor.stats()
+    return stats
+
+
+@app.get("/drift")
+def get_drift(window: Optional[int] = None, top: int = 20):
+    """
+    Dérive des données sur une fenêtre glissante (en secondes) : PSI et KS de
+    chaque feature et du score par rapport au profil de référence, features
+    triées par PSI décroissant ('top' premières, toutes si top=0). Le score
+    n'est comparé que si la référence a été scorée par le modèle courant.
+    """
+    if drift_monitor is None:
+        raise HTTPException(status_code=404, detail="Suivi de la dérive inactif (profil de référence absent, "
+                                                    "voir monitoring/build_reference_profile.py).")
+    window = window or config.DRIFT_WINDOW_SECONDS
+    if window <= 0 or window > drift_monitor.retention_seconds:
+        raise HTTPException(status_code=400, detail=f"Fenêtre invalide : {window} s (maximum "
+                                                    f"{drift_monitor.retention_seconds} s).")
+    if top < 0:
+        raise HTTPException(status_code=400, detail="'top' doit être positif ou nul.")
+    # Scores du modèle courant seulement : après un rechargement, ceux de
+    # l'ancien modèle ne sont plus mélangés aux nouveaux
+    bundle = registry.current
+    return encoded_response(drift_monitor.report(
+        window, psi_threshold=config.DRIFT_PSI_THRESHOLD, top=top or None, min_rows=config.DRIFT_MIN_ROWS,
+        model_fingerprint=bundle.fingerprint if bundle is not None else None,
+    ))
+
+
 # --- Endpoint de Maintenance pour Télécharger les Logs ---
 @app.get("/download_logs")
-def download_logs():
+def download_logs(request: Request, format: str = "csv", start: Optional[str] = None, end: Optional[str] = None,
+                  columns: Optional[str] = None, cursor: Optional[str] = None, limit: Optional[int] = None,
+                  compression: Optional[str] = None):
     """
-    Permet de télécharger le fichier de log des prédictions.
+    Export du journal des prédictions, envoyé par morceaux.
+
+    Sans filtre, le CSV historique est envoyé tel quel ; un en-tête Range
+    permet de reprendre un téléchargement interrompu. Avec ?format=parquet ou
+    l'un des filtres (?start= et ?end= en ISO 8601, ?columns=A,B, ?limit=N,
+    ?cursor=...), les lignes sont lues dans les segments Parquet ; l'en-tête
+    X-Next-Cursor donne le curseur à repasser pour n'obtenir ensuite que les
+    nouvelles lignes. Seuls les segments fermés sont exportés (rotation après
+    PREDICTION_LOG_SEGMENT_ROWS lignes ou PREDICTION_LOG_SEGMENT_SECONDS) :
+    l'export ne force pas de rotation, qui laisserait un petit segment à
+    chaque appel et ne concernerait que le worker qui répond. La compression
+    (gzip, zstd) se choisit avec ?compression= ou l'en-tête Accept-Encoding.
     """
-    if os.path.exists(PREDICTIONS_LOG_PATH):
-        return FileResponse(
-            path=PREDICTIONS_LOG_PATH,
-            filename="predictions_log.csv",
-            media_type='text/csv'
+    if format not in ("csv", "parquet"):
+        raise HTTPException(status_code=400, detail="Format inconnu : 'csv' ou 'parquet' attendu.")
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="'limit' doit être supérieur ou égal à 1.")
+    try:
+        # Parquet est déjà compressé : seulement sur demande explicite
+        encoding = negotiate_encoding(request.headers.get("accept-encoding") if format == "csv" else None,
+                                      compression)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    timer = StageTimer(stage_duration, "download_logs")
+    filtered = format == "parquet" or any(value is not None for value in (start, end, columns, cursor, limit))
+    # Les lignes encore en file d'attente sont écrites avant l'export
+    prediction_log.flush()
+    timer.lap("flush")
+
+    if not filtered:
+        return csv_log_response(request, encoding)
+
+    if not list_segments(PREDICTIONS_SEGMENTS_DIR):
+        raise HTTPException(status_code=404, detail="Aucun segment de log n'a encore été écrit.")
+    try:
+        export = SegmentExport(
+            PREDICTIONS_SEGMENTS_DIR,
+            columns=[name.strip() for name in columns.split(",") if name.strip()] if columns else None,
+            start=start, end=end, cursor=cursor, limit=limit,
         )
-    else:
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    timer.lap("plan")
+
+    headers = {
+        "Content-Disposition": f'attachment; filename="predictions_log.{format}"',
+        "X-Row-Count": str(export.rows),
+        "X-Has-More": "true" if export.has_more else "false",
+        "Vary": "Accept-Encoding",
+    }
+    if export.next_cursor:
+        headers["X-Next-Cursor"] = export.next_cursor
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    chunks = parquet_chunks(export) if format == "parquet" else csv_chunks(export)
+    media_type = "application/vnd.apache.parquet" if format == "parquet" else "text/csv"
+    return StreamingResponse(compress_chunks(chunks, encoding), media_type=media_type, headers=headers)
+
+
+def csv_log_response(request: Request, encoding: Optional[str]) -> Response:
+    """
+    Le CSV historique, lu par blocs. Le fichier ne fait que grandir (il est
+    renommé, pas réécrit, quand ses colonnes changent) : son inode sert d'ETag,
+    et une requête Range reçoit les octets demandés, sans compression.
+    """
+    try:
+        stat = os.stat(PREDICTIONS_LOG_PATH)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Le fichier de log n'a pas encore été créé.")
+    size = stat.st_size
+    etag = f'"{stat.st_ino:x}"'
+    headers = {
+        "Content-Disposition": 'attachment; filename="predictions_log.csv"',
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+    }
+
+    if_range = request.headers.get("if-range")
+    byte_range = None
+    if if_range is None or if_range == etag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except ValueError as e:
+            raise HTTPException(status_code=416, detail=str(e), headers={"Content-Range": f"bytes */{size}"})
+    if byte_range is not None:
+        first, last = byte_range
+        headers["Content-Range"] = f"bytes {first}-{last}/{size}"
+        headers["Content-Length"] = str(last - first + 1)
+        return StreamingResponse(iter_file(PREDICTIONS_LOG_PATH, first, last + 1), status_code=206,
+                                 media_type="text/csv", headers=headers)
+
+    # Taille figée au début : les lignes ajoutées pendant l'envoi attendent le prochain export
+    if encoding is None:
+        headers["Content-Length"] = str(size)
+    else:
+        headers["Content-Encoding"] = encoding
+    chunks = compress_chunks(iter_file(PREDICTIONS_LOG_PATH, 0, size), encoding)
+    return StreamingResponse(chunks, media_type="text/csv", headers=headers)
+
+
+# --- Endpoints de Maintenance : métriques et profileur ---
+@app.get("/metrics")
+def get_metrics():
+    """
+    Métriques au format texte de Prometheus : durées par route et par étape,
+    requêtes en cours, erreurs par code de statut, journal des prédictions.
+    """
+    if not config.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Métriques désactivées (METRICS_ENABLED=0).")
+    return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+def require_profiler():
+    if not config.PROFILER_ENABLED:
+        raise HTTPException(status_code=403, detail="Profileur désactivé (PROFILER_ENABLED=1 pour l'autoriser).")
+
+
+@app.get("/profiler")
+def get_profiler():
+    require_profiler()
+    return profiler.stats()
+
+
+@app.post("/profiler/start")
+def start_profiler(interval_ms: float = None):
+    """Démarre l'échantillonnage des piles de tous les threads (sans redémarrer l'API)."""
+    require_profiler()
+    profiler.start(interval_ms)
+    return profiler.stats()
+
+
+@app.post("/profiler/stop")
+def stop_profiler():
+    """Arrête l'échantillonnage et renvoie les piles au format « collapsed » (flamegraph)."""
+    require_profiler()
+    return Response(content=profiler.stop(), media_type="text/plain")
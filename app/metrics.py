@@ -0,0 +1,234 @@
+# app/metrics.py
+"""
+Métriques de l'API au format texte de Prometheus (endpoint /metrics).
+
+Compteurs, jauges et histogrammes minimalistes (thread-safe, sans dépendance
+externe), un middleware ASGI qui mesure chaque requête (durée, requêtes en
+cours, codes de statut) et un chronomètre par étape pour les handlers.
+"""
+import bisect
+import threading
+import time
+
+from starlette.routing import Match
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bornes par défaut des histogrammes de durée (en secondes)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    TYPE = ""
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.TYPE}"]
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = self._header()
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    TYPE = "counter"
+
+    def inc(self, labels=(), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+
+class Gauge(Counter):
+    TYPE = "gauge"
+
+    def dec(self, labels=(), amount: float = 1):
+        self.inc(labels, -amount)
+
+    def set(self, value, labels=()):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """Histogramme cumulatif (bornes 'le'), avec somme et nombre d'observations."""
+
+    TYPE = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels=()):
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Comptes par intervalle, somme, nombre
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self, labels=()) -> dict:
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                return {"count": 0, "sum": 0.0}
+            return {"count": series[2], "sum": series[1]}
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((labels, (list(counts), total, count))
+                           for labels, (counts, total, count) in self._values.items())
+        lines = self._header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    """
+    Ensemble des métriques exposées. Les 'collectors' sont appelés au moment
+    du rendu pour les valeurs lues ailleurs (statistiques des composants) :
+    ils retournent une liste de (nom, type, aide, [(labels dict, valeur)]).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                samples = collector()
+            except Exception as e:
+                print(f"⚠️ Métriques indisponibles ({getattr(collector, '__name__', collector)}) : {e}")
+                continue
+            for name, metric_type, help, values in samples:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in values:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """
+    Chronomètre par étape d'un handler : chaque appel à lap('étape')
+    enregistre le temps écoulé depuis l'appel précédent (ou la création).
+    """
+
+    __slots__ = ("histogram", "endpoint", "_last")
+
+    def __init__(self, histogram: Histogram, endpoint: str):
+        self.histogram = histogram
+        self.endpoint = endpoint
+        self._last = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        self.histogram.observe(now - self._last, (self.endpoint, stage))
+        self._last = now
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI : durée des requêtes, requêtes en cours et nombre de
+    réponses par route et code de statut. Les routes sont identifiées par leur
+    gabarit ('/shap_explanation/{client_id}'), les chemins inconnus par 'other'.
+    """
+
+    def __init__(self, app, routes, duration: Histogram, in_flight: Gauge, responses: Counter,
+                 errors: Counter):
+        self.app = app
+        self.routes = routes
+        self.duration = duration
+        self.in_flight = in_flight
+        self.responses = responses
+        self.errors = errors
+
+    def _route_of(self, scope) -> str:
+        for route in self.routes:
+            if route.matches(scope)[0] == Match.FULL:
+                return route.path
+        return "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = self._route_of(scope)
+        method = scope["method"]
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        self.in_flight.inc((route,))
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.duration.observe(time.perf_counter() - started, (route, method))
+            self.in_flight.dec((route,))
+            self.responses.inc((route, method, str(status[0])))
+            if status[0] >= 400:
+                self.errors.inc((route, str(status[0])))
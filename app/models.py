@@ -1,6 +1,6 @@
 # app/models.py
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 
 # --------------------------------------------------------------------
 # 1. MODÈLE POUR LA REQUÊTE (LES DONNÉES EN ENTRÉE)
@@ -45,4 +45,53 @@ class PredictionResponse(BaseModel):
     Définit la structure de la réponse de l'API.
     """
     prediction: int      # 0 pour "accepté", 1 pour "refusé"
-    score: float         # La probabilité de défaut (entre 0 et 1)
\ No newline at end of file
+    score: float         # La probabilité de défaut (entre 0 et 1)
+    model_version: Optional[str] = None  # Version du modèle qui a produit le score
+
+# --------------------------------------------------------------------
+# 3. MODÈLES POUR LE SCORING PAR LOT (/predict_batch)
+# --------------------------------------------------------------------
+class BatchPredictionItem(BaseModel):
+    """
+    Résultat pour une demande du lot. Si le client est inconnu, 'error' est
+    renseigné et le score est absent, sans faire échouer le reste du lot.
+    """
+    SK_ID_CURR: int
+    prediction: Optional[int] = None
+    score: Optional[float] = None
+    model_version: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchPredictionResponse(BaseModel):
+    """
+    Résultats du lot, dans l'ordre des demandes reçues.
+    """
+    results: List[BatchPredictionItem]
+
+
+# --------------------------------------------------------------------
+# 4. MODÈLE POUR LES EXPLICATIONS SHAP PAR LOT (/shap_explanation_batch)
+# --------------------------------------------------------------------
+class ShapBatchRequest(BaseModel):
+    """
+    Demande d'explications pour plusieurs clients. Avec 'top_k', seules les k
+    features les plus influentes de chaque client sont renvoyées ; 'format'
+    choisit entre JSON et un flux binaire Arrow IPC.
+    """
+    client_ids: List[int]
+    top_k: Optional[int] = Field(default=None, ge=1)
+    format: Literal["json", "arrow"] = "json"
+
+
+# --------------------------------------------------------------------
+# 5. RECHARGEMENT DU MODÈLE (/model/reload)
+# --------------------------------------------------------------------
+class ModelReloadRequest(BaseModel):
+    """
+    Modèle à charger : nom d'un fichier du dossier 'model/' (par défaut le
+    modèle de démarrage) et version à enregistrer avec ses prédictions (par
+    défaut dérivée du fichier et de l'empreinte du modèle).
+    """
+    file_name: Optional[str] = None
+    version: Optional[str] = None
@@ -0,0 +1,274 @@
+# app/prediction_log.py
+"""
+Journal des prédictions écrit en arrière-plan.
+
+Les handlers déposent leurs lignes dans une file bornée et repartent aussitôt ;
+un thread dédié les regroupe et les écrit par paquets (par nombre de lignes ou
+après un délai), dans le CSV historique et/ou dans des segments Parquet qui
+tournent (nouveau fichier après N lignes ou N secondes).
+"""
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+# pandas et pyarrow ne sont importés qu'à la première écriture (ou lecture) :
+# créer l'écrivain au démarrage de l'API reste instantané
+
+TIMESTAMP_COLUMN = "TIMESTAMP"
+MODEL_VERSION_COLUMN = "MODEL_VERSION"
+SEGMENT_PREFIX = "predictions-"
+SEGMENT_TIME_FORMAT = "%Y%m%dT%H%M%S%fZ"
+SEGMENT_SUFFIX = ".parquet"
+IN_PROGRESS_SUFFIX = ".inprogress"
+
+# Politiques quand la file est pleine
+BACKPRESSURE_POLICIES = ("block", "drop", "sample")
+
+# Messages de contrôle du thread d'écriture
+_STOP = object()
+_FLUSH = object()
+
+
+def segment_time_prefix(moment: datetime) -> str:
+    """Début du nom des segments datés de 'moment' : les noms se comparent comme les dates."""
+    return SEGMENT_PREFIX + moment.astimezone(timezone.utc).strftime(SEGMENT_TIME_FORMAT)
+
+
+def _segment_name() -> str:
+    # Le pid distingue les segments des différents workers uvicorn
+    return segment_time_prefix(datetime.now(timezone.utc)) + f"-{os.getpid()}{SEGMENT_SUFFIX}"
+
+
+def list_segments(segments_dir) -> list:
+    """Segments Parquet terminés (lisibles), du plus ancien au plus récent."""
+    segments_dir = Path(segments_dir)
+    if not segments_dir.is_dir():
+        return []
+    return sorted(segments_dir.glob(f"*{SEGMENT_SUFFIX}"))
+
+
+def read_segments(segments_dir, columns=None) -> "pd.DataFrame":
+    """Relit tous les segments terminés dans un seul DataFrame."""
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    segments = list_segments(segments_dir)
+    if not segments:
+        return pd.DataFrame(columns=columns)
+    tables = [pq.read_table(path, columns=columns) for path in segments]
+    return pa.concat_tables(tables, promote_options="default").to_pandas()
+
+
+class PredictionLogWriter:
+    """
+    Écrivain asynchrone du journal des prédictions.
+    """
+
+    def __init__(self, csv_path=None, segments_dir=None, queue_size: int = 10000,
+                 flush_rows: int = 500, flush_interval: float = 1.0,
+                 segment_max_rows: int = 100000, segment_max_seconds: float = 3600,
+                 backpressure: str = "block", sample_rate: float = 0.1, wait_observer=None):
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Politique inconnue : {backpressure!r} (attendu : {BACKPRESSURE_POLICIES})")
+        self.csv_path = Path(csv_path) if csv_path else None
+        self.segments_dir = Path(segments_dir) if segments_dir else None
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.segment_max_rows = segment_max_rows
+        self.segment_max_seconds = segment_max_seconds
+        self.backpressure = backpressure
+        self.sample_rate = sample_rate
+        # Appelé avec le temps (en secondes) passé à attendre la file et le verrou dans log()
+        self.wait_observer = wait_observer
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._stats = {"rows_logged": 0, "rows_written": 0, "rows_dropped": 0,
+                       "flushes": 0, "segments_closed": 0, "write_errors": 0}
+        self._segment = None
+        self._thread = threading.Thread(target=self._run, name="prediction-log-writer", daemon=True)
+        self._thread.start()
+
+    # --- Côté requêtes ---
+
+    def log(self, columns, rows: np.ndarray, extra: dict = None):
+        """
+        Dépose des lignes à journaliser. 'rows' est une matrice (une ligne par
+        prédiction) alignée sur 'columns' ; 'extra' ajoute ou remplace des
+        colonnes (score, prédiction, identifiant...).
+        """
+        rows = np.atleast_2d(rows)
+        extra = dict(extra or {})
+        extra.setdefault(TIMESTAMP_COLUMN, [datetime.now(timezone.utc).isoformat(timespec="milliseconds")] * len(rows))
+        item = (columns, rows, extra)
+
+        started = time.perf_counter()
+        if self.backpressure == "block":
+            self._queue.put(item)
+            accepted = True
+        else:
+            try:
+                self._queue.put_nowait(item)
+                accepted = True
+            except queue.Full:
+                # 'sample' : on garde quand même une fraction des lignes (en
+                # attendant une place), pour que le monitoring reste représentatif
+                accepted = self.backpressure == "sample" and random.random() < self.sample_rate
+                if accepted:
+                    self._queue.put(item)
+
+        with self._lock:
+            if accepted:
+                self._stats["rows_logged"] += len(rows)
+            else:
+                self._stats["rows_dropped"] += len(rows)
+        if self.wait_observer is not None:
+            self.wait_observer(time.perf_counter() - started)
+
+    def flush(self, rotate: bool = False, timeout: float = 10.0):
+        """
+        Force l'écriture des lignes en attente (et la fermeture du segment
+        courant si 'rotate'), puis attend qu'elle soit faite.
+        """
+        done = threading.Event()
+        self._queue.put((_FLUSH, done, rotate))
+        done.wait(timeout)
+
+    def stop(self):
+        """Écrit les lignes restantes, ferme le segment courant et arrête le thread."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout=30)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["queue_size"] = self._queue.maxsize
+        stats["backpressure"] = self.backpressure
+        return stats
+
+    # --- Thread d'écriture ---
+
+    def _run(self):
+        pending = []
+        pending_rows = 0
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            control = None
+            if item is _STOP or (item is not None and item[0] is _FLUSH):
+                control = item
+            elif item is not None:
+                pending.append(item)
+                pending_rows += len(item[1])
+
+            due = time.monotonic() - last_flush >= self.flush_interval
+            if pending and (control is not None or due or pending_rows >= self.flush_rows):
+                self._write(pending)
+                pending, pending_rows = [], 0
+            if due or control is not None:
+                last_flush = time.monotonic()
+                self._maybe_rotate(force=control is _STOP or (control is not None and control[2]))
+
+            if control is _STOP:
+                break
+            if control is not None:
+                control[1].set()
+
+    def _build_frame(self, items) -> "pd.DataFrame":
+        import pandas as pd
+
+        frames = []
+        # Les lignes qui partagent le même schéma sont empilées en une seule matrice
+        start = 0
+        while start < len(items):
+            columns, extra_names = items[start][0], items[start][2].keys()
+            end = start
+            while end < len(items) and items[end][0] is columns and items[end][2].keys() == extra_names:
+                end += 1
+            group = items[start:end]
+            frame = pd.DataFrame(np.vstack([rows for _, rows, _ in group]), columns=list(columns))
+            for name in extra_names:
+                frame[name] = [value for _, _, extra in group for value in extra[name]]
+            frames.append(frame)
+            start = end
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    def _write(self, items):
+        try:
+            frame = self._build_frame(items)
+            if self.csv_path is not None:
+                self._append_csv(frame)
+            if self.segments_dir is not None:
+                import pyarrow as pa
+                self._write_segment(pa.Table.from_pandas(frame, preserve_index=False))
+            with self._lock:
+                self._stats["rows_written"] += len(frame)
+                self._stats["flushes"] += 1
+        except Exception as e:
+            with self._lock:
+                self._stats["write_errors"] += 1
+            print(f"❌ Erreur lors de l'écriture du journal des prédictions : {e}")
+
+    def _append_csv(self, frame: "pd.DataFrame"):
+        """
+        Ajoute les lignes au CSV. Si ses colonnes ont changé (nouveau modèle,
+        nouvelle colonne journalisée), l'ancien fichier est d'abord renommé
+        pour ne pas mélanger deux en-têtes dans le même fichier.
+        """
+        if self.csv_path.exists():
+            with open(self.csv_path, encoding="utf-8") as f:
+                header = f.readline().rstrip("\r\n")
+            if header and header.split(",") != [str(name) for name in frame.columns]:
+                suffix = datetime.now(timezone.utc).strftime(".%Y%m%dT%H%M%SZ")
+                os.replace(self.csv_path, self.csv_path.with_name(self.csv_path.stem + suffix + self.csv_path.suffix))
+        frame.to_csv(self.csv_path, mode="a", header=not self.csv_path.exists(), index=False)
+
+    def _write_segment(self, table: "pa.Table"):
+        import pyarrow.parquet as pq
+
+        if self._segment is not None and not self._segment["writer"].schema.equals(table.schema):
+            self._close_segment()
+        if self._segment is None:
+            self.segments_dir.mkdir(parents=True, exist_ok=True)
+            path = self.segments_dir / (_segment_name() + IN_PROGRESS_SUFFIX)
+            self._segment = {
+                "path": path,
+                "writer": pq.ParquetWriter(path, table.schema, compression="zstd"),
+                "rows": 0,
+                "opened": time.monotonic(),
+            }
+        self._segment["writer"].write_table(table)
+        self._segment["rows"] += table.num_rows
+
+    def _maybe_rotate(self, force: bool = False):
+        segment = self._segment
+        if segment is None:
+            return
+        if force or segment["rows"] >= self.segment_max_rows \
+                or time.monotonic() - segment["opened"] >= self.segment_max_seconds:
+            self._close_segment()
+
+    def _close_segment(self):
+        segment, self._segment = self._segment, None
+        segment["writer"].close()
+        # Le segment ne devient visible des lecteurs qu'une fois complet, sous
+        # un nom daté de sa fermeture. Entre plusieurs workers, deux segments
+        # peuvent apparaître dans l'ordre inverse de leurs noms : les curseurs
+        # d'export en tiennent compte (voir log_export.SEGMENT_SETTLE_SECONDS)
+        os.replace(segment["path"], self.segments_dir / _segment_name())
+        with self._lock:
+            self._stats["segments_closed"] += 1
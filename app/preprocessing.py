@@ -1,40 +1,246 @@
 # app/preprocessing.py (Version finale avec base de données SQLite)
-import pandas as pd
+import numpy as np
 import sqlite3
 
+from .feature_store import ID_COLUMN, ArrayFeatureStore, VectorFeatureStore, get_feature_store
 
-def prepare_data_for_prediction(client_id: int, new_loan_data: dict, db_path: str) -> pd.DataFrame:
+# Backends dont les lignes sont déjà dans l'ordre des features du modèle
+MODEL_ORDERED_STORES = (ArrayFeatureStore, VectorFeatureStore)
+
+
+def prepare_data_for_prediction(client_id: int, new_loan_data: dict, db_path: str,
+                                store=None) -> "pd.DataFrame":
     """
     Prépare la ligne de données finale pour un client donné en l'interrogeant
     directement depuis la base de données SQLite.
+    Les connexions sont réutilisées via le pool du feature store ; avec le
+    backend en mémoire (ArrayFeatureStore), la base n'est pas interrogée ; avec
+    la table de vecteurs (VectorFeatureStore), une seule colonne est lue.
     """
-    conn = None  # Initialiser la connexion à None
-    try:
-        # 1. Se connecter à la base de données SQLite
-        conn = sqlite3.connect(db_path)
+    # Importé ici : l'API n'utilise que le chemin NumPy (ColumnPlan) et
+    # démarre ainsi sans charger pandas
+    import pandas as pd
 
-        # 2. Écrire la requête SQL pour récupérer la ligne du client
-        # L'utilisation de '?' est une protection contre les injections SQL.
-        query = f"SELECT * FROM features WHERE SK_ID_CURR = ?"
+    if store is None:
+        store = get_feature_store(db_path)
 
-        # 3. Exécuter la requête avec pandas
-        client_features = pd.read_sql_query(query, conn, params=(client_id,))
+    if isinstance(store, MODEL_ORDERED_STORES):
+        row = _row_view(store, client_id)
+        if row is None:
+            raise ValueError(f"Client avec SK_ID_CURR {client_id} non trouvé dans la base de données.")
+        # Copie en float64 : la vue peut être en lecture seule (mmap)
+        client_features = pd.DataFrame(row[None, :].astype("float64"), columns=store.feature_names)
+        client_features.insert(0, ID_COLUMN, client_id)
+        return _apply_overrides(client_features, new_loan_data)
 
+    try:
+        # La requête est paramétrée ('?') : protection contre les injections SQL.
+        row = store.fetch_row(client_id)
+        columns = store.columns
     except sqlite3.Error as e:
         raise RuntimeError(f"Erreur de base de données : {e}")
     except Exception as e:
         raise RuntimeError(f"Erreur inattendue : {e}")
-    finally:
-        # 5. S'assurer que la connexion est toujours fermée, même en cas d'erreur
-        if conn:
-            conn.close()
+
+    rows = [] if row is None else [row]
+    client_features = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
 
     if client_features.empty:
         raise ValueError(f"Client avec SK_ID_CURR {client_id} non trouvé dans la base de données.")
 
+    return _apply_overrides(client_features, new_loan_data)
+
+
+def _apply_overrides(client_features: "pd.DataFrame", new_loan_data: dict) -> "pd.DataFrame":
+    """
+    Remplace les valeurs de la base par celles fournies dans la demande de prêt.
+    """
+    import pandas as pd
+
     new_data_df = pd.DataFrame([new_loan_data])
     for col in new_data_df.columns:
         if col in client_features.columns:
             client_features.loc[:, col] = new_data_df[col].values
 
-    return client_features
\ No newline at end of file
+    return client_features
+
+
+class ColumnPlan:
+    """
+    Plan de colonnes calculé une seule fois au démarrage à partir du schéma de
+    la table 'features' et de model.feature_name_ : positions des champs de la
+    demande de prêt, permutation vers l'ordre du modèle et valeur de
+    remplissage. Une requête se résume alors à une ligne NumPy modifiée sur
+    place, sans DataFrame.
+    """
+
+    def __init__(self, source_columns, feature_names, override_fields, fill_value: float = 0.0):
+        self.source_columns = source_columns
+        self.feature_names = list(feature_names)
+        self.fill_value = fill_value
+
+        source_index = {name: i for i, name in enumerate(source_columns)}
+        # Position de chaque feature du modèle dans la ligne source (-1 si absente)
+        self.take = np.array([source_index.get(name, -1) for name in self.feature_names], dtype=np.intp)
+        self.missing_features = [name for name in self.feature_names if name not in source_index]
+        used = set(self.feature_names)
+        self.unused_columns = [name for name in source_columns if name not in used and name != ID_COLUMN]
+        self._has_missing = bool(self.missing_features)
+        self._safe_take = np.where(self.take >= 0, self.take, 0)
+
+        # Champs de la demande qui surchargent une colonne de la base
+        self.override_positions = {
+            field: source_index[field] for field in override_fields if field in source_index
+        }
+        # Colonnes qui doivent être numériques ; les autres (TEXT, catégories)
+        # peuvent rester non numériques dans la base, elles deviennent NaN
+        self.numeric_positions = frozenset(
+            [pos for pos in self.take.tolist() if pos >= 0] + list(self.override_positions.values())
+            + ([source_index[ID_COLUMN]] if ID_COLUMN in source_index else [])
+        )
+
+    def report(self):
+        """Affiche au démarrage les écarts de schéma entre la base et le modèle."""
+        if self.missing_features:
+            print(f"⚠️ {len(self.missing_features)} features du modèle absentes de la base "
+                  f"(remplies par {self.fill_value}) : {self.missing_features}")
+        if self.unused_columns:
+            print(f"ℹ️ {len(self.unused_columns)} colonnes de la base ignorées par le modèle.")
+
+    def summary(self) -> dict:
+        return {
+            "features": len(self.feature_names),
+            "source_columns": len(self.source_columns),
+            "missing_features": self.missing_features,
+            "unused_columns": len(self.unused_columns),
+            "override_fields": list(self.override_positions),
+        }
+
+    def apply_overrides(self, source_row: np.ndarray, new_loan_data: dict):
+        """Écrit sur place les valeurs de la demande (None devient NaN, comme avant)."""
+        for field, pos in self.override_positions.items():
+            if field in new_loan_data:
+                value = new_loan_data[field]
+                source_row[pos] = np.nan if value is None else value
+
+    def apply_overrides_batch(self, source_rows: np.ndarray, new_loan_data: list):
+        """Version vectorisée : une colonne entière est écrite par champ surchargé."""
+        for field, pos in self.override_positions.items():
+            present = [field in data for data in new_loan_data]
+            if not any(present):
+                continue
+            column = np.array(
+                [np.nan if data[field] is None else data[field] for data in new_loan_data if field in data],
+                dtype=np.float64,
+            )
+            if all(present):
+                source_rows[:, pos] = column
+            else:
+                source_rows[np.array(present), pos] = column
+
+    def to_model_rows(self, source_rows: np.ndarray) -> np.ndarray:
+        """
+        Réordonne des lignes sources (1D ou 2D) dans l'ordre du modèle et
+        remplace les valeurs manquantes par la valeur de remplissage.
+        """
+        rows = np.atleast_2d(source_rows)
+        model_rows = rows[:, self._safe_take]
+        if self._has_missing:
+            model_rows[:, self.take < 0] = np.nan
+        np.nan_to_num(model_rows, copy=False, nan=self.fill_value)
+        return model_rows
+
+
+def _row_view(store, client_id: int):
+    try:
+        return store.row_view(client_id)
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Erreur de base de données : {e}")
+
+
+def _as_float(value) -> float:
+    return np.nan if value is None else float(value)
+
+
+def _to_float_rows(rows, columns, plan=None) -> np.ndarray:
+    """
+    Convertit des lignes SQLite en matrice float64. Si une colonne n'est pas
+    numérique, la conversion se fait valeur par valeur : les valeurs non
+    numériques deviennent NaN dans les colonnes que le modèle n'utilise pas
+    ('plan'), et lèvent RuntimeError (erreur serveur, et non client inconnu)
+    dans celles qu'il utilise.
+    """
+    try:
+        return np.array(rows, dtype=np.float64).reshape(len(rows), len(columns))
+    except (TypeError, ValueError):
+        pass
+    numeric = plan.numeric_positions if plan is not None else None
+    source_rows = np.empty((len(rows), len(columns)), dtype=np.float64)
+    for i, row in enumerate(rows):
+        for j, value in enumerate(row):
+            try:
+                source_rows[i, j] = _as_float(value)
+            except (TypeError, ValueError):
+                if numeric is None or j in numeric:
+                    raise RuntimeError(f"Valeur non numérique dans la colonne '{columns[j]}' "
+                                       f"du feature store : {value!r}")
+                source_rows[i, j] = np.nan
+    return source_rows
+
+
+def fetch_source_row(store, client_id: int, plan: ColumnPlan = None) -> np.ndarray:
+    """
+    Retourne la ligne du client dans l'ordre de 'store.columns', sous forme
+    d'un vecteur float64 modifiable. Avec 'plan', les colonnes non numériques
+    inutilisées par le modèle sont tolérées (NaN).
+    """
+    if isinstance(store, MODEL_ORDERED_STORES):
+        view = _row_view(store, client_id)
+        if view is None:
+            raise ValueError(f"Client avec SK_ID_CURR {client_id} non trouvé dans la base de données.")
+        source_row = np.empty(view.shape[0] + 1, dtype=np.float64)
+        source_row[0] = client_id
+        source_row[1:] = view
+        return source_row
+
+    try:
+        row = store.fetch_row(client_id)
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Erreur de base de données : {e}")
+    except Exception as e:
+        raise RuntimeError(f"Erreur inattendue : {e}")
+
+    if row is None:
+        raise ValueError(f"Client avec SK_ID_CURR {client_id} non trouvé dans la base de données.")
+    return _to_float_rows([row], store.columns, plan)[0]
+
+
+def fetch_source_rows(store, client_ids, plan: ColumnPlan = None):
+    """
+    Version groupée de fetch_source_row : une seule requête indexée (ou une
+    recherche vectorisée en mémoire) pour tous les clients. Retourne
+    (lignes, masque) où 'masque' indique les clients trouvés ; 'lignes' ne
+    contient que ceux-là, dans l'ordre de la demande.
+    """
+    client_ids = [int(client_id) for client_id in client_ids]
+    if isinstance(store, MODEL_ORDERED_STORES):
+        try:
+            views, found = store.rows(client_ids)
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Erreur de base de données : {e}")
+        source_rows = np.empty((views.shape[0], views.shape[1] + 1), dtype=np.float64)
+        source_rows[:, 0] = np.asarray(client_ids, dtype=np.int64)[found]
+        source_rows[:, 1:] = views
+        return source_rows, found
+
+    try:
+        rows = store.fetch_rows(client_ids)
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Erreur de base de données : {e}")
+    except Exception as e:
+        raise RuntimeError(f"Erreur inattendue : {e}")
+
+    found = np.array([client_id in rows for client_id in client_ids], dtype=bool)
+    source_rows = _to_float_rows([rows[client_id] for client_id in client_ids if client_id in rows],
+                                 store.columns, plan)
+    return source_rows, found
@@ -0,0 +1,87 @@
+# app/profiling.py
+"""
+Profileur par échantillonnage, activable à chaud (POST /profiler/start).
+
+Un thread relève toutes les 'interval_ms' millisecondes la pile de chaque
+thread du serveur (sys._current_frames) et compte les piles identiques. Le
+résultat est au format « collapsed » (une pile par ligne, fonctions séparées
+par ';', suivie du nombre d'échantillons), lisible par flamegraph.pl ou
+speedscope. Rien n'est mesuré tant que le profileur est arrêté.
+"""
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class SamplingProfiler:
+
+    def __init__(self, interval_ms: float = 5.0, max_depth: int = 64):
+        self.interval_ms = interval_ms
+        self.max_depth = max_depth
+        self._samples = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_at = None
+        self._duration = 0.0
+        self.sample_count = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms: float = None):
+        """Démarre un nouvel enregistrement (les échantillons précédents sont effacés)."""
+        if self.running:
+            return
+        if interval_ms is not None:
+            self.interval_ms = interval_ms
+        with self._lock:
+            self._samples.clear()
+            self.sample_count = 0
+        self._stop.clear()
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        """Arrête l'enregistrement et retourne les piles au format collapsed."""
+        if self.running:
+            self._stop.set()
+            self._thread.join(timeout=5)
+            self._duration = time.monotonic() - self._started_at
+        return self.collapsed()
+
+    def _stack_of(self, frame) -> str:
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self):
+        own_id = threading.get_ident()
+        interval = self.interval_ms / 1000.0
+        while not self._stop.wait(interval):
+            stacks = [self._stack_of(frame) for thread_id, frame in sys._current_frames().items()
+                      if thread_id != own_id]
+            with self._lock:
+                self._samples.update(stacks)
+                self.sample_count += 1
+
+    def collapsed(self) -> str:
+        with self._lock:
+            items = self._samples.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def stats(self) -> dict:
+        duration = time.monotonic() - self._started_at if self.running else self._duration
+        return {
+            "running": self.running,
+            "interval_ms": self.interval_ms,
+            "samples": self.sample_count,
+            "distinct_stacks": len(self._samples),
+            "duration_s": round(duration, 3),
+        }
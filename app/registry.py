@@ -0,0 +1,174 @@
+# app/registry.py
+"""
+Registre des modèles : le modèle servi et tout ce qui en dérive (moteur
+d'inférence, explainer SHAP, plan de colonnes, valeurs SHAP pré-calculées)
+forment un « bundle » immuable.
+
+Un nouveau modèle est préparé en arrière-plan (chargement, vérification de
+compatibilité, chauffe), puis échangé d'un coup avec le modèle courant. Les
+requêtes prennent le bundle courant une seule fois au début de leur
+traitement : celles qui sont en cours se terminent donc sur l'ancien modèle.
+"""
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .batching import MicroBatcher, MicroBatcherStopped
+from .preprocessing import ColumnPlan
+from .startup import StartupTracker
+
+
+def default_version(path, fingerprint: str) -> str:
+    """Version d'un modèle sans MODEL_VERSION explicite : nom du fichier et début de l'empreinte."""
+    return f"{Path(path).stem}-{fingerprint[:8]}"
+
+
+class ModelBundle:
+    """
+    Un modèle chargé et ses dérivés. 'version' est l'identifiant enregistré
+    avec chaque prédiction ; 'fingerprint' l'empreinte du booster.
+    """
+
+    def __init__(self, model, version: str, fingerprint: str, path=None, tree_engine=None,
+                 shap_store=None, explainer_factory=None):
+        self.model = model
+        self.version = version
+        self.fingerprint = fingerprint
+        self.path = str(path) if path is not None else None
+        self.feature_names = list(model.feature_name_)
+        self.tree_engine = tree_engine
+        self.shap_store = shap_store
+        self.loaded_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.micro_batcher = None
+        self.micro_batch_timeout = None
+        self._explainer_factory = explainer_factory
+        self._explainer = None
+        self._explainer_lock = threading.Lock()
+        self._plan = None
+
+    def score(self, rows):
+        """
+        Probabilités de défaut (classe 1) pour une matrice déjà alignée sur le
+        modèle. Sans moteur NumPy, on appelle directement le booster : c'est ce
+        que fait predict_proba, sans la validation du wrapper sklearn.
+        """
+        if self.tree_engine is not None:
+            return self.tree_engine.predict(rows)
+        return self.model.booster_.predict(rows)
+
+    def score_one(self, model_row) -> float:
+        """
+        Score d'une seule ligne, via le micro-batching s'il est actif. Une
+        requête qui tient encore ce bundle après son remplacement (micro-batcher
+        arrêté) est scorée directement ; l'attente du lot est bornée par
+        'micro_batch_timeout' (TimeoutError au-delà).
+        """
+        if self.micro_batcher is not None:
+            try:
+                return self.micro_batcher.predict(model_row, timeout=self.micro_batch_timeout)
+            except MicroBatcherStopped:
+                pass
+        return float(self.score(model_row)[0])
+
+    def enable_micro_batching(self, max_batch_size: int, max_wait_ms: float, timeout: float = 10.0,
+                              batch_size_observer=None, queue_delay_observer=None):
+        self.micro_batch_timeout = timeout
+        self.micro_batcher = MicroBatcher(self.score, max_batch_size, max_wait_ms,
+                                          batch_size_observer, queue_delay_observer)
+
+    def plan_for(self, source_columns, override_fields) -> ColumnPlan:
+        """
+        Plan de colonnes (base -> modèle), calculé une fois et recalculé
+        seulement si le schéma du feature store change.
+        """
+        plan = self._plan
+        if plan is None or plan.source_columns is not source_columns:
+            plan = ColumnPlan(source_columns, self.feature_names, override_fields)
+            plan.report()
+            self._plan = plan
+        return plan
+
+    @property
+    def explainer_ready(self) -> bool:
+        return self._explainer is not None
+
+    def explainer(self):
+        """Explainer SHAP du modèle, créé à la première demande."""
+        if self._explainer is None:
+            with self._explainer_lock:
+                if self._explainer is None:
+                    self._explainer = self._explainer_factory(self.model)
+        return self._explainer
+
+    def close(self):
+        """Arrête le micro-batching (une fois les requêtes en cours terminées)."""
+        if self.micro_batcher is not None:
+            self.micro_batcher.stop()
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "fingerprint": self.fingerprint,
+            "path": self.path,
+            "loaded_at": self.loaded_at,
+            "features": len(self.feature_names),
+            "engine": "numpy" if self.tree_engine is not None else "lightgbm",
+            "explainer_ready": self.explainer_ready,
+            "shap_store": self.shap_store is not None,
+        }
+
+
+class ModelRegistry:
+    """
+    Modèle courant et rechargements. Un seul rechargement à la fois ; l'ancien
+    bundle est fermé après 'grace_seconds', le temps que les requêtes qui
+    l'utilisent se terminent.
+    """
+
+    def __init__(self, grace_seconds: float = 30.0, history_size: int = 10):
+        self.grace_seconds = grace_seconds
+        self.history_size = history_size
+        self.current = None
+        self.history = []
+        self.reload = None
+        self._lock = threading.Lock()
+
+    def swap(self, bundle: ModelBundle):
+        """Remplace le modèle courant (échange atomique de la référence)."""
+        with self._lock:
+            previous, self.current = self.current, bundle
+            self.history.append({"version": bundle.version, "fingerprint": bundle.fingerprint,
+                                 "activated_at": datetime.now(timezone.utc).isoformat(timespec="seconds")})
+            del self.history[:-self.history_size]
+        if previous is not None:
+            print(f"🔄 Modèle '{previous.version}' remplacé par '{bundle.version}'.")
+            timer = threading.Timer(self.grace_seconds, previous.close)
+            timer.daemon = True
+            timer.start()
+        return previous
+
+    def reload_in_background(self, loader) -> bool:
+        """
+        Lance loader(tracker) dans un thread de fond ; il doit retourner un
+        bundle prêt (vérifié et chauffé), qui devient alors le modèle courant.
+        Retourne False si un rechargement est déjà en cours.
+        """
+        with self._lock:
+            if self.reload is not None and not self.reload.finished.is_set():
+                return False
+            tracker = StartupTracker(label="Rechargement du modèle")
+            self.reload = tracker
+
+        def run():
+            self.swap(loader(tracker))
+
+        tracker.run_in_background(run)
+        return True
+
+    def stats(self) -> dict:
+        current = self.current
+        return {
+            "current": current.info() if current is not None else None,
+            "history": list(self.history),
+            "reload": self.reload.report() if self.reload is not None else None,
+        }
@@ -0,0 +1,109 @@
+# app/serialization.py
+"""
+Sérialisation rapide des réponses.
+
+Les tableaux NumPy sont encodés directement (orjson) au lieu de passer par
+.tolist() puis par le jsonable_encoder de FastAPI. Le client peut aussi
+demander, via l'en-tête Accept, un format binaire : MessagePack (si le package
+'msgpack' est installé) ou Arrow IPC. JSON reste le format par défaut.
+"""
+import json
+
+import numpy as np
+
+from .explanations import ARROW_MEDIA_TYPE
+
+try:
+    import orjson
+except ImportError:  # repli sur le module json standard
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # MessagePack indisponible : seuls JSON et Arrow sont proposés
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# Alias acceptés dans l'en-tête Accept
+_MEDIA_ALIASES = {
+    "application/x-msgpack": MSGPACK_MEDIA_TYPE,
+    "application/vnd.msgpack": MSGPACK_MEDIA_TYPE,
+    "application/vnd.apache.arrow.file": ARROW_MEDIA_TYPE,
+}
+
+
+def _to_builtin(value):
+    """Conversion des types NumPy non pris en charge nativement par l'encodeur."""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Type non sérialisable : {type(value).__name__}")
+
+
+def dumps_json(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_to_builtin, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_to_builtin, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_msgpack(content) -> bytes:
+    return msgpack.packb(content, default=_to_builtin, use_bin_type=True)
+
+
+def available_media_types(arrow: bool = True) -> list:
+    media_types = [JSON_MEDIA_TYPE]
+    if msgpack is not None:
+        media_types.append(MSGPACK_MEDIA_TYPE)
+    if arrow:
+        media_types.append(ARROW_MEDIA_TYPE)
+    return media_types
+
+
+def negotiate(accept: str, offered) -> str:
+    """
+    Choisit le format de réponse d'après l'en-tête Accept (préférences 'q'
+    comprises). Sans en-tête, avec '*/*' ou si aucun type demandé n'est
+    proposé, la réponse reste en JSON.
+    """
+    if not accept:
+        return JSON_MEDIA_TYPE
+    candidates = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            candidates.append((-quality, position, media_type.lower()))
+    for _, _, media_type in sorted(candidates):
+        media_type = _MEDIA_ALIASES.get(media_type, media_type)
+        if media_type in offered:
+            return media_type
+        if media_type in ("*/*", "application/*"):
+            return JSON_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+
+def encode(content, media_type: str = JSON_MEDIA_TYPE) -> bytes:
+    """Encode un contenu (dict, listes, tableaux NumPy) en JSON ou en MessagePack."""
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return dumps_msgpack(content)
+    return dumps_json(content)
+
+
+def columns_to_arrow(columns: dict) -> bytes:
+    """Encode des colonnes (nom -> liste ou tableau) en flux Arrow IPC."""
+    import pyarrow as pa
+
+    batch = pa.RecordBatch.from_pydict({name: pa.array(values) for name, values in columns.items()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
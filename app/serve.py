@@ -0,0 +1,154 @@
+# app/serve.py
+"""
+Service multi-processus : python -m app.serve --workers N
+
+Le processus parent prépare une seule fois la matrice des features (dans
+l'ordre du modèle) sous forme de fichiers .npy, de préférence dans /dev/shm
+(mémoire partagée) s'il a la place, sinon dans data/shared_artifacts. Les
+workers uvicorn l'ouvrent ensuite en mmap, en lecture seule : les pages sont
+partagées par le noyau, N workers coûtent donc à peu près une seule copie des
+données plus leur mémoire propre (interpréteur, booster LightGBM).
+
+Les workers gardent le booster LightGBM ; le moteur NumPy, plus lent, n'est
+partagé qu'à la demande (--tree-engine).
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+
+from . import config
+from .explanations import model_fingerprint
+from .feature_store import FEATURES_TABLE, ArrayFeatureStore
+from .tree_engine import TreeEnsemble
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MODEL_PATH = Path(config.MODEL_PATH or BASE_DIR / "model" / "model.pkl")
+DATA_DIR = Path(config.DATA_DIR or BASE_DIR / "data")
+DATA_PATH = DATA_DIR / "feature_store.db"
+
+# Sous-répertoires du répertoire partagé
+SHARED_FEATURES_SUBDIR = "features"
+SHARED_TREE_ENGINE_SUBDIR = "tree_engine"
+SHM_DIR = Path("/dev/shm")
+# Marge gardée libre en plus de la matrice (index, méta, moteur NumPy)
+SHARED_DIR_HEADROOM_BYTES = 16 * 1024**2
+
+
+def feature_matrix_bytes(db_path, n_features: int) -> int:
+    """Taille sur disque de la matrice float32 et de l'index int64 des clients."""
+    with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+        n_rows = conn.execute(f"SELECT COUNT(*) FROM {FEATURES_TABLE}").fetchone()[0]
+    return n_rows * (n_features * 4 + 8)
+
+
+def free_bytes(directory) -> int:
+    """Espace libre du système de fichiers qui contiendra 'directory'."""
+    directory = Path(directory)
+    while not directory.exists():
+        directory = directory.parent
+    return shutil.disk_usage(directory).free
+
+
+def default_shared_dir(required_bytes: int = 0) -> Path:
+    """
+    /dev/shm s'il existe (Linux) et a la place d'écrire les artefacts, sinon
+    data/shared_artifacts. Sous Docker, /dev/shm est limité à 64 MB sauf
+    option --shm-size.
+    """
+    if SHM_DIR.is_dir():
+        free = free_bytes(SHM_DIR)
+        if free >= required_bytes + SHARED_DIR_HEADROOM_BYTES:
+            return SHM_DIR / "scoring-api"
+        print(f"⚠️ /dev/shm trop petit ({free / 1024**2:.0f} MB libres, "
+              f"{required_bytes / 1024**2:.0f} MB nécessaires) : artefacts écrits sur disque. "
+              f"Sous Docker, augmentez --shm-size.")
+    return DATA_DIR / "shared_artifacts"
+
+
+def prepare_shared_artifacts(directory=None, model_path=MODEL_PATH, db_path=DATA_PATH,
+                             feature_matrix: bool = True, tree_engine: bool = False) -> dict:
+    """
+    Prépare (ou réutilise s'ils sont à jour) les artefacts partagés et
+    retourne les variables d'environnement à transmettre aux workers. Sans
+    'directory', /dev/shm est choisi s'il a la place (voir default_shared_dir).
+    """
+    import joblib
+
+    started = time.perf_counter()
+    model = joblib.load(model_path)
+    fingerprint = model_fingerprint(model)
+
+    required = 0
+    if feature_matrix:
+        required = feature_matrix_bytes(db_path, len(model.feature_name_))
+        matrix_fingerprint = ArrayFeatureStore.fingerprint(db_path, model.feature_name_)
+
+    def matrix_ready(root) -> bool:
+        return ArrayFeatureStore.load(Path(root) / SHARED_FEATURES_SUBDIR, matrix_fingerprint) is not None
+
+    if directory is None:
+        # Une matrice à jour déjà présente dans /dev/shm est réutilisée telle quelle
+        shm_dir = SHM_DIR / "scoring-api"
+        directory = shm_dir if feature_matrix and matrix_ready(shm_dir) else default_shared_dir(required)
+    directory = Path(directory)
+    env = {"SHARED_ARTIFACTS_DIR": str(directory)}
+
+    if feature_matrix:
+        if not matrix_ready(directory) and free_bytes(directory) < required:
+            raise RuntimeError(
+                f"Espace insuffisant dans '{directory}' pour la matrice des features : "
+                f"{required / 1024**2:.0f} MB nécessaires, {free_bytes(directory) / 1024**2:.0f} MB libres "
+                f"(sous Docker, augmentez --shm-size ou choisissez un autre --shared-dir)."
+            )
+        store = ArrayFeatureStore.load_or_build(db_path, model.feature_name_,
+                                                directory / SHARED_FEATURES_SUBDIR)
+        size_mb = store.matrix.nbytes / 1024**2
+        print(f"✅ Matrice des features partagée : {store.matrix.shape[0]} clients ({size_mb:.1f} MB).")
+        env["FEATURE_STORE_BACKEND"] = "array"
+
+    if tree_engine:
+        engine_dir = directory / SHARED_TREE_ENGINE_SUBDIR
+        try:
+            if TreeEnsemble.load(engine_dir, fingerprint) is None:
+                TreeEnsemble.from_booster(model).save(engine_dir, fingerprint)
+            print(f"✅ Moteur NumPy partagé (modèle {fingerprint}).")
+            env["INFERENCE_ENGINE"] = "numpy"
+        except NotImplementedError as e:
+            print(f"⚠️ Moteur NumPy non partagé, les workers utiliseront LightGBM : {e}")
+
+    print(f"✅ Artefacts partagés prêts dans '{directory}' en {time.perf_counter() - started:.1f} s.")
+    return env
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API de scoring servie par plusieurs workers uvicorn.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shared-dir", default=None,
+                        help="répertoire des artefacts partagés (défaut : /dev/shm/scoring-api s'il a "
+                             "la place, sinon data/shared_artifacts)")
+    parser.add_argument("--no-feature-matrix", action="store_true",
+                        help="les workers lisent SQLite au lieu de la matrice partagée")
+    parser.add_argument("--tree-engine", action="store_true",
+                        help="les workers utilisent le moteur NumPy partagé au lieu du booster "
+                             "LightGBM (plus lent, voir README)")
+    args = parser.parse_args(argv)
+
+    env = prepare_shared_artifacts(
+        args.shared_dir,
+        feature_matrix=not args.no_feature_matrix,
+        tree_engine=args.tree_engine,
+    )
+    # Les workers sont des processus neufs : ils lisent leur configuration dans l'environnement
+    os.environ.update(env)
+
+    import uvicorn
+    uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
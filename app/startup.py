@@ -0,0 +1,95 @@
+# app/startup.py
+"""
+Suivi du démarrage de l'API.
+
+Le chargement des artefacts (modèle, feature store, moteur d'inférence...) se
+fait dans un thread de fond pour que uvicorn puisse ouvrir le port tout de
+suite. Chaque phase est chronométrée ; l'API n'est déclarée prête (/ready)
+qu'une fois le chargement et l'inférence de chauffe terminés.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupTracker:
+    """
+    État du démarrage : phase en cours, durée de chaque phase (en ms), erreur
+    éventuelle. 'finished' est levé à la fin du chargement, réussi ou non ;
+    'ready' seulement s'il a réussi.
+    """
+
+    def __init__(self, label: str = "Démarrage", clock=time.perf_counter):
+        self.label = label
+        self._clock = clock
+        self._started = clock()
+        self._total_ms = None
+        self._lock = threading.Lock()
+        self.timings = {}
+        self.phase_name = "en attente"
+        self.error = None
+        self.finished = threading.Event()
+        self.ready = threading.Event()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Chronomètre une phase et l'affiche dans les logs."""
+        if not self.finished.is_set():
+            self.phase_name = name
+        started = self._clock()
+        try:
+            yield
+        finally:
+            elapsed_ms = (self._clock() - started) * 1000.0
+            with self._lock:
+                self.timings[name] = round(elapsed_ms, 2)
+            print(f"⏱️ {self.label} - {name} : {elapsed_ms:.1f} ms")
+
+    def finish(self, error: str = None):
+        """Termine le démarrage ; sans erreur, l'API devient prête."""
+        self._total_ms = (self._clock() - self._started) * 1000.0
+        self.error = error
+        self.phase_name = "erreur" if error else "prêt"
+        if error is None:
+            self.ready.set()
+            print(f"✅ {self.label} terminé en {self._total_ms:.1f} ms.")
+        else:
+            print(f"❌ {self.label} terminé avec une erreur en {self._total_ms:.1f} ms : {error}")
+        self.finished.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Attend la fin du chargement ; retourne False si le délai est dépassé."""
+        return self.finished.wait(timeout)
+
+    def run_in_background(self, target) -> threading.Thread:
+        """
+        Lance 'target' dans un thread de fond ; une exception non prévue
+        termine le démarrage en erreur plutôt que de le laisser en suspens.
+        """
+        def run():
+            try:
+                target()
+            except Exception as e:
+                if not self.finished.is_set():
+                    self.finish(error=str(e))
+            else:
+                if not self.finished.is_set():
+                    self.finish()
+
+        thread = threading.Thread(target=run, name="startup-loader", daemon=True)
+        thread.start()
+        return thread
+
+    def report(self) -> dict:
+        with self._lock:
+            timings = dict(self.timings)
+        total_ms = self._total_ms
+        if total_ms is None:
+            total_ms = (self._clock() - self._started) * 1000.0
+        return {
+            "ready": self.ready.is_set(),
+            "phase": self.phase_name,
+            "timings_ms": timings,
+            "total_ms": round(total_ms, 2),
+            "error": self.error,
+        }
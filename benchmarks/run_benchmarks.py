@@ -0,0 +1,283 @@
+# benchmarks/run_benchmarks.py
+# Suite de benchmarks reproductible, entièrement hors ligne :
+#   1. génère un feature store et un modèle synthétiques (benchmarks/synthetic.py) ;
+#   2. micro-benchmarks : prepare_data_for_prediction, lecture + alignement des
+#      colonnes, predict_proba, score du moteur servi, SHAP ;
+#   3. charge concurrente en mémoire (httpx + ASGI, sans réseau) sur /predict et
+#      /shap_explanation : débit (req/s) et latences p50/p95/p99.
+# Les résultats sont écrits en JSON et comparés, si demandé, à une référence
+# enregistrée sur la même machine (les chiffres d'une autre machine ne sont pas
+# comparables). Le code de sortie vaut 1 en cas de régression.
+#
+#   python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+#   python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json --tolerance 0.25
+#
+# La configuration de l'API se règle comme d'habitude par variables
+# d'environnement (INFERENCE_ENGINE=numpy, FEATURE_STORE_BACKEND=array...).
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.insert(0, PROJECT_ROOT)
+
+# Métriques comparées à la référence : (section, nom) -> sens de l'amélioration
+COMPARED_METRICS = {
+    ("micro", "p50_ms"): "lower",
+    ("load", "rps"): "higher",
+    ("load", "p95_ms"): "lower",
+    ("load", "p99_ms"): "lower",
+}
+
+
+def summarize(latencies) -> dict:
+    """Statistiques (en ms) d'une liste de durées en secondes."""
+    values = np.asarray(latencies) * 1000.0
+    return {
+        "count": int(values.size),
+        "mean_ms": round(float(values.mean()), 4),
+        "p50_ms": round(float(np.percentile(values, 50)), 4),
+        "p95_ms": round(float(np.percentile(values, 95)), 4),
+        "p99_ms": round(float(np.percentile(values, 99)), 4),
+        "max_ms": round(float(values.max()), 4),
+    }
+
+
+def bench(fn, repeat: int, warmup: int = 5) -> dict:
+    """Chronomètre fn(i) 'repeat' fois (i change à chaque appel), après quelques appels de chauffe."""
+    for i in range(warmup):
+        fn(i)
+    latencies = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - started)
+    return summarize(latencies)
+
+
+def run_micro_benchmarks(main, client_ids, repeat: int) -> dict:
+    """
+    Étapes de /predict et /shap_explanation mesurées une à une, sur les
+    composants tels que l'API les a configurés (feature store, moteur, explainer).
+    """
+    import pandas as pd
+
+    from app.explanations import compute_shap_values
+    from app.preprocessing import fetch_source_row, prepare_data_for_prediction
+
+    bundle = main.current_model()
+    plan = main.get_column_plan(bundle)
+    store = main.feature_store
+    explainer = main.get_explainer(bundle)
+
+    n = max(repeat, 5)
+    ids = [int(client_ids[(i * 7919) % len(client_ids)]) for i in range(n)]
+    loans = [{"SK_ID_CURR": client_id, "AMT_CREDIT": 406597.5, "AMT_INCOME_TOTAL": 202500.0,
+              "AMT_ANNUITY": 24700.5, "DAYS_BIRTH": -9461, "DAYS_EMPLOYED": -637} for client_id in ids]
+    source_rows = [fetch_source_row(store, client_id) for client_id in ids]
+    model_rows = [plan.to_model_rows(row) for row in source_rows]
+    frames = [pd.DataFrame(rows, columns=bundle.feature_names) for rows in model_rows]
+    batch = np.vstack(model_rows * (1000 // n + 1))[:1000]
+
+    return {
+        # Ancien chemin pandas (une requête SQL, DataFrame, surcharges)
+        "prepare_data_for_prediction": bench(
+            lambda i: prepare_data_for_prediction(ids[i], loans[i], main.DATA_PATH), repeat),
+        # Chemin servi : lecture (cache compris s'il est actif) puis alignement NumPy
+        "fetch_source_row": bench(lambda i: fetch_source_row(store, ids[i]), repeat),
+        "align": bench(lambda i: plan.to_model_rows(source_rows[i]), repeat),
+        "predict_proba": bench(lambda i: bundle.model.predict_proba(frames[i]), repeat),
+        "score_one": bench(lambda i: bundle.score(model_rows[i]), repeat),
+        "score_batch_1000": bench(lambda i: bundle.score(batch), max(5, repeat // 20)),
+        "shap_one": bench(lambda i: compute_shap_values(explainer, model_rows[i]), max(10, repeat // 4)),
+    }
+
+
+async def drive(app, make_request, n_requests: int, concurrency: int) -> dict:
+    """
+    Envoie 'n_requests' requêtes à l'application, 'concurrency' à la fois, et
+    mesure la latence de chacune (du point de vue du client).
+    """
+    import httpx
+
+    latencies = []
+    statuses = {}
+    pending = iter(range(n_requests))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                 timeout=60) as client:
+        async def worker():
+            for i in pending:
+                method, url, payload = make_request(i)
+                started = time.perf_counter()
+                response = await client.request(method, url, json=payload)
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    result = summarize(latencies)
+    result.update({
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        "rps": round(n_requests / elapsed, 2),
+        "errors": sum(count for status, count in statuses.items() if status != 200),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    })
+    return result
+
+
+def run_load(main, client_ids, n_requests: int, n_shap_requests: int, concurrency: int) -> dict:
+    def client(i):
+        return int(client_ids[(i * 104729) % len(client_ids)])
+
+    def predict_request(i):
+        return "POST", "/predict", {
+            "SK_ID_CURR": client(i), "AMT_CREDIT": 406597.5 + i, "AMT_INCOME_TOTAL": 202500.0,
+            "AMT_ANNUITY": 24700.5, "DAYS_BIRTH": -9461, "DAYS_EMPLOYED": -637,
+        }
+
+    def shap_request(i):
+        return "GET", f"/shap_explanation/{client(i)}", None
+
+    # Chauffe (pools de threads, caches) non comptée
+    asyncio.run(drive(main.app, predict_request, min(100, n_requests), concurrency))
+    return {
+        "/predict": asyncio.run(drive(main.app, predict_request, n_requests, concurrency)),
+        "/shap_explanation": asyncio.run(drive(main.app, shap_request, n_shap_requests, concurrency)),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta_ms: float = 0.05) -> list:
+    """
+    Écarts par rapport à la référence : liste de (nom, référence, actuel,
+    variation relative, régression ?). Une métrique régresse si elle se
+    dégrade de plus de 'tolerance' (0.25 = 25 %) ; pour une durée, il faut
+    aussi que l'écart dépasse 'min_delta_ms' (les étapes de quelques
+    microsecondes varient fortement d'une exécution à l'autre).
+    """
+    rows = []
+    for (section, metric), better in COMPARED_METRICS.items():
+        for name, current in results.get(section, {}).items():
+            reference = baseline.get(section, {}).get(name, {}).get(metric)
+            value = current.get(metric)
+            if reference in (None, 0) or value is None:
+                continue
+            change = (value - reference) / reference
+            regressed = change > tolerance if better == "lower" else change < -tolerance
+            if metric.endswith("_ms") and abs(value - reference) < min_delta_ms:
+                regressed = False
+            rows.append((f"{section}/{name}/{metric}", reference, value, change, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de l'API de scoring sur données synthétiques.")
+    parser.add_argument("--output", default="benchmark_results.json", help="Fichier JSON des résultats")
+    parser.add_argument("--baseline", help="Résultats de référence à comparer")
+    parser.add_argument("--save-baseline", help="Copie les résultats dans ce fichier de référence")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Dégradation relative tolérée")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05,
+                        help="Écart absolu minimal (en ms) pour signaler une régression de durée")
+    parser.add_argument("--work-dir", help="Répertoire des artefacts synthétiques (temporaire par défaut)")
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--features", type=int, default=60)
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=200, help="Itérations par micro-benchmark")
+    parser.add_argument("--requests", type=int, default=2000, help="Requêtes /predict de la charge")
+    parser.add_argument("--shap-requests", type=int, default=300, help="Requêtes /shap_explanation de la charge")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="scoring-bench-")
+    # L'API lit ses chemins à l'import : ils doivent être fixés avant
+    os.environ["MODEL_PATH"] = os.path.join(work_dir, "model", "model.pkl")
+    os.environ["DATA_DIR"] = os.path.join(work_dir, "data")
+
+    from benchmarks.synthetic import generate
+
+    started = time.perf_counter()
+    artifacts = generate(work_dir, args.clients, args.features, args.trees, args.seed)
+    print(f"✅ Artefacts synthétiques générés dans '{work_dir}' ({time.perf_counter() - started:.1f} s).")
+
+    import lightgbm
+    import app.main as main_module
+    from app import config
+
+    if not main_module.startup.wait(120) or not main_module.startup.ready.is_set():
+        print(f"❌ L'API n'a pas démarré : {main_module.startup.report()['error']}")
+        return 2
+
+    print("⏱️ Micro-benchmarks...")
+    micro = run_micro_benchmarks(main_module, artifacts["client_ids"], args.repeat)
+    print("⏱️ Charge concurrente...")
+    load = run_load(main_module, artifacts["client_ids"], args.requests, args.shap_requests, args.concurrency)
+    main_module.prediction_log.stop()
+
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "lightgbm": lightgbm.__version__,
+        },
+        "parameters": {key: value for key, value in vars(args).items()
+                       if key not in ("output", "baseline", "save_baseline", "work_dir", "tolerance", "min_delta_ms")},
+        "config": {name: getattr(config, name) for name in (
+            "FEATURE_STORE_BACKEND", "INFERENCE_ENGINE", "EXPLAINER_BACKEND", "MICRO_BATCHING_ENABLED",
+            "FEATURE_CACHE_MAX_ENTRIES", "CONCURRENCY_LIMITS_ENABLED", "PREDICT_MAX_CONCURRENCY")},
+        "micro": micro,
+        "load": load,
+    }
+
+    print(f"\n{'Micro-benchmark':<30}{'p50 (ms)':>12}{'p95 (ms)':>12}")
+    for name, stats in micro.items():
+        print(f"{name:<30}{stats['p50_ms']:>12.3f}{stats['p95_ms']:>12.3f}")
+    print(f"\n{'Endpoint':<22}{'req/s':>10}{'p50 (ms)':>11}{'p95 (ms)':>11}{'p99 (ms)':>11}{'erreurs':>9}")
+    for name, stats in load.items():
+        print(f"{name:<22}{stats['rps']:>10.1f}{stats['p50_ms']:>11.2f}{stats['p95_ms']:>11.2f}"
+              f"{stats['p99_ms']:>11.2f}{stats['errors']:>9}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Résultats écrits dans '{args.output}'.")
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Référence enregistrée dans '{args.save_baseline}'.")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("parameters") != results["parameters"] or baseline.get("config") != results["config"]:
+        print("⚠️ Paramètres ou configuration différents de ceux de la référence : comparaison indicative.")
+    rows = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    print(f"\n{'Métrique':<45}{'référence':>12}{'actuel':>12}{'écart':>9}")
+    for name, reference, value, change, regressed in rows:
+        flag = "❌" if regressed else "✅"
+        print(f"{name:<45}{reference:>12.3f}{value:>12.3f}{change:>+9.1%} {flag}")
+    regressions = [row for row in rows if row[4]]
+    if regressions:
+        print(f"\n❌ {len(regressions)} régression(s) au-delà de {args.tolerance:.0%}.")
+        return 1
+    print(f"\n✅ Aucune régression au-delà de {args.tolerance:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
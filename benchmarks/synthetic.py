@@ -0,0 +1,107 @@
+# benchmarks/synthetic.py
+# Génère un feature store SQLite et un petit modèle LightGBM synthétiques, de
+# même forme que les vrais (table 'features' de clé primaire SK_ID_CURR, colonne
+# TARGET, champs de NewLoanRequest), pour lancer les benchmarks hors ligne.
+#
+#   python benchmarks/synthetic.py --output /tmp/scoring-bench --clients 20000 --features 120
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.insert(0, PROJECT_ROOT)
+
+from app.feature_store import FEATURES_TABLE, ID_COLUMN
+from app.models import NewLoanRequest
+from scripts.convert_to_sqlite import create_features_table
+
+FIRST_CLIENT_ID = 100002
+# Champs de la requête /predict (présents dans la base comme dans le modèle)
+REQUEST_FIELDS = [name for name in NewLoanRequest.model_fields if name != ID_COLUMN]
+
+
+def feature_names(n_features: int) -> list:
+    """Champs de la requête, complétés par des features génériques."""
+    extra = max(0, n_features - len(REQUEST_FIELDS))
+    return REQUEST_FIELDS + [f"FEATURE_{i:03d}" for i in range(extra)]
+
+
+def make_matrix(n_clients: int, n_features: int, seed: int = 0, missing_rate: float = 0.05):
+    """Identifiants, features (avec valeurs manquantes) et cible binaire."""
+    rng = np.random.default_rng(seed)
+    ids = np.arange(FIRST_CLIENT_ID, FIRST_CLIENT_ID + n_clients, dtype=np.int64)
+    X = rng.normal(size=(n_clients, len(feature_names(n_features))))
+    weights = rng.normal(size=X.shape[1]) / np.sqrt(X.shape[1])
+    probability = 1.0 / (1.0 + np.exp(-(X @ weights * 2.0 - 2.5)))
+    target = (rng.random(n_clients) < probability).astype(np.int64)
+    X[rng.random(X.shape) < missing_rate] = np.nan
+    return ids, X, target
+
+
+def write_feature_store(db_path, ids, X, target, names):
+    """Table 'features' : SK_ID_CURR (clé primaire), TARGET puis les features."""
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    columns = [ID_COLUMN, "TARGET"] + names
+    conn = sqlite3.connect(db_path)
+    # Même schéma que scripts/convert_to_sqlite.py (WITHOUT ROWID, clé SK_ID_CURR)
+    create_features_table(conn, [(ID_COLUMN, "INTEGER"), ("TARGET", "INTEGER")] + [(name, "REAL") for name in names])
+    placeholders = ", ".join("?" * len(columns))
+    rows = np.column_stack([ids, target, X]).astype(object)
+    rows[:, :2] = rows[:, :2].astype(np.int64)
+    rows[np.isnan(rows.astype(float))] = None
+    conn.executemany(f"INSERT INTO {FEATURES_TABLE} VALUES ({placeholders})", rows.tolist())
+    conn.commit()
+    conn.close()
+
+
+def train_model(X, target, names, n_estimators: int = 100, num_leaves: int = 31, seed: int = 0):
+    import pandas as pd
+    from lightgbm import LGBMClassifier
+
+    model = LGBMClassifier(n_estimators=n_estimators, num_leaves=num_leaves, random_state=seed, verbose=-1)
+    model.fit(pd.DataFrame(X, columns=names), target)
+    return model
+
+
+def generate(output_dir, n_clients: int = 10000, n_features: int = 60, n_estimators: int = 100,
+             seed: int = 0) -> dict:
+    """
+    Écrit output_dir/data/feature_store.db et output_dir/model/model.pkl ;
+    retourne leurs chemins et les identifiants des clients.
+    """
+    import joblib
+
+    data_dir = os.path.join(output_dir, "data")
+    model_dir = os.path.join(output_dir, "model")
+    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(model_dir, exist_ok=True)
+
+    names = feature_names(n_features)
+    ids, X, target = make_matrix(n_clients, n_features, seed)
+    db_path = os.path.join(data_dir, "feature_store.db")
+    write_feature_store(db_path, ids, X, target, names)
+    model_path = os.path.join(model_dir, "model.pkl")
+    joblib.dump(train_model(X, target, names, n_estimators, seed=seed), model_path)
+    return {"data_dir": data_dir, "db_path": db_path, "model_path": model_path, "client_ids": ids}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère un feature store et un modèle synthétiques.")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--features", type=int, default=60)
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    paths = generate(args.output, args.clients, args.features, args.trees, args.seed)
+    print(f"✅ Feature store synthétique : {paths['db_path']} ({args.clients} clients, {args.features} features)")
+    print(f"✅ Modèle synthétique : {paths['model_path']} ({args.trees} arbres)")
+    print(f"Terminé en {time.perf_counter() - started:.1f} s.")
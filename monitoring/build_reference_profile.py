@@ -0,0 +1,57 @@
+# monitoring/build_reference_profile.py
+# Calcule une fois pour toutes le profil de référence du suivi de la dérive :
+# pour chaque feature du modèle, des intervalles aux quantiles du jeu de
+# référence complet (et non d'un échantillon), les effectifs de la référence et
+# son taux de valeurs manquantes, ainsi que l'histogramme des scores du modèle
+# sur la référence. L'API le charge au démarrage (GET /drift).
+#
+#   python monitoring/build_reference_profile.py [--reference data/dataset_optimized.parquet] [--bins 10]
+import argparse
+import os
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.insert(0, PROJECT_ROOT)
+
+from app.drift import ReferenceProfile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profil de référence du suivi de la dérive.")
+    parser.add_argument("--reference", default=os.path.join(PROJECT_ROOT, "data", "dataset_optimized.parquet"))
+    parser.add_argument("--model", default=os.path.join(PROJECT_ROOT, "model", "model.pkl"),
+                        help="Modèle dont les features sont profilées et les scores de référence calculés")
+    parser.add_argument("--no-model", action="store_true",
+                        help="Profiler toutes les colonnes numériques, sans histogramme des scores")
+    parser.add_argument("--output", default=os.path.join(PROJECT_ROOT, "data", "drift_reference.json"))
+    parser.add_argument("--bins", type=int, default=10, help="Intervalles par feature (quantiles)")
+    parser.add_argument("--columns-per-read", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processus se partageant les paquets de colonnes")
+    args = parser.parse_args(argv)
+
+    model = None
+    if not args.no_model:
+        import joblib
+
+        model = joblib.load(args.model)
+        print(f"Modèle chargé : {len(model.feature_name_)} features.")
+
+    print(f"Calcul du profil de référence sur '{args.reference}'...")
+    started = time.perf_counter()
+    profile = ReferenceProfile.from_parquet(args.reference, n_bins=args.bins,
+                                            columns_per_read=args.columns_per_read, model=model,
+                                            workers=args.workers)
+    profile.save(args.output)
+    print(f"✅ Profil de référence enregistré dans '{args.output}' : {len(profile.features)} features, "
+          f"{profile.metadata['rows']} lignes, en {time.perf_counter() - started:.1f} s.")
+    if model is not None and len(profile.features) < len(model.feature_name_):
+        absent = [name for name in model.feature_name_ if name not in profile.features]
+        print(f"⚠️ Features du modèle absentes (ou non numériques) dans la référence : {absent}")
+    return profile
+
+
+if __name__ == "__main__":
+    main()
@@ -1,66 +1,427 @@
-# monitoring/generate_report.py (Version finale qui gère les colonnes vides)
-import pandas as pd
+# monitoring/generate_report.py (version incrémentale)
+# Rapport de dérive des données calculé par incréments : la durée d'un passage
+# dépend des prédictions arrivées depuis le passage précédent, pas de tout
+# l'historique.
+#   1. Profil de référence (app/drift.py) : intervalles et effectifs de chaque
+#      feature sur le jeu de référence complet, calculés une seule fois et
+#      recalculés seulement si le fichier de référence change.
+#   2. Statistiques par segment du journal : chaque segment Parquet terminé
+#      est réduit, une fois pour toutes, à ses histogrammes (dans les
+#      intervalles du profil) enregistrés dans data/drift_stats/. Seuls les
+#      nouveaux segments sont lus, en parallèle sur plusieurs processus. Le
+#      CSV historique est suivi de la même façon, relu à partir de la position
+#      atteinte au passage précédent ; ses lignes postérieures au début des
+#      segments (écrites en double par l'API) sont écartées.
+#   3. Fusion : les histogrammes sont additionnés (éventuellement depuis une
+#      date) et comparés au profil (PSI, KS, taux de valeurs manquantes) ;
+#      le résultat est écrit en JSON.
+#   4. Optionnel (--html) : rapport Evidently construit à partir de ces
+#      histogrammes, sans relire les données.
+#
+#   python monitoring/generate_report.py [--since 2024-01-01] [--workers 4] [--html]
+import argparse
+import hashlib
+import json
+import multiprocessing
 import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
-from evidently import Report
-from evidently.presets import DataDriftPreset
+import numpy as np
 
-print("Début de la génération du rapport de monitoring...")
-
-# --- Chemins d'accès robustes ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
-REF_DATA_PATH = os.path.join(PROJECT_ROOT, 'data', 'dataset_optimized.parquet')
-PROD_DATA_PATH = os.path.join(PROJECT_ROOT, 'data', 'predictions_log.csv')
-# --- Fin ---
-
-
-# 1. Charger les données de référence
-try:
-    reference_data = pd.read_parquet(REF_DATA_PATH).sample(n=5000, random_state=42)
-    print(f"Données de référence chargées depuis '{REF_DATA_PATH}'.")
-except FileNotFoundError:
-    print(f"ERREUR: Le fichier '{REF_DATA_PATH}' est introuvable.")
-    exit()
-
-# 2. Charger les données de production
-try:
-    production_data = pd.read_csv(PROD_DATA_PATH)
-    print(f"Données de production chargées depuis '{PROD_DATA_PATH}'.")
-except FileNotFoundError:
-    print(f"ERREUR: Le fichier '{PROD_DATA_PATH}' est introuvable.")
-    exit()
-
-# --- 3. PRÉPARATION FINALE DES DONNÉES ---
-# On gère la colonne 'TARGET'
-if 'TARGET' in reference_data.columns:
-    reference_data = reference_data.drop(columns=['TARGET'])
-
-# On identifie les colonnes entièrement vides dans les données de production
-empty_cols = [col for col in production_data.columns if production_data[col].isnull().all()]
-if empty_cols:
-    print(f"AVERTISSEMENT: Les colonnes suivantes sont entièrement vides et seront exclues de l'analyse : {empty_cols}")
-    # On les retire des deux jeux de données pour garder la cohérence
-    reference_data = reference_data.drop(columns=empty_cols, errors='ignore')
-    production_data = production_data.drop(columns=empty_cols)
-
-# On aligne les colonnes restantes
-production_data_aligned = production_data[reference_data.columns]
-print("Alignement des colonnes terminé.")
-
-# --- Fin de la préparation ---
-
-# 4. Créer le rapport Evidently
-data_drift_report = Report(metrics=[
-    DataDriftPreset(),
-])
-
-# 5. Lancer l'analyse
-my_eval = data_drift_report.run(reference_data=reference_data,current_data=production_data_aligned)
-
-# 6. Sauvegarder le rapport
-report_path = os.path.join(PROJECT_ROOT, 'data_drift_report.html')
-my_eval.save_html(report_path)
-
-print(f"✅ Rapport de dérive de données généré avec succès !")
-print(f"Ouvrez le fichier '{report_path}' dans votre navigateur pour l'analyser.")
\ No newline at end of file
+sys.path.insert(0, PROJECT_ROOT)
+
+from app.drift import ReferenceProfile, column_values, file_signature
+from app.log_export import normalize_timestamp
+from app.prediction_log import TIMESTAMP_COLUMN, list_segments
+
+SCORE_COLUMN = "SCORE"
+STATE_FILE = "_state.json"
+CSV_STATS = "predictions_log.csv"
+
+
+# --- 1. Profil de référence ---
+
+def load_or_build_profile(reference_path, profile_path, model_path=None, n_bins: int = 10, workers: int = 1):
+    """
+    Relit le profil s'il a été calculé sur le fichier de référence actuel,
+    sinon le recalcule (en parallèle) et l'enregistre. Retourne (profil, recalculé).
+    """
+    profile_path = Path(profile_path)
+    if profile_path.exists():
+        profile = ReferenceProfile.load(profile_path)
+        signature = profile.metadata.get("source_signature")
+        if not os.path.exists(reference_path) or signature in (None, file_signature(reference_path)):
+            return profile, False
+        print("🔄 Fichier de référence modifié depuis le calcul du profil : recalcul.")
+
+    model = None
+    if model_path and os.path.exists(model_path):
+        import joblib
+
+        model = joblib.load(model_path)
+    profile = ReferenceProfile.from_parquet(reference_path, n_bins=n_bins, model=model, workers=workers)
+    profile.save(profile_path)
+    return profile, True
+
+
+def profile_digest(profile_path) -> str:
+    return hashlib.sha1(Path(profile_path).read_bytes()).hexdigest()
+
+
+# --- 2. Statistiques par segment ---
+
+def frame_stats(profile: ReferenceProfile, columns: dict, n_rows: int) -> dict:
+    """
+    Histogrammes de lignes du journal {colonne: valeurs} ; les features du
+    profil absentes du journal comptent comme valeurs manquantes.
+    """
+    values = np.full((n_rows, len(profile.features)), np.nan)
+    for j, name in enumerate(profile.features):
+        if name in columns:
+            values[:, j] = columns[name]
+    scores = columns.get(SCORE_COLUMN)
+    score_counts = profile.score_histogram(scores[~np.isnan(scores)]) if scores is not None \
+        else profile.score_histogram([])
+    return {"counts": profile.histogram(values), "score_counts": score_counts, "rows": n_rows}
+
+
+_worker = {}
+
+
+def init_worker(profile_path):
+    _worker["profile"] = ReferenceProfile.load(profile_path)
+
+
+def segment_stats(segment_path, output_path) -> int:
+    """Réduit un segment à ses histogrammes (écriture atomique d'un .npz). Exécuté dans un processus du pool."""
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    profile = _worker["profile"]
+    parquet_file = pq.ParquetFile(segment_path)
+    names = parquet_file.schema_arrow.names
+    wanted = [name for name in profile.features + [SCORE_COLUMN] if name in names]
+    table = parquet_file.read(columns=wanted + ([TIMESTAMP_COLUMN] if TIMESTAMP_COLUMN in names else []))
+    stats = frame_stats(profile, {name: column_values(table.column(name)) for name in wanted}, table.num_rows)
+
+    first = last = ""
+    if TIMESTAMP_COLUMN in names and table.num_rows:
+        bounds = pc.min_max(table.column(TIMESTAMP_COLUMN)).as_py()
+        first, last = bounds["min"] or "", bounds["max"] or ""
+    save_stats(output_path, stats, first, last)
+    return table.num_rows
+
+
+def save_stats(path, stats: dict, first: str = "", last: str = ""):
+    tmp = f"{path}.tmp.npz"
+    np.savez(tmp, counts=stats["counts"], score_counts=stats["score_counts"], rows=stats["rows"],
+             first=first, last=last)
+    os.replace(tmp, path)
+
+
+def load_stats(path) -> dict:
+    with np.load(path) as data:
+        return {"counts": data["counts"], "score_counts": data["score_counts"], "rows": int(data["rows"]),
+                "first": str(data["first"]), "last": str(data["last"])}
+
+
+def prepare_stats_dir(stats_dir: Path, digest: str) -> dict:
+    """
+    État des passages précédents ; les statistiques sont effacées si le profil
+    a changé (les intervalles ne sont plus les mêmes).
+    """
+    state_path = stats_dir / STATE_FILE
+    if state_path.exists():
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+        if state.get("profile_digest") == digest:
+            return state
+        print("🔄 Profil de référence modifié : statistiques du journal recalculées.")
+        shutil.rmtree(stats_dir)
+    stats_dir.mkdir(parents=True, exist_ok=True)
+    state = {"profile_digest": digest, "csv": {}}
+    save_state(stats_dir, state)
+    return state
+
+
+def save_state(stats_dir: Path, state: dict):
+    tmp = stats_dir / (STATE_FILE + ".tmp")
+    tmp.write_text(json.dumps(state), encoding="utf-8")
+    os.replace(tmp, stats_dir / STATE_FILE)
+
+
+def update_segment_stats(segments_dir, stats_dir: Path, profile_path, workers: int = 1) -> int:
+    """Calcule les statistiques des segments qui n'en ont pas encore ; retourne le nombre traité."""
+    pending = [path for path in list_segments(segments_dir) if not (stats_dir / f"{path.stem}.npz").exists()]
+    if not pending:
+        return 0
+    targets = [str(stats_dir / f"{path.stem}.npz") for path in pending]
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)),
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=init_worker, initargs=(str(profile_path),)) as pool:
+            list(pool.map(segment_stats, [str(path) for path in pending], targets))
+    else:
+        init_worker(profile_path)
+        for path, target in zip(pending, targets):
+            segment_stats(path, target)
+    return len(pending)
+
+
+def csv_files(csv_path) -> list:
+    """
+    CSV historique et ses versions renommées par l'API lors d'un changement
+    d'en-tête (predictions_log.<date>.csv), des plus anciennes au fichier courant.
+    """
+    csv_path = Path(csv_path)
+    rotated = sorted(csv_path.parent.glob(f"{csv_path.stem}.*{csv_path.suffix}"))
+    return rotated + ([csv_path] if csv_path.exists() else [])
+
+
+def segments_start(stats_dir: Path) -> str:
+    """
+    Horodatage de la première ligne des segments traités, "" sans segment :
+    l'API écrit ses prédictions à la fois dans le CSV et dans les segments,
+    les lignes du CSV à partir de cette date sont donc déjà comptées.
+    """
+    firsts = [load_stats(path)["first"] for path in stats_dir.glob("*.npz") if not path.name.startswith(CSV_STATS)]
+    return min((first for first in firsts if first), default="")
+
+
+def update_csv_stats(csv_path, stats_dir: Path, profile: ReferenceProfile, state: dict,
+                     chunk_size: int = 50000, cutoff: str = "") -> tuple:
+    """
+    CSV historique : ajoute aux statistiques cumulées les lignes complètes
+    écrites depuis le passage précédent. Les statistiques et la position de
+    lecture sont rattachées au fichier lui-même (inode) et non à son chemin :
+    quand l'API renomme le CSV, la fin du fichier renommé est encore lue et
+    ses statistiques sont conservées. Les lignes horodatées à partir de
+    'cutoff' (début des segments) sont écartées ; si cette date a changé
+    depuis le passage précédent, le CSV est recompté depuis le début.
+    Retourne (lignes ajoutées, lignes écartées).
+    """
+    files = state.setdefault("csv", {})
+    if "offset" in files or state.get("csv_cutoff", "") != cutoff:
+        # État d'une version précédente (indexé par chemin) ou segments
+        # apparus depuis : on repart de zéro
+        files.clear()
+        for path in stats_dir.glob(f"{CSV_STATS}*.npz"):
+            path.unlink()
+    state["csv_cutoff"] = cutoff
+    added = excluded = 0
+    for path in csv_files(csv_path):
+        inode = str(os.stat(path).st_ino)
+        file_added, file_excluded = update_csv_file_stats(path, stats_dir / f"{CSV_STATS}.{inode}.npz", profile,
+                                                          files.setdefault(inode, {}), chunk_size, cutoff)
+        added += file_added
+        excluded += file_excluded
+    return added, excluded
+
+
+def update_csv_file_stats(path, target: Path, profile: ReferenceProfile, file_state: dict,
+                          chunk_size: int = 50000, cutoff: str = "") -> tuple:
+    """
+    Lit un CSV à partir de la position (en octets) où le passage précédent
+    s'était arrêté. Un fichier plus court ou dont l'en-tête a changé (inode
+    réutilisé par un autre fichier) est repris depuis le début. Les lignes
+    horodatées à partir de 'cutoff' sont écartées (les lignes sans horodatage
+    sont comptées). Retourne (lignes ajoutées, lignes écartées).
+    """
+    import io
+    import pandas as pd
+
+    with open(path, "rb") as f:
+        header = f.readline()
+        size = os.fstat(f.fileno()).st_size
+        offset = file_state.get("offset", 0)
+        if not target.exists() or file_state.get("header") != header.decode("utf-8") or offset > size:
+            offset = len(header)
+            if target.exists():
+                target.unlink()
+        f.seek(offset)
+        data = f.read(size - offset)
+    # Dernière ligne éventuellement en cours d'écriture : reprise au prochain passage
+    data = data[:data.rfind(b"\n") + 1]
+    file_state.update(path=Path(path).name, header=header.decode("utf-8"))
+    if not data:
+        file_state["offset"] = offset
+        return 0, 0
+
+    total = load_stats(target) if target.exists() else None
+    names = pd.read_csv(io.BytesIO(header), nrows=0).columns.tolist()
+    wanted = set(profile.features + [SCORE_COLUMN] + ([TIMESTAMP_COLUMN] if cutoff else []))
+    added = excluded = 0
+    reader = pd.read_csv(io.BytesIO(data), header=None, names=names, chunksize=chunk_size,
+                         usecols=lambda name: name in wanted, dtype={TIMESTAMP_COLUMN: str})
+    for chunk in reader:
+        if cutoff and TIMESTAMP_COLUMN in chunk.columns:
+            covered = (chunk[TIMESTAMP_COLUMN].fillna("") >= cutoff).to_numpy()
+            excluded += int(covered.sum())
+            chunk = chunk[~covered]
+            if chunk.empty:
+                continue
+        columns = {name: pd.to_numeric(chunk[name], errors="coerce").to_numpy(dtype=np.float64)
+                   for name in chunk.columns if name != TIMESTAMP_COLUMN}
+        stats = frame_stats(profile, columns, len(chunk))
+        if total is None:
+            total = dict(stats, first="", last="")
+        else:
+            total["counts"] = total["counts"] + stats["counts"]
+            total["score_counts"] = total["score_counts"] + stats["score_counts"]
+            total["rows"] += stats["rows"]
+        added += len(chunk)
+    if total is not None:
+        save_stats(target, total)
+    file_state["offset"] = offset + len(data)
+    file_state["excluded"] = file_state.get("excluded", 0) + excluded
+    return added, excluded
+
+
+# --- 3. Fusion et comparaison ---
+
+def merge_stats(stats_dir: Path, profile: ReferenceProfile, since: str = None):
+    """
+    Additionne les histogrammes enregistrés (segments terminés après 'since'
+    seulement). Les statistiques du CSV ne contiennent que ses lignes
+    antérieures aux segments : les deux s'additionnent sans double compte.
+    """
+    counts = np.zeros_like(profile.counts)
+    score_counts = profile.score_histogram([])
+    rows = n_parts = 0
+    for path in sorted(stats_dir.glob("*.npz")):
+        is_csv = path.name.startswith(CSV_STATS)
+        if is_csv and since:
+            continue  # le CSV historique n'est pas horodaté par segment
+        stats = load_stats(path)
+        if since and stats["last"] and stats["last"] < since:
+            continue
+        counts += stats["counts"]
+        score_counts += stats["score_counts"]
+        rows += stats["rows"]
+        n_parts += 1
+    return counts, score_counts, rows, n_parts
+
+
+# --- 4. Rendu Evidently (optionnel) ---
+
+def representative_frame(profile: ReferenceProfile, counts: np.ndarray, n_rows: int, seed: int = 0):
+    """
+    DataFrame reconstruit à partir des histogrammes : chaque intervalle est
+    représenté par son milieu (ou son seuil pour les intervalles ouverts),
+    dans les proportions observées. Les colonnes sont tirées indépendamment.
+    """
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    data = {}
+    for j, name in enumerate(profile.features):
+        edges = profile.edges[j]
+        if len(edges):
+            middles = (edges[:-1] + edges[1:]) / 2
+            values = np.concatenate([[edges[0]], middles, [edges[-1]], [np.nan]])
+        else:
+            values = np.array([0.0, np.nan])
+        row = counts[j, :len(values) - 1].tolist() + [counts[j, -1]]
+        total = sum(row)
+        repeats = np.round(np.asarray(row, dtype=np.float64) / max(total, 1) * n_rows).astype(int)
+        column = np.repeat(values, repeats)
+        data[name] = rng.permutation(np.resize(column, n_rows) if len(column) else np.full(n_rows, np.nan))
+    return pd.DataFrame(data)
+
+
+def render_evidently(profile: ReferenceProfile, counts: np.ndarray, output_path, sample_rows: int = 5000):
+    from evidently import Report
+    from evidently.presets import DataDriftPreset
+
+    reference = representative_frame(profile, profile.counts, sample_rows)
+    current = representative_frame(profile, counts, sample_rows, seed=1)
+    # Colonnes entièrement vides d'un côté : exclues, comme avant
+    empty = [name for name in current.columns if current[name].isnull().all() or reference[name].isnull().all()]
+    if empty:
+        print(f"AVERTISSEMENT: Les colonnes suivantes sont entièrement vides et seront exclues de l'analyse : {empty}")
+    report = Report(metrics=[DataDriftPreset()])
+    evaluation = report.run(reference_data=reference.drop(columns=empty), current_data=current.drop(columns=empty))
+    evaluation.save_html(str(output_path))
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="Rapport de dérive des données, par incréments.")
+    parser.add_argument("--reference", default=os.path.join(PROJECT_ROOT, "data", "dataset_optimized.parquet"))
+    parser.add_argument("--model", default=os.path.join(PROJECT_ROOT, "model", "model.pkl"))
+    parser.add_argument("--profile", default=os.path.join(PROJECT_ROOT, "data", "drift_reference.json"))
+    parser.add_argument("--segments-dir", default=os.path.join(PROJECT_ROOT, "data", "predictions_log"))
+    parser.add_argument("--csv", default=os.path.join(PROJECT_ROOT, "data", "predictions_log.csv"))
+    parser.add_argument("--stats-dir", default=os.path.join(PROJECT_ROOT, "data", "drift_stats"))
+    parser.add_argument("--output", default=os.path.join(PROJECT_ROOT, "data_drift_report.json"))
+    parser.add_argument("--since", default=None, help="Ne retenir que les segments postérieurs (date ISO 8601)")
+    parser.add_argument("--bins", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--psi-threshold", type=float, default=0.2)
+    parser.add_argument("--html", nargs="?", const=os.path.join(PROJECT_ROOT, "data_drift_report.html"),
+                        default=None, help="Rapport Evidently (HTML) construit sur les histogrammes")
+    args = parser.parse_args(argv)
+
+    print("Début de la génération du rapport de monitoring...")
+    started = time.perf_counter()
+    timings = {}
+
+    if not Path(args.profile).exists() and not os.path.exists(args.reference):
+        print(f"ERREUR: Le fichier '{args.reference}' est introuvable.")
+        return {}
+    profile, rebuilt = load_or_build_profile(args.reference, args.profile, args.model, args.bins, args.workers)
+    timings["profile_s"] = time.perf_counter() - started
+    print(f"{'✅ Profil de référence calculé' if rebuilt else 'ℹ️ Profil de référence relu'} "
+          f"({len(profile.features)} features, {profile.metadata.get('rows')} lignes).")
+
+    stats_dir = Path(args.stats_dir)
+    state = prepare_stats_dir(stats_dir, profile_digest(args.profile))
+    step = time.perf_counter()
+    new_segments = update_segment_stats(args.segments_dir, stats_dir, args.profile, args.workers)
+    cutoff = segments_start(stats_dir)
+    new_csv_rows, excluded_csv_rows = update_csv_stats(args.csv, stats_dir, profile, state, cutoff=cutoff)
+    save_state(stats_dir, state)
+    timings["increment_s"] = time.perf_counter() - step
+    print(f"Nouveaux segments traités : {new_segments} ; nouvelles lignes du CSV : {new_csv_rows}.")
+    if excluded_csv_rows:
+        print(f"ℹ️ {excluded_csv_rows} lignes du CSV postérieures au {cutoff} écartées "
+              "(déjà comptées dans les segments).")
+
+    since = normalize_timestamp(args.since) if args.since else None
+    counts, score_counts, rows, n_parts = merge_stats(stats_dir, profile, since)
+    if not rows:
+        print("ERREUR: Aucune donnée de production à analyser.")
+        return {}
+    report = profile.compare(counts, score_counts, args.psi_threshold)
+    report.update({"rows": rows, "parts": n_parts, "since": since, "reference": profile.metadata,
+                   "increment": {"segments": new_segments, "csv_rows": new_csv_rows,
+                                 "csv_rows_excluded": excluded_csv_rows}})
+    tmp = f"{args.output}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp, args.output)
+    print(f"✅ Rapport de dérive généré : {report['drifted_features']}/{report['features_monitored']} features "
+          f"en dérive (PSI ≥ {args.psi_threshold}) sur {rows} prédictions -> '{args.output}'.")
+
+    if args.html:
+        step = time.perf_counter()
+        try:
+            render_evidently(profile, counts, args.html)
+            timings["html_s"] = time.perf_counter() - step
+            print(f"Ouvrez le fichier '{args.html}' dans votre navigateur pour l'analyser.")
+        except ImportError as e:
+            print(f"❌ Rendu Evidently impossible (package non installé) : {e}")
+
+    timings["total_s"] = time.perf_counter() - started
+    print(f"⏱️ Profil : {timings['profile_s']:.1f} s, incrément : {timings['increment_s']:.1f} s, "
+          f"total : {timings['total_s']:.1f} s")
+    report["timings"] = timings
+    return report
+
+
+if __name__ == "__main__":
+    main()
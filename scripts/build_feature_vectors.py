@@ -0,0 +1,92 @@
+# build_feature_vectors.py
+# Construit la table de service 'feature_vectors' à partir du feature store et
+# du modèle : pour chaque client, seules les features lues par le modèle
+# (model.feature_name_), dans son ordre, rangées dans un BLOB float32. L'API
+# (FEATURE_STORE_BACKEND=vectors) lit alors une seule colonne par client au lieu
+# de décoder toute la ligne de la table 'features'.
+#
+# La table est écrite dans une base séparée (data/feature_vectors.db) pour ne
+# pas modifier le feature store, ouvert en lecture seule (immutable) par l'API.
+# Elle porte l'empreinte de la base et des features du modèle : l'API l'ignore
+# (repli sur SQLite) si l'une ou l'autre a changé depuis la construction.
+#
+#   python scripts/build_feature_vectors.py [--db data/feature_store.db] [--model model/model.pkl]
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.insert(0, PROJECT_ROOT)
+
+from app.explanations import model_fingerprint
+from app.feature_store import ID_COLUMN, VECTORS_TABLE, SQLiteFeatureStore, VectorFeatureStore
+
+
+def compare_lookups(db_path, vectors_path, n_lookups: int = 1000, seed: int = 0) -> dict:
+    """Latence médiane d'une lecture de client (en µs) : ligne complète contre vecteur."""
+    vectors = VectorFeatureStore(vectors_path, pool_size=1)
+    wide = SQLiteFeatureStore(db_path, pool_size=1)
+    try:
+        with vectors.connection() as conn:
+            ids = [row[0] for row in conn.execute(f"SELECT {ID_COLUMN} FROM {VECTORS_TABLE}")]
+        if not ids:
+            return {}
+        rng = np.random.default_rng(seed)
+        sample = [int(client_id) for client_id in rng.choice(ids, size=min(n_lookups, len(ids)), replace=False)]
+        latencies = {}
+        for name, lookup in (("features", wide.fetch_row), ("vectors", vectors.row_view)):
+            lookup(sample[0])  # ouverture de la connexion
+            timings = []
+            for client_id in sample:
+                started = time.perf_counter()
+                lookup(client_id)
+                timings.append(time.perf_counter() - started)
+            latencies[name] = float(np.median(timings) * 1e6)
+    finally:
+        vectors.close()
+        wide.close()
+    return latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Construction de la table de vecteurs du modèle.")
+    parser.add_argument("--db", default=os.path.join(PROJECT_ROOT, "data", "feature_store.db"))
+    parser.add_argument("--model", default=os.path.join(PROJECT_ROOT, "model", "model.pkl"))
+    parser.add_argument("--output", default=os.path.join(PROJECT_ROOT, "data", "feature_vectors.db"))
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=1000, help="Lectures chronométrées après construction")
+    args = parser.parse_args(argv)
+
+    import joblib
+
+    model = joblib.load(args.model)
+    feature_names = list(model.feature_name_)
+    print(f"Modèle chargé : {len(feature_names)} features.")
+
+    started = time.perf_counter()
+    n_rows = VectorFeatureStore.build(args.db, feature_names, args.output, chunk_size=args.chunk_size,
+                                      model_fingerprint=model_fingerprint(model))
+    elapsed = time.perf_counter() - started
+    size_mb = os.path.getsize(args.output) / 1024**2
+    print(f"✅ Table de vecteurs construite en {elapsed:.1f} s : {n_rows} clients, {size_mb:.1f} MB "
+          f"dans '{args.output}'.")
+
+    store = VectorFeatureStore(args.output, pool_size=1)
+    if store.missing_columns:
+        print(f"⚠️ Features du modèle absentes de la base (laissées à NaN) : {store.missing_columns}")
+    store.close()
+
+    if args.lookups > 0:
+        latency = compare_lookups(args.db, args.output, args.lookups)
+        if latency:
+            print(f"⏱️ Lecture d'un client (médiane) : {latency['features']:.0f} µs sur 'features', "
+                  f"{latency['vectors']:.0f} µs sur 'feature_vectors'")
+    return n_rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+# bulk_score.py
+# Score hors ligne de tous les clients du feature store (revues de portefeuille,
+# références de monitoring), sans passer par /predict.
+#
+# La table 'features' est parcourue par paquets dans l'ordre des SK_ID_CURR ;
+# chaque paquet est scoré par un processus du pool, avec le même modèle, le même
+# alignement des colonnes et le même moteur que l'API (ModelBundle, ColumnPlan),
+# puis écrit dans son propre fichier Parquet. Le processus parent ne lit que les
+# identifiants et garde un nombre borné de paquets en vol : la mémoire ne dépend
+# pas de la taille de la base. Un paquet n'apparaît qu'une fois écrit en entier ;
+# relancer la même commande après une interruption reprend aux paquets manquants.
+#
+#   python scripts/bulk_score.py --output data/bulk_scores --workers 8 [--shap] [--merge scores.parquet]
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.insert(0, PROJECT_ROOT)
+
+from app import config
+from app.explanations import compute_shap_values, make_explainer, model_fingerprint
+from app.feature_store import FEATURES_TABLE, ID_COLUMN, SQLiteFeatureStore
+from app.models import NewLoanRequest
+from app.prediction_log import MODEL_VERSION_COLUMN
+from app.preprocessing import _to_float_rows
+from app.registry import ModelBundle, default_version
+from app.tree_engine import TreeEnsemble
+
+JOB_FILE = "_job.json"
+PART_SUFFIX = ".parquet"
+# Même seuil de décision que /predict
+THRESHOLD = 0.5
+SHAP_PREFIX = "SHAP_"
+
+
+def part_name(first_id: int, last_id: int) -> str:
+    return f"part-{first_id:012d}-{last_id:012d}{PART_SUFFIX}"
+
+
+# --- Côté workers ---
+
+_worker = {}
+
+
+def init_worker(model_path, db_path, version, engine, shap_backend, threads):
+    """Chargé une fois par processus : modèle, moteur, plan de colonnes, connexion."""
+    # Avant le chargement de LightGBM : évite que N processus lancent chacun
+    # autant de threads OpenMP que de cœurs
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    import joblib
+
+    model = joblib.load(model_path)
+    tree_engine = TreeEnsemble.from_booster(model) if engine == "numpy" else None
+    bundle = ModelBundle(model, version, model_fingerprint(model), path=model_path, tree_engine=tree_engine,
+                         explainer_factory=lambda m: make_explainer(m, shap_backend))
+    store = SQLiteFeatureStore(db_path, pool_size=1)
+    _worker.update(
+        bundle=bundle,
+        store=store,
+        plan=bundle.plan_for(store.columns, NewLoanRequest.model_fields),
+        id_position=store.columns.index(ID_COLUMN),
+        shap=shap_backend is not None,
+    )
+
+
+def score_chunk(first_id: int, last_id: int, output_dir: str) -> int:
+    """Score les clients [first_id, last_id] et écrit leur fichier Parquet ; retourne le nombre de lignes."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    bundle, plan = _worker["bundle"], _worker["plan"]
+    with _worker["store"].connection() as conn:
+        rows = conn.execute(
+            f"SELECT * FROM {FEATURES_TABLE} WHERE {ID_COLUMN} BETWEEN ? AND ? ORDER BY {ID_COLUMN}",
+            (first_id, last_id),
+        ).fetchall()
+    # Même conversion que l'API : colonnes non numériques inutilisées par le modèle à NaN
+    source_rows = _to_float_rows(rows, _worker["store"].columns, plan)
+    model_rows = plan.to_model_rows(source_rows)
+    scores = np.asarray(bundle.score(model_rows), dtype=np.float64)
+
+    columns = {
+        ID_COLUMN: pa.array(source_rows[:, _worker["id_position"]].astype(np.int64)),
+        "SCORE": pa.array(scores),
+        "PREDICTION": pa.array((scores > THRESHOLD).astype(np.int8)),
+        MODEL_VERSION_COLUMN: pa.array([bundle.version] * len(scores)),
+    }
+    if _worker["shap"]:
+        base_value, shap_values = compute_shap_values(bundle.explainer(), model_rows)
+        columns["BASE_VALUE"] = pa.array(np.full(len(scores), base_value, dtype=np.float32))
+        shap_values = np.asarray(shap_values, dtype=np.float32)
+        for position, name in enumerate(bundle.feature_names):
+            columns[SHAP_PREFIX + name] = pa.array(shap_values[:, position])
+
+    # Écrit à côté puis renommé : un fichier présent est toujours complet
+    path = Path(output_dir) / part_name(first_id, last_id)
+    tmp_path = path.with_name(path.name + ".tmp")
+    pq.write_table(pa.table(columns), tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+    return len(scores)
+
+
+# --- Côté parent ---
+
+def chunk_bounds(db_path, chunk_size: int):
+    """(premier SK_ID_CURR, dernier SK_ID_CURR, lignes) de chaque paquet, sans lire les features."""
+    store = SQLiteFeatureStore(db_path, pool_size=1)
+    try:
+        with store.connection() as conn:
+            cursor = conn.execute(f"SELECT {ID_COLUMN} FROM {FEATURES_TABLE} ORDER BY {ID_COLUMN}")
+            while True:
+                ids = cursor.fetchmany(chunk_size)
+                if not ids:
+                    break
+                yield int(ids[0][0]), int(ids[-1][0]), len(ids)
+    finally:
+        store.close()
+
+
+def count_rows(db_path) -> int:
+    store = SQLiteFeatureStore(db_path, pool_size=1)
+    try:
+        with store.connection() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {FEATURES_TABLE}").fetchone()[0]
+    finally:
+        store.close()
+
+
+def prepare_output(output_dir: Path, job: dict, overwrite: bool) -> set:
+    """
+    Crée le répertoire de sortie, ou vérifie qu'il correspond au même travail
+    (modèle, base, paquets, SHAP) pour le reprendre. Retourne les paquets déjà écrits.
+    """
+    job_path = output_dir / JOB_FILE
+    if job_path.exists():
+        previous = json.loads(job_path.read_text(encoding="utf-8"))
+        previous.pop("created_at", None)
+        current = {key: value for key, value in job.items() if key != "created_at"}
+        if overwrite:
+            for path in output_dir.glob(f"part-*{PART_SUFFIX}*"):
+                path.unlink()
+        elif previous != current:
+            raise SystemExit(f"❌ '{output_dir}' contient un autre travail (modèle, base ou options "
+                             f"différents) : utilisez --overwrite ou un autre répertoire.")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for path in output_dir.glob(f"part-*{PART_SUFFIX}.tmp"):
+        path.unlink()  # paquet interrompu en cours d'écriture
+    if not job_path.exists() or overwrite:
+        job_path.write_text(json.dumps(job, indent=2), encoding="utf-8")
+    return {path.name for path in output_dir.glob(f"part-*{PART_SUFFIX}")}
+
+
+def merge_parts(output_dir: Path, target):
+    """Concatène les paquets, dans l'ordre des SK_ID_CURR, en un seul fichier Parquet (paquet par paquet)."""
+    import pyarrow.parquet as pq
+
+    parts = sorted(output_dir.glob(f"part-*{PART_SUFFIX}"))
+    writer = None
+    try:
+        for path in parts:
+            table = pq.read_table(path)
+            if writer is None:
+                writer = pq.ParquetWriter(target, table.schema, compression="zstd")
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="Score hors ligne de tout le feature store.")
+    parser.add_argument("--db", default=os.path.join(PROJECT_ROOT, "data", "feature_store.db"))
+    parser.add_argument("--model", default=os.path.join(PROJECT_ROOT, "model", "model.pkl"))
+    parser.add_argument("--output", default=os.path.join(PROJECT_ROOT, "data", "bulk_scores"),
+                        help="Répertoire des fichiers Parquet (un par paquet)")
+    parser.add_argument("--model-version", default=config.MODEL_VERSION or None)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--engine", choices=["lightgbm", "numpy"], default=config.INFERENCE_ENGINE)
+    parser.add_argument("--shap", action="store_true", help="Ajoute les contributions SHAP de chaque feature")
+    parser.add_argument("--shap-backend", choices=["shap", "lightgbm"], default=config.EXPLAINER_BACKEND)
+    parser.add_argument("--merge", help="Fichier Parquet unique à produire à la fin")
+    parser.add_argument("--overwrite", action="store_true", help="Efface les résultats existants et recommence")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="Secondes entre deux rapports")
+    args = parser.parse_args(argv)
+
+    import joblib
+
+    started = time.perf_counter()
+    model = joblib.load(args.model)
+    fingerprint = model_fingerprint(model)
+    version = args.model_version or default_version(args.model, fingerprint)
+    del model
+    db_stat = os.stat(args.db)
+    job = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "model_fingerprint": fingerprint,
+        "model_version": version,
+        "db": {"path": os.path.abspath(args.db), "size": db_stat.st_size, "mtime": db_stat.st_mtime},
+        "chunk_size": args.chunk_size,
+        "shap": args.shap,
+        "shap_backend": args.shap_backend if args.shap else None,
+    }
+    output_dir = Path(args.output)
+    done = prepare_output(output_dir, job, args.overwrite)
+
+    total = count_rows(args.db)
+    print(f"{total} clients à scorer par paquets de {args.chunk_size} avec {args.workers} processus "
+          f"(modèle '{version}'{', SHAP' if args.shap else ''}).")
+    if done:
+        print(f"🔄 Reprise : {len(done)} paquets déjà écrits.")
+
+    scored = skipped = 0
+    last_report = time.perf_counter()
+    scoring_started = time.perf_counter()
+
+    def report(force=False):
+        nonlocal last_report
+        now = time.perf_counter()
+        if not force and now - last_report < args.progress_interval:
+            return
+        last_report = now
+        rate = scored / max(now - scoring_started, 1e-9)
+        remaining = total - scored - skipped
+        eta = f", reste ~{remaining / rate:.0f} s" if rate > 0 and remaining > 0 else ""
+        print(f"  {scored + skipped}/{total} clients ({rate:.0f} clients/s{eta})")
+
+    def collect(futures):
+        nonlocal scored
+        for future in futures:
+            scored += future.result()
+        report()
+
+    shap_backend = args.shap_backend if args.shap else None
+    pool = ProcessPoolExecutor(
+        max_workers=args.workers,
+        # 'spawn' : pas de fork d'un processus ayant déjà initialisé OpenMP
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(args.model, args.db, version, args.engine, shap_backend, args.threads_per_worker),
+    )
+    pending = set()
+    try:
+        for first_id, last_id, n_rows in chunk_bounds(args.db, args.chunk_size):
+            if part_name(first_id, last_id) in done:
+                skipped += n_rows
+                continue
+            # Nombre borné de paquets en vol : la mémoire reste constante
+            if len(pending) >= 2 * args.workers:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+            pending.add(pool.submit(score_chunk, first_id, last_id, str(output_dir)))
+        finished, pending = wait(pending)
+        collect(finished)
+    except KeyboardInterrupt:
+        print("⚠️ Interrompu : relancez la même commande pour reprendre aux paquets manquants.")
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+    report(force=True)
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ {scored} clients scorés ({skipped} déjà faits) en {elapsed:.1f} s "
+          f"({scored / max(elapsed, 1e-9):.0f} clients/s), résultats dans '{output_dir}'.")
+    if args.merge:
+        merge_parts(output_dir, args.merge)
+        print(f"✅ Fichier unique écrit : '{args.merge}'.")
+    return {"scored": scored, "skipped": skipped, "total": total, "seconds": elapsed}
+
+
+if __name__ == "__main__":
+    main()
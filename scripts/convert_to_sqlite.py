@@ -1,35 +1,198 @@
 # convert_to_sqlite.py
-import pandas as pd
-import sqlite3
+# Construit le feature store SQLite (table 'features') à partir du Parquet
+# optimisé, sans le charger en mémoire : les record batches sont lus un par un
+# (pyarrow iter_batches) et insérés par gros paquets dans de longues
+# transactions, avec des pragmas de construction (pas de journal, pas de
+# synchronisation disque). La table est créée en WITHOUT ROWID avec SK_ID_CURR
+# comme clé primaire : la ligne d'un client est lue par une seule descente dans
+# le B-tree, sans index secondaire ni second accès à la table.
+#
+# La base est construite dans un fichier temporaire puis renommée : l'API, qui
+# ouvre la base en lecture seule (immutable), ne voit jamais un fichier partiel.
+#
+#   python scripts/convert_to_sqlite.py [--parquet data/dataset_optimized.parquet] [--db data/feature_store.db]
+import argparse
 import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.insert(0, PROJECT_ROOT)
+
+from app.feature_store import FEATURES_TABLE, ID_COLUMN, SQLiteFeatureStore
+
+# Pages de 64 Ko (le maximum) : dans une table WITHOUT ROWID, une ligne tient
+# sans page de débordement tant qu'elle ne dépasse pas ~1/4 de page, soit
+# environ 1 800 colonnes REAL
+DEFAULT_PAGE_SIZE = 65536
+
+
+def sqlite_type(arrow_type) -> str:
+    """Affinité SQLite d'une colonne Arrow."""
+    import pyarrow.types as pat
+
+    if pat.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    if pat.is_integer(arrow_type) or pat.is_boolean(arrow_type):
+        return "INTEGER"
+    if pat.is_string(arrow_type) or pat.is_large_string(arrow_type):
+        return "TEXT"
+    return "REAL"
+
+
+def create_features_table(conn, columns):
+    """
+    Table 'features' en WITHOUT ROWID, clé primaire SK_ID_CURR. 'columns' est
+    une liste de (nom, type SQLite).
+    """
+    definitions = [f'"{name}" {sql_type}' + (" NOT NULL" if name == ID_COLUMN else "")
+                   for name, sql_type in columns]
+    conn.execute(f"DROP TABLE IF EXISTS {FEATURES_TABLE}")
+    conn.execute(f"CREATE TABLE {FEATURES_TABLE} ({', '.join(definitions)}, "
+                 f"PRIMARY KEY ({ID_COLUMN})) WITHOUT ROWID")
+
+
+def build_pragmas(conn, page_size: int, cache_size_mb: int):
+    """Réglages de construction : la base n'est lisible qu'une fois renommée, rien à protéger."""
+    conn.execute(f"PRAGMA page_size = {int(page_size)}")
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA locking_mode = EXCLUSIVE")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute(f"PRAGMA cache_size = -{int(cache_size_mb) * 1024}")
+
+
+def batch_rows(batch):
+    """Lignes Python d'un record batch (les catégories deviennent leurs valeurs)."""
+    import pyarrow as pa
+
+    columns = []
+    for column in batch.columns:
+        if pa.types.is_dictionary(column.type):
+            column = column.dictionary_decode()
+        columns.append(column.to_pylist())
+    return zip(*columns)
+
+
+def measure_lookups(db_path, n_lookups: int = 1000, seed: int = 0) -> dict:
+    """Latence d'une lecture de ligne par le feature store de l'API (en µs)."""
+    store = SQLiteFeatureStore(db_path, pool_size=1)
+    try:
+        with store.connection() as conn:
+            ids = [row[0] for row in conn.execute(f"SELECT {ID_COLUMN} FROM {FEATURES_TABLE}")]
+        if not ids:
+            return {}
+        rng = np.random.default_rng(seed)
+        sample = rng.choice(ids, size=min(n_lookups, len(ids)), replace=False)
+        store.fetch_row(int(sample[0]))  # ouverture de la connexion
+        latencies = []
+        for client_id in sample:
+            started = time.perf_counter()
+            store.fetch_row(int(client_id))
+            latencies.append(time.perf_counter() - started)
+    finally:
+        store.close()
+    latencies = np.array(latencies) * 1e6
+    return {"p50_us": float(np.percentile(latencies, 50)), "p95_us": float(np.percentile(latencies, 95)),
+            "p99_us": float(np.percentile(latencies, 99)), "lookups": len(latencies)}
+
+
+def build_feature_store(parquet_path, db_path, batch_size: int = 10000, transaction_rows: int = 200000,
+                        page_size: int = DEFAULT_PAGE_SIZE, cache_size_mb: int = 256, vacuum: bool = True):
+    """Construit la base et retourne les durées de chaque étape (en secondes) et le nombre de lignes."""
+    import pyarrow.parquet as pq
+
+    timings = {}
+    started = time.perf_counter()
+    parquet_file = pq.ParquetFile(parquet_path)
+    schema = parquet_file.schema_arrow
+    if ID_COLUMN not in schema.names:
+        raise ValueError(f"Colonne '{ID_COLUMN}' absente de '{parquet_path}'.")
+    columns = [(field.name, sqlite_type(field.type)) for field in schema]
+    n_total = parquet_file.metadata.num_rows
+
+    tmp_path = f"{db_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        build_pragmas(conn, page_size, cache_size_mb)
+        create_features_table(conn, columns)
+
+        insert = f"INSERT INTO {FEATURES_TABLE} VALUES ({', '.join('?' * len(columns))})"
+        n_rows = in_transaction = 0
+        conn.execute("BEGIN")
+        for batch in parquet_file.iter_batches(batch_size=batch_size):
+            try:
+                conn.executemany(insert, batch_rows(batch))
+            except sqlite3.IntegrityError as e:
+                raise ValueError(f"{ID_COLUMN} en double ou manquant dans '{parquet_path}' : {e}")
+            n_rows += batch.num_rows
+            in_transaction += batch.num_rows
+            if in_transaction >= transaction_rows:
+                conn.execute("COMMIT")
+                conn.execute("BEGIN")
+                in_transaction = 0
+                elapsed = time.perf_counter() - started
+                print(f"  {n_rows}/{n_total} lignes insérées ({n_rows / elapsed:.0f} lignes/s)")
+        conn.execute("COMMIT")
+        timings["insert_s"] = time.perf_counter() - started
 
-print("Début de la conversion Parquet vers SQLite...")
+        step = time.perf_counter()
+        conn.execute("ANALYZE")
+        timings["analyze_s"] = time.perf_counter() - step
+        if vacuum:
+            step = time.perf_counter()
+            conn.execute("VACUUM")
+            timings["vacuum_s"] = time.perf_counter() - step
+    except BaseException:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
 
-# Définir les chemins
-parquet_path = '../data/dataset_optimized.parquet'  # Le nom de ton fichier optimisé
-db_path = '../data/feature_store.db'
-table_name = 'features'
+    os.replace(tmp_path, db_path)
+    timings["total_s"] = time.perf_counter() - started
+    return timings, n_rows
 
-# 1. Charger le DataFrame depuis le fichier Parquet
-print(f"Chargement de {parquet_path}...")
-df = pd.read_parquet(parquet_path)
-print("DataFrame chargé.")
 
-# 2. Créer une connexion à la base de données SQLite
-print(f"Création de la base de données à l'adresse {db_path}...")
-conn = sqlite3.connect(db_path)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Construction du feature store SQLite depuis le Parquet.")
+    parser.add_argument("--parquet", default=os.path.join(PROJECT_ROOT, "data", "dataset_optimized.parquet"))
+    parser.add_argument("--db", default=os.path.join(PROJECT_ROOT, "data", "feature_store.db"))
+    parser.add_argument("--batch-size", type=int, default=10000, help="Lignes par record batch lu")
+    parser.add_argument("--transaction-rows", type=int, default=200000, help="Lignes par transaction")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument("--cache-size-mb", type=int, default=256)
+    parser.add_argument("--no-vacuum", action="store_true")
+    parser.add_argument("--lookups", type=int, default=1000, help="Lectures chronométrées après construction")
+    args = parser.parse_args(argv)
 
-# 3. Écrire le DataFrame dans une table SQL
-print(f"Écriture des données dans la table '{table_name}'...")
-df.to_sql(table_name, conn, if_exists='replace', index=False)
-print("Données écrites avec succès.")
+    print("Début de la conversion Parquet vers SQLite...")
+    print(f"Lecture en flux de {args.parquet} -> {args.db}")
+    timings, n_rows = build_feature_store(
+        args.parquet, args.db, batch_size=args.batch_size, transaction_rows=args.transaction_rows,
+        page_size=args.page_size, cache_size_mb=args.cache_size_mb, vacuum=not args.no_vacuum,
+    )
+    size_mb = os.path.getsize(args.db) / 1024**2
+    print(f"⏱️ Insertion : {timings['insert_s']:.1f} s ({n_rows / max(timings['insert_s'], 1e-9):.0f} lignes/s)")
+    print(f"⏱️ ANALYZE : {timings['analyze_s']:.1f} s")
+    if "vacuum_s" in timings:
+        print(f"⏱️ VACUUM : {timings['vacuum_s']:.1f} s")
+    print(f"✅ Conversion terminée en {timings['total_s']:.1f} s : {n_rows} lignes, {size_mb:.1f} MB "
+          f"dans '{args.db}'.")
 
-# 4. Créer un index sur la colonne SK_ID_CURR
-print(f"Création d'un index sur la colonne SK_ID_CURR...")
-conn.execute(f'CREATE INDEX idx_sk_id_curr ON {table_name} (SK_ID_CURR);')
-print("Index créé.")
+    if args.lookups > 0:
+        latency = measure_lookups(args.db, args.lookups)
+        if latency:
+            print(f"⏱️ Lecture d'un client ({latency['lookups']} tirages) : p50 {latency['p50_us']:.0f} µs, "
+                  f"p95 {latency['p95_us']:.0f} µs, p99 {latency['p99_us']:.0f} µs")
+    return timings
 
-# 5. Fermer la connexion
-conn.close()
 
-print(f"✅ Conversion terminée. Le fichier '{db_path}' est prêt !")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
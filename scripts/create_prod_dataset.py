@@ -1,35 +1,381 @@
 # create_prod_dataset.py (version optimisée pour la mémoire)
-import pandas as pd
+# Réduit les types du dataset final sans le charger en mémoire, en deux passes
+# sur les groupes de lignes du Parquet :
+#   1. statistiques de chaque colonne (min/max, valeurs manquantes, valeurs
+#      entières, cardinalité des chaînes, erreur d'arrondi en float32/float16) ;
+#   2. réécriture lot par lot avec, pour chaque colonne, le type le plus étroit
+#      qui conserve les valeurs : entiers 8/16/32 bits (nullables si besoin, y
+#      compris pour les flottants qui ne contiennent que des entiers),
+#      catégories (encodage dictionnaire) pour les chaînes peu variées, float32,
+#      et float16 si l'erreur relative reste sous le seuil demandé.
+# Le fichier est écrit dans un fichier temporaire puis renommé, et un rapport
+# par colonne (mémoire avant/après, erreur maximale) est enregistré en CSV.
+#
+#   python scripts/create_prod_dataset.py [--input data/final_dataset.parquet] [--output data/dataset_optimized.parquet]
+import argparse
+import csv
+import os
+import time
+
 import numpy as np
 
-print("Début du script d'optimisation de mémoire...")
-
-# 1. Charger le jeu de données complet
-print("Chargement du dataset complet...")
-df = pd.read_parquet('../data/final_dataset.parquet')
-mem_usage_before = df.memory_usage(deep=True).sum() / 1024**2
-print(f"Usage mémoire avant optimisation: {mem_usage_before:.2f} MB")
-
-# 2. Optimiser les types de données
-print("Optimisation des types de données (downcasting)...")
-for col in df.columns:
-    if df[col].dtype == 'float64':
-        df[col] = df[col].astype(np.float32)
-    elif df[col].dtype == 'int64':
-        if df[col].min() >= np.iinfo(np.int8).min and df[col].max() <= np.iinfo(np.int8).max:
-            df[col] = df[col].astype(np.int8)
-        elif df[col].min() >= np.iinfo(np.int16).min and df[col].max() <= np.iinfo(np.int16).max:
-            df[col] = df[col].astype(np.int16)
-        elif df[col].min() >= np.iinfo(np.int32).min and df[col].max() <= np.iinfo(np.int32).max:
-            df[col] = df[col].astype(np.int32)
-
-mem_usage_after = df.memory_usage(deep=True).sum() / 1024**2
-print(f"Usage mémoire après optimisation: {mem_usage_after:.2f} MB")
-print(f"Réduction de la mémoire de {((mem_usage_before - mem_usage_after) / mem_usage_before) * 100:.2f}%")
-
-# 3. Sauvegarder le nouveau fichier Parquet optimisé
-nouveau_nom_fichier = 'data/dataset_optimized.parquet'
-print(f"Sauvegarde du dataset optimisé dans '{nouveau_nom_fichier}'...")
-df.to_parquet(nouveau_nom_fichier, index=False)
-
-print("✅ Script terminé. Le fichier de production optimisé est prêt !")
\ No newline at end of file
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+
+INTEGER_TYPES = (np.int8, np.int16, np.int32, np.int64)
+FLOAT16_MAX = float(np.finfo(np.float16).max)
+
+
+class ColumnStats:
+    """Statistiques d'une colonne, cumulées groupe de lignes par groupe de lignes."""
+
+    def __init__(self, name: str, arrow_type, max_categories: int):
+        self.name = name
+        self.type = arrow_type
+        self.max_categories = max_categories
+        self.rows = 0
+        self.nulls = 0
+        # NaN (distincts des valeurs nulles Parquet) des colonnes flottantes
+        self.nans = 0
+        self.min = None
+        self.max = None
+        # Flottants
+        self.integral = True
+        self.has_inf = False
+        self.float16_overflow = False
+        self.max_abs_error = {"float32": 0.0, "float16": 0.0}
+        self.max_rel_error = {"float32": 0.0, "float16": 0.0}
+        # Chaînes : valeurs distinctes (None au-delà de max_categories) et octets
+        self.categories = set()
+        self.string_bytes = 0
+
+    @property
+    def kind(self) -> str:
+        import pyarrow.types as pat
+
+        if pat.is_integer(self.type):
+            return "integer"
+        if pat.is_floating(self.type):
+            return "float"
+        if pat.is_string(self.type) or pat.is_large_string(self.type):
+            return "string"
+        if pat.is_boolean(self.type):
+            return "boolean"
+        return "other"
+
+    def update(self, column):
+        import pyarrow.compute as pc
+
+        self.rows += len(column)
+        self.nulls += column.null_count
+        kind = self.kind
+        if kind == "integer":
+            bounds = pc.min_max(column).as_py()
+            self._bounds(bounds["min"], bounds["max"])
+        elif kind == "float":
+            self._update_float(column.to_numpy(zero_copy_only=False))
+            self.nans -= column.null_count
+        elif kind == "string":
+            self.string_bytes += pc.sum(pc.binary_length(column)).as_py() or 0
+            if self.categories is not None:
+                self.categories.update(pc.unique(column.drop_null()).to_pylist())
+                if len(self.categories) > self.max_categories:
+                    self.categories = None
+
+    def _bounds(self, low, high):
+        if low is None:
+            return
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def _update_float(self, values: np.ndarray):
+        values = values.astype(np.float64, copy=False)
+        finite = np.isfinite(values)
+        # to_numpy() rend les valeurs nulles sous forme de NaN
+        self.nans += int(np.isnan(values).sum())
+        self.has_inf = self.has_inf or bool(np.isinf(values).any())
+        values = values[finite]
+        if not len(values):
+            return
+        self._bounds(float(values.min()), float(values.max()))
+        self.integral = self.integral and bool(np.all(values == np.floor(values)))
+
+        magnitude = np.abs(values)
+        nonzero = magnitude > 0
+        if magnitude.max() > FLOAT16_MAX:
+            self.float16_overflow = True
+        for name, dtype in (("float32", np.float32), ("float16", np.float16)):
+            if name == "float16" and self.float16_overflow:
+                continue
+            with np.errstate(over="ignore"):
+                error = np.abs(values - values.astype(dtype).astype(np.float64))
+            self.max_abs_error[name] = max(self.max_abs_error[name], float(error.max()))
+            if nonzero.any():
+                rel = float((error[nonzero] / magnitude[nonzero]).max())
+                self.max_rel_error[name] = max(self.max_rel_error[name], rel)
+
+
+def collect_stats(parquet_file, batch_size: int, max_categories: int) -> dict:
+    """Première passe : {colonne: ColumnStats}, en une lecture du fichier."""
+    stats = {field.name: ColumnStats(field.name, field.type, max_categories)
+             for field in parquet_file.schema_arrow}
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        for name, column in zip(batch.schema.names, batch.columns):
+            stats[name].update(column)
+    return stats
+
+
+def narrowest_int(low, high):
+    """Plus petit type entier signé contenant [low, high], ou None."""
+    for dtype in INTEGER_TYPES:
+        info = np.iinfo(dtype)
+        if low >= info.min and high <= info.max:
+            return dtype
+    return None
+
+
+def choose_type(stats: ColumnStats, float16_rtol: float = None, integral_floats: bool = True,
+                max_category_ratio: float = 0.5):
+    """
+    Type cible d'une colonne et nature de la conversion ('cast', 'int_from_float'
+    ou 'keep'). Les bornes proviennent de la première passe : la conversion ne
+    perd aucune valeur, sauf l'arrondi float32/float16 mesuré.
+    """
+    import pyarrow as pa
+
+    kind = stats.kind
+    if kind == "integer":
+        dtype = narrowest_int(stats.min or 0, stats.max or 0)
+        return (pa.from_numpy_dtype(dtype), "cast") if dtype is not None else (stats.type, "keep")
+
+    if kind == "float":
+        if integral_floats and stats.integral and not stats.has_inf and stats.min is not None:
+            dtype = narrowest_int(stats.min, stats.max)
+            if dtype is not None and dtype is not np.int64:
+                return pa.from_numpy_dtype(dtype), "int_from_float"
+        if float16_rtol is not None and not stats.float16_overflow \
+                and stats.max_rel_error["float16"] <= float16_rtol:
+            return pa.float16(), "cast"
+        if pa.types.is_float64(stats.type):
+            return pa.float32(), "cast"
+        return stats.type, "keep"
+
+    if kind == "string" and stats.categories is not None \
+            and len(stats.categories) <= max_category_ratio * max(stats.rows - stats.nulls, 1):
+        index = pa.int8() if len(stats.categories) <= np.iinfo(np.int8).max else pa.int16()
+        return pa.dictionary(index, stats.type), "cast"
+
+    return stats.type, "keep"
+
+
+def estimated_bytes(arrow_type, stats: ColumnStats) -> int:
+    """Taille en mémoire (Arrow) de la colonne complète sous le type donné."""
+    import pyarrow as pa
+
+    validity = (stats.rows + 7) // 8 if stats.nulls + stats.nans else 0
+    if pa.types.is_dictionary(arrow_type):
+        categories = stats.categories or ()
+        dictionary = sum(len(str(value).encode("utf-8")) for value in categories) + 4 * (len(categories) + 1)
+        return stats.rows * arrow_type.index_type.bit_width // 8 + dictionary + validity
+    if pa.types.is_string(arrow_type):
+        return stats.string_bytes + 4 * (stats.rows + 1) + validity
+    if pa.types.is_large_string(arrow_type):
+        return stats.string_bytes + 8 * (stats.rows + 1) + validity
+    if pa.types.is_boolean(arrow_type):
+        return (stats.rows + 7) // 8 + validity
+    try:
+        return stats.rows * arrow_type.bit_width // 8 + validity
+    except ValueError:
+        return 0
+
+
+def plan_columns(stats: dict, float16_rtol: float = None, integral_floats: bool = True,
+                 max_category_ratio: float = 0.5) -> dict:
+    """{colonne: (type cible, conversion)} pour toutes les colonnes."""
+    return {name: choose_type(column, float16_rtol, integral_floats, max_category_ratio)
+            for name, column in stats.items()}
+
+
+def target_schema(plan: dict, stats: dict):
+    """
+    Schéma de sortie, avec les métadonnées pandas : les entiers qui contiennent
+    des valeurs manquantes sont relus en types nullables (Int8, Int16...).
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    fields = [pa.field(name, arrow_type) for name, (arrow_type, _) in plan.items()]
+    dtypes = {}
+    for name, (arrow_type, conversion) in plan.items():
+        missing = stats[name].nulls + stats[name].nans > 0
+        if pa.types.is_integer(arrow_type):
+            dtype = arrow_type.to_pandas_dtype()
+            dtypes[name] = pd.api.types.pandas_dtype(dtype.__name__.capitalize()) if missing else dtype
+        elif pa.types.is_dictionary(arrow_type):
+            dtypes[name] = "category"
+        elif pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+            dtypes[name] = object
+        else:
+            dtypes[name] = arrow_type.to_pandas_dtype()
+    empty = pd.DataFrame({name: pd.Series([], dtype=dtype) for name, dtype in dtypes.items()})
+    metadata = pa.Schema.from_pandas(empty, preserve_index=False).metadata
+    return pa.schema(fields, metadata=metadata)
+
+
+def convert_column(column, arrow_type, conversion: str):
+    """Conversion d'une colonne d'un lot vers son type cible."""
+    import pyarrow as pa
+
+    if conversion == "keep":
+        return column
+    if conversion == "int_from_float":
+        values = column.to_numpy(zero_copy_only=False)
+        missing = np.isnan(values)
+        return pa.array(np.where(missing, 0, values).astype(arrow_type.to_pandas_dtype()), mask=missing)
+    # Entiers : bornes vérifiées ; flottants : arrondi mesuré en première passe
+    return column.cast(arrow_type, safe=not pa.types.is_floating(arrow_type))
+
+
+def write_optimized(parquet_file, output_path, plan: dict, schema, batch_size: int, row_group_size: int,
+                    compression: str, compression_level: int = None) -> int:
+    """Seconde passe : réécriture lot par lot (fichier temporaire puis renommé)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tmp_path = f"{output_path}.tmp"
+    n_rows = 0
+    writer = pq.ParquetWriter(tmp_path, schema, compression=compression, compression_level=compression_level)
+    try:
+        # Les lots convertis sont regroupés pour que chaque groupe de lignes
+        # écrit fasse exactement 'row_group_size' lignes (sauf le dernier)
+        pending = schema.empty_table()
+        for batch in parquet_file.iter_batches(batch_size=batch_size):
+            columns = [convert_column(column, *plan[name]) for name, column in zip(batch.schema.names, batch.columns)]
+            pending = pa.concat_tables([pending, pa.Table.from_arrays(columns, schema=schema)])
+            while pending.num_rows >= row_group_size:
+                writer.write_table(pending.slice(0, row_group_size), row_group_size=row_group_size)
+                n_rows += row_group_size
+                pending = pending.slice(row_group_size)
+        if pending.num_rows:
+            writer.write_table(pending, row_group_size=row_group_size)
+            n_rows += pending.num_rows
+        writer.close()
+    except BaseException:
+        writer.close()
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, output_path)
+    return n_rows
+
+
+def column_report(stats: dict, plan: dict) -> list:
+    """Une ligne par colonne : types, mémoire avant/après et erreur maximale introduite."""
+    import pyarrow as pa
+
+    report = []
+    for name, column in stats.items():
+        arrow_type, conversion = plan[name]
+        before = estimated_bytes(column.type, column)
+        after = estimated_bytes(arrow_type, column)
+        precision = None
+        if pa.types.is_floating(arrow_type) and arrow_type != column.type:
+            precision = "float16" if pa.types.is_float16(arrow_type) else "float32"
+        report.append({
+            "column": name,
+            "source_type": str(column.type),
+            "target_type": str(arrow_type),
+            "conversion": conversion,
+            "rows": column.rows,
+            "missing": column.nulls + column.nans,
+            "distinct": len(column.categories) if column.kind == "string" and column.categories is not None else "",
+            "bytes_before": before,
+            "bytes_after": after,
+            "saved_pct": round(100.0 * (before - after) / before, 2) if before else 0.0,
+            "max_abs_error": column.max_abs_error[precision] if precision else 0.0,
+            "max_rel_error": column.max_rel_error[precision] if precision else 0.0,
+        })
+    return report
+
+
+def write_report(report: list, path):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(report[0]) if report else ["column"])
+        writer.writeheader()
+        writer.writerows(report)
+
+
+def optimize(input_path, output_path, batch_size: int = 65536, row_group_size: int = 131072,
+             compression: str = "zstd", compression_level: int = None, float16_rtol: float = None,
+             integral_floats: bool = True, max_categories: int = 255, max_category_ratio: float = 0.5):
+    """Optimise le fichier ; retourne le rapport par colonne et les durées des deux passes."""
+    import pyarrow.parquet as pq
+
+    timings = {}
+    parquet_file = pq.ParquetFile(input_path)
+    started = time.perf_counter()
+    stats = collect_stats(parquet_file, batch_size, max_categories)
+    timings["stats_s"] = time.perf_counter() - started
+
+    plan = plan_columns(stats, float16_rtol, integral_floats, max_category_ratio)
+    schema = target_schema(plan, stats)
+    step = time.perf_counter()
+    write_optimized(parquet_file, output_path, plan, schema, batch_size, row_group_size,
+                    compression, compression_level)
+    timings["write_s"] = time.perf_counter() - step
+    return column_report(stats, plan), timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Optimisation des types du dataset de production.")
+    parser.add_argument("--input", default=os.path.join(PROJECT_ROOT, "data", "final_dataset.parquet"))
+    parser.add_argument("--output", default=os.path.join(PROJECT_ROOT, "data", "dataset_optimized.parquet"))
+    parser.add_argument("--report", default=None,
+                        help="Rapport CSV par colonne (défaut : <output>_report.csv)")
+    parser.add_argument("--batch-size", type=int, default=65536, help="Lignes lues par lot")
+    parser.add_argument("--row-group-size", type=int, default=131072, help="Lignes par groupe en sortie")
+    parser.add_argument("--compression", default="zstd")
+    parser.add_argument("--compression-level", type=int, default=None)
+    parser.add_argument("--float16-rtol", type=float, default=None,
+                        help="Erreur relative maximale acceptée pour passer une colonne en float16 "
+                             "(désactivé par défaut)")
+    parser.add_argument("--keep-integral-floats", action="store_true",
+                        help="Ne pas convertir en entiers nullables les flottants ne contenant que des entiers")
+    parser.add_argument("--max-categories", type=int, default=255,
+                        help="Valeurs distinctes maximales d'une chaîne convertie en catégorie")
+    args = parser.parse_args(argv)
+    report_path = args.report or os.path.splitext(args.output)[0] + "_report.csv"
+
+    print("Début du script d'optimisation de mémoire...")
+    print(f"Lecture en flux de {args.input} -> {args.output}")
+    report, timings = optimize(
+        args.input, args.output, batch_size=args.batch_size, row_group_size=args.row_group_size,
+        compression=args.compression, compression_level=args.compression_level,
+        float16_rtol=args.float16_rtol, integral_floats=not args.keep_integral_floats,
+        max_categories=args.max_categories,
+    )
+    write_report(report, report_path)
+
+    before = sum(row["bytes_before"] for row in report) / 1024**2
+    after = sum(row["bytes_after"] for row in report) / 1024**2
+    print(f"⏱️ Statistiques : {timings['stats_s']:.1f} s, réécriture : {timings['write_s']:.1f} s")
+    print(f"Usage mémoire avant optimisation: {before:.2f} MB")
+    print(f"Usage mémoire après optimisation: {after:.2f} MB")
+    if before:
+        print(f"Réduction de la mémoire de {(before - after) / before * 100:.2f}%")
+    changed = {}
+    for row in report:
+        if row["source_type"] != row["target_type"]:
+            key = f"{row['source_type']} -> {row['target_type']}"
+            changed[key] = changed.get(key, 0) + 1
+    for key, count in sorted(changed.items(), key=lambda item: -item[1]):
+        print(f"  {count} colonne(s) {key}")
+    worst = max(report, key=lambda row: row["max_rel_error"], default=None)
+    if worst is not None and worst["max_rel_error"] > 0:
+        print(f"ℹ️ Erreur relative maximale : {worst['max_rel_error']:.2e} ({worst['column']}, "
+              f"{worst['target_type']})")
+    print(f"✅ Script terminé. Le fichier de production optimisé est prêt ! Rapport : '{report_path}'")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# precompute_shap.py
+# Pré-calcule les valeurs SHAP de tous les clients de la table 'features' et les
+# écrit dans un magasin float32 (data/shap_store/) relu en mmap par l'API.
+import argparse
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.insert(0, PROJECT_ROOT)
+
+from app.explanations import ShapStore, make_explainer, model_fingerprint, source_fingerprint
+from app.feature_store import FEATURES_TABLE, ID_COLUMN, SQLiteFeatureStore
+from app.preprocessing import ColumnPlan, _to_float_rows
+
+parser = argparse.ArgumentParser(description="Pré-calcul des valeurs SHAP du feature store.")
+parser.add_argument("--db", default=os.path.join(PROJECT_ROOT, "data", "feature_store.db"))
+parser.add_argument("--model", default=os.path.join(PROJECT_ROOT, "model", "model.pkl"))
+parser.add_argument("--output", default=os.path.join(PROJECT_ROOT, "data", "shap_store"))
+parser.add_argument("--chunk-size", type=int, default=5000)
+parser.add_argument("--backend", choices=["shap", "lightgbm"], default="shap",
+                    help="'lightgbm' utilise les contributions natives du booster (plus rapide)")
+args = parser.parse_args()
+
+print("Début du pré-calcul des valeurs SHAP...")
+started = time.perf_counter()
+
+# 1. Charger le modèle et créer l'explainer
+model = joblib.load(args.model)
+explainer = make_explainer(model, args.backend)
+fingerprint = model_fingerprint(model)
+print(f"Modèle chargé (empreinte {fingerprint}).")
+
+# 2. Préparer la lecture de la base, dans l'ordre des SK_ID_CURR (l'empreinte
+# est prise avant la lecture : une base remplacée pendant le calcul invalide le magasin)
+db_fingerprint = source_fingerprint(args.db)
+store = SQLiteFeatureStore(args.db)
+plan = ColumnPlan(store.columns, model.feature_name_, override_fields=[])
+plan.report()
+id_position = store.columns.index(ID_COLUMN)
+
+
+def iter_chunks(conn):
+    cursor = conn.execute(f"SELECT * FROM {FEATURES_TABLE} ORDER BY {ID_COLUMN}")
+    while True:
+        rows = cursor.fetchmany(args.chunk_size)
+        if not rows:
+            break
+        # Même conversion que /shap_explanation : colonnes non numériques inutilisées à NaN
+        source_rows = _to_float_rows(rows, store.columns, plan)
+        yield source_rows[:, id_position].astype(np.int64), plan.to_model_rows(source_rows)
+
+
+def report_progress(done):
+    elapsed = time.perf_counter() - started
+    print(f"  {done}/{n_rows} clients traités ({done / elapsed:.0f} clients/s)")
+
+
+# 3. Calculer et écrire les valeurs SHAP paquet par paquet
+with store.connection() as conn:
+    n_rows = conn.execute(f"SELECT COUNT(*) FROM {FEATURES_TABLE}").fetchone()[0]
+    print(f"{n_rows} clients à traiter par paquets de {args.chunk_size}.")
+    shap_store = ShapStore.build(
+        args.output, n_rows, iter_chunks(conn), explainer, plan.feature_names, fingerprint,
+        progress=report_progress, source_fingerprint=db_fingerprint,
+    )
+store.close()
+
+size_mb = shap_store.shap_values.nbytes / 1024**2
+print(f"✅ Magasin SHAP écrit dans '{args.output}' ({size_mb:.1f} MB) "
+      f"en {time.perf_counter() - started:.1f} s.")
@@ -0,0 +1,66 @@
+# tests/test_batching.py
+
+import sys
+import os
+import threading
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.batching import MicroBatcher
+from app.metrics import Registry
+
+
+# --- Test 1 : Les requêtes concurrentes sont regroupées et chacune reçoit son score ---
+def test_micro_batcher_coalesces_concurrent_rows():
+    calls = []
+
+    def predict_fn(rows):
+        calls.append(len(rows))
+        return rows[:, 0] * 2
+
+    metrics = Registry()
+    batch_size = metrics.histogram("micro_batch_size", "Lignes par lot.", buckets=(1, 4, 16))
+    queue_delay = metrics.histogram("micro_batch_queue_delay_seconds", "Attente par ligne.")
+    batcher = MicroBatcher(predict_fn, max_batch_size=16, max_wait_ms=50,
+                           batch_size_observer=batch_size.observe, queue_delay_observer=queue_delay.observe)
+    results = {}
+    barrier = threading.Barrier(8)
+
+    def worker(i):
+        barrier.wait()
+        results[i] = batcher.predict(np.array([[float(i), 0.0]]), timeout=5)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.stop()
+
+    assert results == {i: 2.0 * i for i in range(8)}
+    assert sum(calls) == 8
+    assert len(calls) < 8
+    stats = batcher.stats()
+    assert stats["batch_size"]["count"] == len(calls)
+    assert stats["queue_delay_ms"]["count"] == 8
+
+    # Les mêmes histogrammes sont exposés au format Prometheus (/metrics)
+    text = metrics.render()
+    assert f"micro_batch_size_count {len(calls)}" in text
+    assert "micro_batch_size_sum 8" in text
+    assert "micro_batch_queue_delay_seconds_count 8" in text
+
+
+# --- Test 2 : Une erreur du modèle est renvoyée à chaque requête du lot ---
+def test_micro_batcher_propagates_errors():
+    def predict_fn(rows):
+        raise RuntimeError("modèle indisponible")
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=4, max_wait_ms=1)
+    future = batcher.submit(np.zeros((1, 2)))
+    with pytest.raises(RuntimeError, match="indisponible"):
+        future.result(timeout=5)
+    batcher.stop()
@@ -0,0 +1,45 @@
+# tests/test_benchmarks.py
+
+import sys
+import os
+import sqlite3
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.run_benchmarks import compare
+from benchmarks.synthetic import REQUEST_FIELDS, generate
+
+
+# --- Test 1 : Les artefacts synthétiques ont la forme de ceux de l'API ---
+def test_synthetic_artifacts(tmp_path):
+    """
+    Teste que la base synthétique contient la table 'features' attendue et
+    que le modèle utilise les champs de la requête /predict.
+    """
+    import joblib
+
+    paths = generate(str(tmp_path), n_clients=200, n_features=12, n_estimators=5)
+    conn = sqlite3.connect(paths["db_path"])
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(features)")]
+    count = conn.execute("SELECT COUNT(*) FROM features").fetchone()[0]
+    conn.close()
+    assert columns[:2] == ["SK_ID_CURR", "TARGET"]
+    assert count == 200
+
+    model = joblib.load(paths["model_path"])
+    assert model.feature_name_ == columns[2:]
+    assert set(REQUEST_FIELDS) <= set(model.feature_name_)
+
+
+# --- Test 2 : La comparaison à la référence signale les régressions ---
+def test_compare_with_baseline():
+    """
+    Teste qu'une baisse de débit ou une hausse de latence au-delà de la
+    tolérance est signalée, mais pas un écart de quelques microsecondes.
+    """
+    baseline = {"micro": {"align": {"p50_ms": 0.010}, "predict_proba": {"p50_ms": 1.0}},
+                "load": {"/predict": {"rps": 1000.0, "p95_ms": 20.0, "p99_ms": 30.0}}}
+    results = {"micro": {"align": {"p50_ms": 0.020}, "predict_proba": {"p50_ms": 1.5}},
+               "load": {"/predict": {"rps": 700.0, "p95_ms": 21.0, "p99_ms": 30.0}}}
+    regressions = {name for name, _, _, _, regressed in compare(results, baseline, 0.25) if regressed}
+    assert regressions == {"micro/predict_proba/p50_ms", "load//predict/rps"}
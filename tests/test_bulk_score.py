@@ -0,0 +1,70 @@
+# tests/test_bulk_score.py
+
+import sys
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.synthetic import generate
+from scripts.bulk_score import main
+
+
+# --- Test 1 : Le scoring en masse donne les scores du modèle et reprend après interruption ---
+def test_bulk_score_and_resume(tmp_path):
+    """
+    Teste que chaque client est scoré une seule fois, avec les mêmes scores
+    que le modèle, et qu'une relance ne recalcule que les paquets manquants.
+    """
+    import joblib
+
+    paths = generate(str(tmp_path), n_clients=300, n_features=12, n_estimators=5)
+    output = tmp_path / "scores"
+    argv = ["--db", paths["db_path"], "--model", paths["model_path"], "--output", str(output),
+            "--workers", "2", "--chunk-size", "64", "--engine", "lightgbm"]
+
+    summary = main(argv)
+    assert summary["scored"] == 300
+
+    scores = pd.read_parquet(output).sort_values("SK_ID_CURR")
+    assert scores["SK_ID_CURR"].tolist() == paths["client_ids"].tolist()
+    model = joblib.load(paths["model_path"])
+    conn = sqlite3.connect(paths["db_path"])
+    features = pd.read_sql("SELECT * FROM features ORDER BY SK_ID_CURR", conn)
+    conn.close()
+    expected = model.predict_proba(features[model.feature_name_].fillna(0))[:, 1]
+    np.testing.assert_allclose(scores["SCORE"], expected, rtol=1e-6)
+
+    # Interruption simulée : un paquet manque
+    parts = sorted(output.glob("part-*.parquet"))
+    parts[1].unlink()
+    summary = main(argv)
+    assert summary["scored"] == 64
+    assert summary["skipped"] == 300 - 64
+    assert len(pd.read_parquet(output)) == 300
+
+
+# --- Test 2 : Une colonne TEXT inutilisée par le modèle n'interrompt pas le scoring ---
+def test_bulk_score_with_text_column(tmp_path):
+    """
+    Teste qu'une colonne non numérique de la base (chaînes converties par
+    convert_to_sqlite.py) est ignorée comme dans l'API, sans changer les scores.
+    """
+    paths = generate(str(tmp_path), n_clients=100, n_features=6, n_estimators=5)
+    argv = ["--db", paths["db_path"], "--model", paths["model_path"], "--workers", "1",
+            "--chunk-size", "32", "--engine", "lightgbm"]
+    main(argv + ["--output", str(tmp_path / "before")])
+
+    conn = sqlite3.connect(paths["db_path"])
+    conn.execute("ALTER TABLE features ADD COLUMN NAME_CONTRACT_TYPE TEXT")
+    conn.execute("UPDATE features SET NAME_CONTRACT_TYPE = 'Cash loans'")
+    conn.commit()
+    conn.close()
+
+    assert main(argv + ["--output", str(tmp_path / "after")])["scored"] == 100
+    before = pd.read_parquet(tmp_path / "before").sort_values("SK_ID_CURR")
+    after = pd.read_parquet(tmp_path / "after").sort_values("SK_ID_CURR")
+    np.testing.assert_array_equal(after["SCORE"].to_numpy(), before["SCORE"].to_numpy())
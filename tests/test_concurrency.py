@@ -0,0 +1,66 @@
+# tests/test_concurrency.py
+
+import sys
+import os
+import asyncio
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.concurrency import EndpointLimiter, Overloaded
+
+
+# --- Test 1 : File pleine -> rejet immédiat (429) ---
+def test_limiter_rejects_when_queue_full():
+    """
+    Teste qu'avec un thread et une place dans la file, la troisième requête
+    simultanée est rejetée tout de suite avec un Retry-After.
+    """
+    limiter = EndpointLimiter("test", max_concurrency=1, max_queue=1, max_wait_ms=5000)
+    release = threading.Event()
+
+    async def scenario():
+        first = asyncio.ensure_future(limiter.run(release.wait, 5))
+        second = asyncio.ensure_future(limiter.run(lambda: "ok"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(Overloaded) as excinfo:
+            await limiter.run(lambda: "ko")
+        release.set()
+        return excinfo.value, await first, await second
+
+    error, first, second = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert error.retry_after >= 1
+    assert (first, second) == (True, "ok")
+    stats = limiter.stats()
+    assert stats["shed_queue_full"] == 1
+    assert stats["completed"] == 2
+    assert stats["queued"] == 0 and stats["running"] == 0
+    limiter.shutdown()
+
+
+# --- Test 2 : Attente trop longue -> rejet au moment d'être servie (503) ---
+def test_limiter_sheds_after_deadline():
+    """
+    Teste qu'une requête restée en file plus longtemps que le délai est
+    abandonnée sans être exécutée.
+    """
+    limiter = EndpointLimiter("test", max_concurrency=1, max_queue=4, max_wait_ms=20)
+    executed = []
+
+    async def scenario():
+        first = asyncio.ensure_future(limiter.run(time.sleep, 0.1))
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded) as excinfo:
+            await limiter.run(executed.append, "trop tard")
+        await first
+        return excinfo.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert executed == []
+    assert limiter.stats()["shed_deadline"] == 1
+    limiter.shutdown()
@@ -0,0 +1,60 @@
+# tests/test_convert_to_sqlite.py
+
+import sys
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.feature_store import SQLiteFeatureStore
+from scripts.convert_to_sqlite import build_feature_store
+
+
+def make_parquet(path, ids):
+    frame = pd.DataFrame({
+        "SK_ID_CURR": ids,
+        "TARGET": [0, 1] * (len(ids) // 2),
+        "AMT_CREDIT": np.linspace(1000.0, 2000.0, len(ids)),
+        "NAME_CONTRACT_TYPE": pd.Categorical(["Cash", "Revolving"] * (len(ids) // 2)),
+    })
+    frame.loc[3, "AMT_CREDIT"] = np.nan
+    frame.to_parquet(path, row_group_size=7)
+    return frame
+
+
+# --- Test 1 : La base construite par paquets est une table WITHOUT ROWID lisible par l'API ---
+def test_build_feature_store(tmp_path):
+    """
+    Teste que les lignes insérées batch par batch sont relues à l'identique
+    par le feature store de l'API, et que SK_ID_CURR est la clé primaire.
+    """
+    frame = make_parquet(tmp_path / "dataset.parquet", list(range(100040, 100000, -1)))
+    db_path = tmp_path / "feature_store.db"
+    timings, n_rows = build_feature_store(tmp_path / "dataset.parquet", db_path, batch_size=5, transaction_rows=10)
+    assert n_rows == 40
+    assert {"insert_s", "analyze_s", "vacuum_s", "total_s"} <= set(timings)
+    assert not os.path.exists(f"{db_path}.tmp")
+
+    conn = sqlite3.connect(db_path)
+    ddl = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'features'").fetchone()[0]
+    conn.close()
+    assert "WITHOUT ROWID" in ddl and "PRIMARY KEY" in ddl
+
+    store = SQLiteFeatureStore(db_path)
+    assert store.columns == list(frame.columns)
+    assert store.fetch_row(100037) == (100037, 1, None, "Revolving")
+    assert store.fetch_row(1) is None
+    store.close()
+
+
+# --- Test 2 : Un identifiant en double fait échouer la construction ---
+def test_build_rejects_duplicate_ids(tmp_path):
+    make_parquet(tmp_path / "dataset.parquet", [100002, 100003, 100003, 100004])
+    with pytest.raises(ValueError, match="SK_ID_CURR"):
+        build_feature_store(tmp_path / "dataset.parquet", tmp_path / "feature_store.db")
+    assert not os.path.exists(tmp_path / "feature_store.db")
+    assert not os.path.exists(tmp_path / "feature_store.db.tmp")
@@ -0,0 +1,75 @@
+# tests/test_create_prod_dataset.py
+
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.create_prod_dataset import optimize
+
+
+def make_dataset(path, n_rows=600):
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({
+        "SK_ID_CURR": np.arange(100002, 100002 + n_rows, dtype=np.int64),
+        "TARGET": rng.integers(0, 2, n_rows),
+        "CNT_CHILDREN": np.where(rng.random(n_rows) < 0.1, np.nan, rng.integers(0, 5, n_rows)),
+        "EXT_SOURCE_1": rng.random(n_rows),
+        "AMT_CREDIT": rng.normal(size=n_rows) * 1e6,
+        "NAME_CONTRACT_TYPE": rng.choice(["Cash loans", "Revolving loans"], n_rows),
+        "FREE_TEXT": [f"id-{i}" for i in range(n_rows)],
+    })
+    frame.to_parquet(path, index=False, row_group_size=100)
+    return frame
+
+
+# --- Test 1 : Chaque colonne reçoit le type le plus étroit qui conserve ses valeurs ---
+def test_optimize_types_and_report(tmp_path):
+    """
+    Teste la réécriture en flux : entiers réduits, flottants entiers en entiers
+    nullables, chaînes peu variées en catégories, float16 sous le seuil
+    d'erreur, groupes de lignes de la taille demandée et rapport par colonne.
+    """
+    frame = make_dataset(tmp_path / "final.parquet")
+    output = tmp_path / "optimized.parquet"
+    report, timings = optimize(tmp_path / "final.parquet", output, batch_size=70, row_group_size=250,
+                               float16_rtol=1e-3)
+    assert {"stats_s", "write_s"} <= set(timings)
+    assert not os.path.exists(f"{output}.tmp")
+
+    schema = pq.read_schema(output)
+    assert schema.field("SK_ID_CURR").type == pa.int32()
+    assert schema.field("TARGET").type == pa.int8()
+    assert schema.field("CNT_CHILDREN").type == pa.int8()
+    assert schema.field("EXT_SOURCE_1").type == pa.float16()
+    assert schema.field("AMT_CREDIT").type == pa.float32()  # hors de la plage du float16
+    assert pa.types.is_dictionary(schema.field("NAME_CONTRACT_TYPE").type)
+    assert schema.field("FREE_TEXT").type == pa.string()
+
+    metadata = pq.ParquetFile(output).metadata
+    assert [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)] == [250, 250, 100]
+
+    # Valeurs conservées (à l'arrondi mesuré près), manquants relus en Int8 nullable
+    optimized = pd.read_parquet(output)
+    assert str(optimized["CNT_CHILDREN"].dtype) == "Int8"
+    pd.testing.assert_series_equal(optimized["CNT_CHILDREN"].astype("float64"), frame["CNT_CHILDREN"])
+    assert (optimized["NAME_CONTRACT_TYPE"].astype(str) == frame["NAME_CONTRACT_TYPE"]).all()
+    assert (optimized["SK_ID_CURR"] == frame["SK_ID_CURR"]).all()
+
+    rows = {row["column"]: row for row in report}
+    assert rows["CNT_CHILDREN"]["missing"] == int(frame["CNT_CHILDREN"].isna().sum())
+    assert rows["NAME_CONTRACT_TYPE"]["distinct"] == 2
+    assert 0 < rows["EXT_SOURCE_1"]["max_rel_error"] <= 1e-3
+    ext_error = np.abs(optimized["EXT_SOURCE_1"].astype("float64") - frame["EXT_SOURCE_1"]).max()
+    assert np.isclose(rows["EXT_SOURCE_1"]["max_abs_error"], ext_error)
+    assert rows["TARGET"]["bytes_after"] * 8 == rows["TARGET"]["bytes_before"]
+    assert rows["FREE_TEXT"]["saved_pct"] == 0.0
+
+    # Sans seuil float16, les flottants s'arrêtent au float32
+    report, _ = optimize(tmp_path / "final.parquet", output)
+    assert {row["column"]: row["target_type"] for row in report}["EXT_SOURCE_1"] == "float"
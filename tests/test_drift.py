@@ -0,0 +1,239 @@
+# tests/test_drift.py
+
+import sys
+import os
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.drift import DriftMonitor, ReferenceProfile
+
+
+def make_profile(n_rows=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    income = rng.lognormal(11, 0.5, n_rows)
+    income[rng.random(n_rows) < 0.1] = np.nan
+    columns = {"AMT_INCOME_TOTAL": income, "FLAG_OWN_CAR": rng.integers(0, 2, n_rows).astype(float)}
+    return ReferenceProfile.from_columns(columns, n_bins=10, scores=rng.beta(2, 8, n_rows)), rng
+
+
+# --- Test 1 : Le profil se relit à l'identique et classe les lignes comme la référence ---
+def test_profile_roundtrip_and_compare(tmp_path):
+    """
+    Teste la persistance du profil, l'égalité des chemins ligne à ligne et
+    par lot, et des scores de dérive faibles pour la même distribution,
+    élevés pour une distribution décalée.
+    """
+    profile, rng = make_profile()
+    profile.save(tmp_path / "profile.json")
+    loaded = ReferenceProfile.load(tmp_path / "profile.json")
+    assert loaded.features == ["AMT_INCOME_TOTAL", "FLAG_OWN_CAR"]
+    np.testing.assert_array_equal(loaded.counts, profile.counts)
+    assert loaded.counts[0, -1] > 0  # revenus manquants de la référence
+    assert loaded.counts[1, :-1].sum() == 5000 and np.count_nonzero(loaded.counts[1]) == 2  # feature binaire
+
+    rows = np.column_stack([rng.lognormal(11, 0.5, 300), rng.integers(0, 2, 300)])
+    rows[:5, 0] = np.nan
+    rows[5, 0] = np.inf
+    by_row = sum(loaded.histogram(row[None, :]) for row in rows)
+    np.testing.assert_array_equal(by_row, loaded.histogram(rows))
+
+    same = loaded.compare(loaded.histogram(rows), loaded.score_histogram(rng.beta(2, 8, 300)))
+    assert same["drifted_features"] == 0
+    assert same["score"]["drifted"] is False
+
+    shifted = rows.copy()
+    shifted[:, 0] *= 3
+    report = loaded.compare(loaded.histogram(shifted), loaded.score_histogram(rng.beta(8, 2, 300)), top=1)
+    assert [item["feature"] for item in report["features"]] == ["AMT_INCOME_TOTAL"]
+    assert report["features"][0]["drifted"] and report["features"][0]["ks"] > 0.5
+    assert report["score"]["drifted"] is True
+
+
+# --- Test 2 : Les histogrammes en ligne sont cumulés par fenêtre de temps ---
+def test_monitor_windows():
+    """
+    Teste que seules les tranches de la fenêtre demandée sont additionnées,
+    que les tranches trop anciennes sont oubliées et que les colonnes sources
+    sont réalignées sur les features du profil.
+    """
+    profile, _ = make_profile()
+    now = [0.0]
+    monitor = DriftMonitor(profile, bucket_seconds=60, retention_seconds=600, clock=lambda: now[0])
+    source_columns = ["SK_ID_CURR", "FLAG_OWN_CAR", "AMT_INCOME_TOTAL"]
+
+    monitor.observe(source_columns, np.array([100001, 1.0, np.nan]), [0.1])
+    now[0] = 130.0
+    monitor.observe(source_columns, np.array([[100002, 0.0, 50000.0], [100003, 1.0, 60000.0]]), [0.2, 0.9])
+
+    counts, score_counts, rows = monitor.window_counts(60)
+    assert rows == 2
+    assert counts[1].sum() == 2 and counts[0, -1] == 0
+    counts, score_counts, rows = monitor.window_counts(600)
+    assert rows == 3
+    assert counts[0, -1] == 1  # revenu manquant de la première ligne
+    assert score_counts.sum() == 3
+
+    report = monitor.report(600, min_rows=10)
+    assert report["rows"] == 3 and report["enough_data"] is False
+    assert len(report["features"]) == 2
+
+    now[0] = 2000.0
+    monitor.observe(source_columns, np.array([100004, 1.0, 1.0]), [0.5])
+    assert monitor.stats()["buckets"] == 1
+    assert monitor.window_counts(600)[2] == 1
+
+
+# --- Test 3 : Le rapport de monitoring ne relit que les nouveaux segments ---
+def test_incremental_report(tmp_path):
+    """
+    Teste que le profil de référence est calculé une fois, que chaque passage
+    ne traite que les segments arrivés depuis le précédent et que la fusion
+    des statistiques couvre tout l'historique.
+    """
+    import pandas as pd
+    from app.prediction_log import PredictionLogWriter
+    from monitoring.generate_report import main, representative_frame
+
+    rng = np.random.default_rng(0)
+    reference = pd.DataFrame({"SK_ID_CURR": np.arange(2000), "AMT_CREDIT": rng.normal(5e5, 1e5, 2000),
+                              "CNT_CHILDREN": rng.integers(0, 4, 2000)})
+    reference.to_parquet(tmp_path / "reference.parquet", index=False)
+    columns = ["SK_ID_CURR", "AMT_CREDIT", "CNT_CHILDREN"]
+
+    def log_rows(n_rows, shift):
+        writer = PredictionLogWriter(segments_dir=tmp_path / "segments", flush_rows=50)
+        for i in range(n_rows):
+            row = np.array([i, rng.normal(5e5, 1e5) * shift, rng.integers(0, 4)], dtype=np.float64)
+            writer.log(columns, row, {"SK_ID_CURR": [i], "SCORE": [0.1], "PREDICTION": [0]})
+        writer.stop()
+
+    args = ["--reference", str(tmp_path / "reference.parquet"), "--model", "", "--workers", "1",
+            "--profile", str(tmp_path / "profile.json"), "--segments-dir", str(tmp_path / "segments"),
+            "--csv", str(tmp_path / "none.csv"), "--stats-dir", str(tmp_path / "stats"),
+            "--output", str(tmp_path / "report.json")]
+    log_rows(300, 1.0)
+    first = main(args)
+    assert first["rows"] == 300 and first["increment"]["segments"] == 1
+    assert first["drifted_features"] == 0
+
+    log_rows(300, 3.0)
+    second = main(args)
+    assert second["increment"]["segments"] == 1
+    assert second["rows"] == 600 and second["parts"] == 2
+    assert second["features"][0]["feature"] == "AMT_CREDIT" and second["features"][0]["drifted"]
+
+    # Rendu Evidently : données reconstruites à partir des seuls histogrammes
+    from app.drift import ReferenceProfile
+    profile = ReferenceProfile.load(tmp_path / "profile.json")
+    frame = representative_frame(profile, profile.counts, 500)
+    assert frame.shape == (500, 2)
+    assert abs(frame["CNT_CHILDREN"].mean() - reference["CNT_CHILDREN"].mean()) < 0.5
+
+
+# --- Test 4 : Les lignes du CSV écrites juste avant sa rotation sont comptées ---
+def test_csv_report_survives_rotation(tmp_path):
+    """
+    Teste que, lorsque l'API renomme le CSV (changement d'en-tête), la fin
+    du fichier renommé est lue et que ses statistiques sont conservées.
+    """
+    import pandas as pd
+    from monitoring.generate_report import main
+
+    rng = np.random.default_rng(0)
+    pd.DataFrame({"SK_ID_CURR": np.arange(1000), "AMT_CREDIT": rng.normal(5e5, 1e5, 1000)}).to_parquet(
+        tmp_path / "reference.parquet", index=False)
+    csv_path = tmp_path / "predictions_log.csv"
+
+    def rows(n_rows, extra=False):
+        frame = pd.DataFrame({"SK_ID_CURR": np.arange(n_rows), "AMT_CREDIT": rng.normal(5e5, 1e5, n_rows),
+                              "SCORE": 0.1})
+        if extra:
+            frame["MODEL_VERSION"] = "v2"
+        return frame
+
+    args = ["--reference", str(tmp_path / "reference.parquet"), "--model", "", "--workers", "1",
+            "--profile", str(tmp_path / "profile.json"), "--segments-dir", str(tmp_path / "segments"),
+            "--csv", str(csv_path), "--stats-dir", str(tmp_path / "stats"),
+            "--output", str(tmp_path / "report.json")]
+    rows(300).to_csv(csv_path, index=False)
+    assert main(args)["increment"]["csv_rows"] == 300
+
+    # 100 lignes ajoutées puis rotation par l'API (nouvel en-tête) avant le passage suivant
+    rows(100).to_csv(csv_path, mode="a", header=False, index=False)
+    os.replace(csv_path, tmp_path / "predictions_log.20250101T000000Z.csv")
+    rows(50, extra=True).to_csv(csv_path, index=False)
+    report = main(args)
+    assert report["increment"]["csv_rows"] == 150
+    assert report["rows"] == 450
+    assert main(args)["increment"]["csv_rows"] == 0
+
+
+# --- Test 5 : Les scores ne sont comparés qu'au modèle de la référence ---
+def test_scores_tied_to_model():
+    """
+    Teste que les scores sont comptés séparément pour chaque modèle et que
+    le PSI/KS du score n'est calculé que pour le modèle qui a scoré la
+    référence.
+    """
+    profile, _ = make_profile()
+    profile.metadata["model_fingerprint"] = "ancien"
+    monitor = DriftMonitor(profile)
+    source_columns = ["AMT_INCOME_TOTAL", "FLAG_OWN_CAR"]
+
+    monitor.observe(source_columns, np.array([[50000.0, 1.0], [60000.0, 0.0]]), [0.1, 0.2], "ancien")
+    monitor.observe(source_columns, np.array([70000.0, 1.0]), [0.9], "nouveau")
+
+    assert monitor.window_counts(600, "ancien")[1].sum() == 2
+    assert monitor.window_counts(600, "nouveau")[1].sum() == 1
+    assert monitor.window_counts(600)[1].sum() == 3
+
+    report = monitor.report(600, model_fingerprint="ancien")
+    assert report["score"]["comparable"] is True and "psi" in report["score"]
+
+    report = monitor.report(600, model_fingerprint="nouveau")
+    assert report["rows"] == 3  # les features ne dépendent pas du modèle
+    assert report["score"]["comparable"] is False
+    assert sum(report["score"]["histogram"]) == 1
+    assert "psi" not in report["score"] and "drifted" not in report["score"]
+
+
+# --- Test 6 : Les lignes écrites à la fois dans le CSV et les segments ne sont comptées qu'une fois ---
+def test_csv_and_segments_not_double_counted(tmp_path):
+    """
+    Teste que l'historique du CSV antérieur aux segments reste compté et que
+    les lignes du CSV déjà présentes dans les segments sont écartées (et
+    dénombrées dans le rapport).
+    """
+    import time
+    import pandas as pd
+    from app.prediction_log import PredictionLogWriter
+    from monitoring.generate_report import main
+
+    rng = np.random.default_rng(0)
+    pd.DataFrame({"SK_ID_CURR": np.arange(1000), "AMT_CREDIT": rng.normal(5e5, 1e5, 1000)}).to_parquet(
+        tmp_path / "reference.parquet", index=False)
+    csv_path = tmp_path / "predictions_log.csv"
+    columns = ["SK_ID_CURR", "AMT_CREDIT"]
+
+    def log_rows(n_rows, **destinations):
+        writer = PredictionLogWriter(flush_rows=50, **destinations)
+        for i in range(n_rows):
+            writer.log(columns, np.array([i, rng.normal(5e5, 1e5)]), {"SK_ID_CURR": [i], "SCORE": [0.1]})
+        writer.stop()
+
+    args = ["--reference", str(tmp_path / "reference.parquet"), "--model", "", "--workers", "1",
+            "--profile", str(tmp_path / "profile.json"), "--segments-dir", str(tmp_path / "segments"),
+            "--csv", str(csv_path), "--stats-dir", str(tmp_path / "stats"),
+            "--output", str(tmp_path / "report.json")]
+    log_rows(200, csv_path=csv_path)
+    assert main(args)["rows"] == 200
+
+    time.sleep(0.01)  # horodatages à la milliseconde
+    log_rows(100, csv_path=csv_path, segments_dir=tmp_path / "segments")
+    report = main(args)
+    assert report["increment"]["segments"] == 1
+    assert report["increment"]["csv_rows_excluded"] == 100
+    assert report["rows"] == 300
+    assert main(args)["rows"] == 300
@@ -0,0 +1,63 @@
+# tests/test_explanations.py
+
+import sys
+import os
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import pytest
+import shap
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.explanations import ShapStore, compute_shap_values, make_explainer, model_fingerprint
+
+
+@pytest.fixture(scope="module")
+def trained():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(500, 6)), columns=[f"FEAT_{i}" for i in range(6)])
+    y = (X["FEAT_0"] + rng.normal(size=500) > 0).astype(int)
+    model = lgb.LGBMClassifier(n_estimators=20, num_leaves=7, verbose=-1).fit(X, y)
+    return model, X.to_numpy()
+
+
+# --- Test 1 : Le magasin pré-calculé redonne les valeurs SHAP calculées à la volée ---
+def test_shap_store_matches_live_computation(trained, tmp_path):
+    model, X = trained
+    explainer = shap.TreeExplainer(model)
+    ids = np.arange(100002, 100002 + len(X))
+    chunks = ((ids[i:i + 128], X[i:i + 128]) for i in range(0, len(X), 128))
+
+    store = ShapStore.build(tmp_path / "shap_store", len(X), chunks, explainer,
+                            [f"FEAT_{i}" for i in range(6)], model_fingerprint(model),
+                            source_fingerprint="1000:1")
+    assert isinstance(store.shap_values, np.memmap)
+
+    base_value, live = compute_shap_values(explainer, X[10:11])
+    assert store.base_value == pytest.approx(base_value)
+    np.testing.assert_allclose(store.lookup(100012), live[0], atol=1e-5)
+    assert store.lookup(999) is None
+
+    # Un magasin calculé avec un autre modèle est ignoré
+    assert ShapStore.load(tmp_path / "shap_store", "autre-modele") is None
+    # ... de même qu'un magasin calculé sur une autre version du feature store
+    assert ShapStore.load(tmp_path / "shap_store", model_fingerprint(model), "2000:2") is None
+    assert ShapStore.load(tmp_path / "shap_store", model_fingerprint(model), "1000:1") is not None
+
+
+# --- Test 2 : Les contributions natives de LightGBM égalent celles de TreeExplainer ---
+def test_lightgbm_contrib_matches_tree_explainer(trained):
+    model, X = trained
+    rows = X[:50].copy()
+    rows[::7, 2] = np.nan
+
+    shap_base, shap_values = compute_shap_values(shap.TreeExplainer(model), rows)
+    lgb_base, lgb_values = compute_shap_values(make_explainer(model, "lightgbm"), rows)
+
+    assert lgb_base == pytest.approx(shap_base, abs=1e-6)
+    np.testing.assert_allclose(lgb_values, shap_values, atol=1e-6)
+    # Les contributions s'additionnent au score brut du modèle
+    np.testing.assert_allclose(lgb_base + lgb_values.sum(axis=1),
+                               model.predict(rows, raw_score=True), atol=1e-6)
@@ -0,0 +1,157 @@
+# tests/test_feature_store.py
+
+import sqlite3
+import sys
+import os
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.cache import LRUCache
+from app.feature_store import ArrayFeatureStore, CachedFeatureStore, SQLiteFeatureStore, VectorFeatureStore
+from app.preprocessing import fetch_source_row, fetch_source_rows, prepare_data_for_prediction
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """
+    Crée une petite base 'features' de test avec trois clients.
+    """
+    path = tmp_path / "feature_store.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE features (SK_ID_CURR INTEGER, AMT_CREDIT REAL, EXT_SOURCE_1 REAL)")
+    conn.executemany(
+        "INSERT INTO features VALUES (?, ?, ?)",
+        [(100001, 1000.0, 0.5), (100002, 2000.0, None), (100003, 3000.0, 0.7)],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+# --- Test 1 : Les connexions sont réutilisées d'une requête à l'autre ---
+def test_pool_reuses_connections(db_path):
+    store = SQLiteFeatureStore(db_path, pool_size=2)
+    for _ in range(5):
+        assert store.fetch_row(100001) == (100001, 1000.0, 0.5)
+
+    stats = store.stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] >= 5
+    assert stats["open_connections"] == 1
+
+
+# --- Test 2 : Les connexions sont bien en lecture seule ---
+def test_pool_is_read_only(db_path):
+    store = SQLiteFeatureStore(db_path, immutable=False)
+    with store.connection() as conn:
+        with pytest.raises(sqlite3.Error):
+            conn.execute("DELETE FROM features")
+
+
+# --- Test 3 : La préparation des données passe par le feature store ---
+def test_prepare_data_with_store(db_path):
+    store = SQLiteFeatureStore(db_path)
+    df = prepare_data_for_prediction(
+        client_id=100002,
+        new_loan_data={"SK_ID_CURR": 100002, "AMT_CREDIT": 5000.0, "UNKNOWN": 1},
+        db_path=db_path,
+        store=store,
+    )
+    assert df.columns.tolist() == ["SK_ID_CURR", "AMT_CREDIT", "EXT_SOURCE_1"]
+    assert df.loc[0, "AMT_CREDIT"] == 5000.0
+
+    with pytest.raises(ValueError):
+        prepare_data_for_prediction(100999, {"SK_ID_CURR": 100999}, db_path, store=store)
+
+
+# --- Test 4 : Le backend en mémoire est ordonné comme le modèle et persisté ---
+def test_array_store_build_and_mmap(db_path, tmp_path):
+    feature_names = ["EXT_SOURCE_1", "AMT_CREDIT", "NOT_IN_DB"]
+    store = ArrayFeatureStore.load_or_build(db_path, feature_names, tmp_path / "cache")
+
+    assert isinstance(store.matrix, np.memmap)
+    assert store.matrix.dtype == np.float32
+    assert store.missing_columns == ["NOT_IN_DB"]
+    np.testing.assert_array_equal(store.row_view(100003), np.array([0.7, 3000.0, np.nan], dtype=np.float32))
+    assert store.row_view(100999) is None
+
+    # Le second chargement relit le cache sans reconstruire la matrice
+    reloaded = ArrayFeatureStore.load(tmp_path / "cache", ArrayFeatureStore.fingerprint(db_path, feature_names))
+    assert reloaded is not None
+
+    df = prepare_data_for_prediction(100002, {"SK_ID_CURR": 100002, "AMT_CREDIT": 5000.0}, db_path, store=store)
+    assert df.loc[0, "SK_ID_CURR"] == 100002
+    assert df.loc[0, "AMT_CREDIT"] == 5000.0
+    assert np.isnan(df.loc[0, "EXT_SOURCE_1"])
+
+
+# --- Test 5 : Le cache sert les clients fréquents et suit le remplacement de la base ---
+def test_cached_store_invalidated_on_replace(db_path, tmp_path):
+    store = CachedFeatureStore(SQLiteFeatureStore(db_path), LRUCache(max_entries=2, ttl=60), check_interval=0)
+    assert store.fetch_row(100001) == (100001, 1000.0, 0.5)
+    assert store.fetch_row(100001) == (100001, 1000.0, 0.5)
+    store.fetch_row(100002)
+    store.fetch_row(100003)
+
+    stats = store.stats()["cache"]
+    assert stats["hits"] == 1
+    assert stats["evictions"] == 1
+
+    # Remplacement atomique du fichier de base par une nouvelle version
+    new_path = tmp_path / "new.db"
+    conn = sqlite3.connect(new_path)
+    conn.execute("CREATE TABLE features (SK_ID_CURR INTEGER, AMT_CREDIT REAL, EXT_SOURCE_1 REAL)")
+    conn.execute("INSERT INTO features VALUES (100001, 9999.0, 0.1)")
+    conn.commit()
+    conn.close()
+    os.replace(new_path, db_path)
+
+    assert store.fetch_row(100001) == (100001, 9999.0, 0.1)
+    assert store.stats()["cache"]["invalidations"] == 1
+
+
+# --- Test 6 : Les entrées expirent après le TTL ---
+def test_lru_cache_ttl():
+    now = [0.0]
+    cache = LRUCache(max_entries=10, ttl=5, clock=lambda: now[0])
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    now[0] = 6.0
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+# --- Test 7 : La table de vecteurs ne garde que les features du modèle, dans son ordre ---
+def test_vector_store_build_and_lookup(db_path, tmp_path):
+    feature_names = ["EXT_SOURCE_1", "AMT_CREDIT", "NOT_IN_DB"]
+    vectors_path = tmp_path / "feature_vectors.db"
+    assert VectorFeatureStore.build(db_path, feature_names, vectors_path, chunk_size=2) == 3
+
+    store = VectorFeatureStore(vectors_path)
+    assert store.columns == ["SK_ID_CURR"] + feature_names
+    assert store.missing_columns == ["NOT_IN_DB"]
+    assert store.source_fingerprint == ArrayFeatureStore.fingerprint(db_path, feature_names)
+
+    row = store.row_view(100003)
+    assert row.dtype == np.float32
+    np.testing.assert_array_equal(row, np.array([0.7, 3000.0, np.nan], dtype=np.float32))
+    assert store.row_view(100999) is None
+
+    # Lecture groupée : clients absents et doublons, dans l'ordre de la demande
+    rows, found = store.rows([100002, 100999, 100001, 100002])
+    assert found.tolist() == [True, False, True, True]
+    np.testing.assert_array_equal(rows[:, 1], np.array([2000.0, 1000.0, 2000.0], dtype=np.float32))
+
+    # Mêmes lignes que le backend en mémoire, par les fonctions de l'API
+    array_store = ArrayFeatureStore.load_or_build(db_path, feature_names)
+    np.testing.assert_array_equal(fetch_source_row(store, 100001), fetch_source_row(array_store, 100001))
+    source_rows, found = fetch_source_rows(store, [100003, 100001])
+    np.testing.assert_array_equal(source_rows, fetch_source_rows(array_store, [100003, 100001])[0])
+
+    df = prepare_data_for_prediction(100002, {"SK_ID_CURR": 100002, "AMT_CREDIT": 5000.0}, db_path, store=store)
+    assert df.loc[0, "AMT_CREDIT"] == 5000.0
+    assert np.isnan(df.loc[0, "EXT_SOURCE_1"])
+    assert store.stats()["backend"] == "vectors"
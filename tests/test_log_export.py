@@ -0,0 +1,99 @@
+# tests/test_log_export.py
+
+import sys
+import os
+import gzip
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.log_export import SegmentExport, compress_chunks, csv_chunks, negotiate_encoding, parse_range
+from app.prediction_log import PredictionLogWriter
+
+COLUMNS = ["SK_ID_CURR", "AMT_CREDIT"]
+
+
+# --- Test 1 : Intervalles Range et négociation de la compression ---
+def test_range_and_encoding():
+    """
+    Teste la lecture de l'en-tête Range (intervalle, suffixe, hors fichier)
+    et le choix de la compression.
+    """
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=0-5,10-20", 100) is None
+    with pytest.raises(ValueError):
+        parse_range("bytes=100-", 100)
+
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("gzip;q=0") is None
+    assert negotiate_encoding("gzip", requested="none") is None
+    data = b"".join(compress_chunks([b"a,b\n", b"1,2\n"], "gzip"))
+    assert gzip.decompress(data) == b"a,b\n1,2\n"
+
+
+# --- Test 2 : Pagination par curseur, filtres de colonnes et de dates ---
+def test_segment_export_cursor(tmp_path):
+    """
+    Teste que les pages successives (curseur + limite) couvrent chaque ligne
+    une seule fois, y compris les lignes écrites après le premier export.
+    """
+    writer = PredictionLogWriter(segments_dir=tmp_path, flush_rows=2, flush_interval=60)
+
+    def log(first, count):
+        for i in range(first, first + count):
+            writer.log(COLUMNS, np.array([100000.0 + i, 10.0 * i]), {"SCORE": [0.1]})
+        writer.flush(rotate=True)
+
+    def read(export):
+        return pd.read_csv(io.BytesIO(b"".join(csv_chunks(export))))
+
+    log(0, 5)
+    page = SegmentExport(tmp_path, columns=["SK_ID_CURR"], limit=3)
+    assert page.has_more
+    assert read(page)["SK_ID_CURR"].tolist() == [100000, 100001, 100002]
+
+    log(5, 2)
+    page = SegmentExport(tmp_path, cursor=page.next_cursor)
+    assert not page.has_more
+    rest = read(page)
+    assert rest["SK_ID_CURR"].tolist() == [100003, 100004, 100005, 100006]
+    assert list(rest.columns) == COLUMNS + ["SCORE", "TIMESTAMP"]
+
+    assert SegmentExport(tmp_path, cursor=page.next_cursor).rows == 0
+    assert SegmentExport(tmp_path, end="2000-01-01").rows == 0
+    assert SegmentExport(tmp_path, start="2000-01-01").rows == 7
+    writer.stop()
+
+
+# --- Test 3 : Un segment renommé après un segment au nom plus récent n'est pas sauté ---
+def test_segment_export_out_of_order_segments(tmp_path):
+    """
+    Teste que deux workers qui ferment leurs segments presque en même temps
+    peuvent les rendre visibles dans l'ordre inverse de leurs noms sans que
+    le curseur ne saute le premier.
+    """
+    from datetime import datetime, timezone
+    from app.prediction_log import segment_time_prefix
+
+    prefix = segment_time_prefix(datetime.now(timezone.utc))
+
+    def write_segment(name, ids):
+        frame = pd.DataFrame({"SK_ID_CURR": ids, "TIMESTAMP": ["2025-01-01T00:00:00.000+00:00"] * len(ids)})
+        frame.to_parquet(tmp_path / name, index=False)
+
+    write_segment(f"{prefix}-2.parquet", [3, 4])
+    page = SegmentExport(tmp_path)
+    assert page.rows == 2
+
+    # Le segment du premier worker apparaît ensuite, avec un nom antérieur
+    write_segment(f"{prefix}-1.parquet", [1, 2])
+    page = SegmentExport(tmp_path, cursor=page.next_cursor)
+    assert page.rows == 2
+    assert pd.read_csv(io.BytesIO(b"".join(csv_chunks(page))))["SK_ID_CURR"].tolist() == [1, 2]
+    assert SegmentExport(tmp_path, cursor=page.next_cursor).rows == 0
@@ -57,4 +57,234 @@ def test_predict_missing_data():
     }
 
     response = client.post("/predict", json=incomplete_data)
-    assert response.status_code == 422
\ No newline at end of file
+    assert response.status_code == 422
+
+# --- Test 4 : Vérifier le scoring par lot ---
+def test_predict_batch():
+    """
+    Teste l'endpoint /predict_batch : mêmes scores que /predict, dans l'ordre,
+    et un client inconnu signalé sans faire échouer le lot.
+    """
+    client_data = {
+        "SK_ID_CURR": 100025,
+        "AMT_CREDIT": 1132573.5,
+        "AMT_INCOME_TOTAL": 202500,
+        "AMT_ANNUITY": 37561.5,
+        "DAYS_BIRTH": -14815,
+        "DAYS_EMPLOYED": -1652
+    }
+    unknown_client = dict(client_data, SK_ID_CURR=999999999)
+
+    single = client.post("/predict", json=client_data).json()
+    response = client.post("/predict_batch", json=[client_data, unknown_client, client_data])
+    assert response.status_code == 200
+    results = response.json()["results"]
+
+    assert [item["SK_ID_CURR"] for item in results] == [100025, 999999999, 100025]
+    assert abs(results[0]["score"] - single["score"]) < 1e-9
+    assert results[0]["prediction"] == single["prediction"]
+    assert results[1]["score"] is None
+    assert results[1]["error"]
+
+
+# --- Test 5 : Vérifier les explications SHAP par lot avec top-k ---
+def test_shap_explanation_batch_top_k():
+    """
+    Teste l'endpoint /shap_explanation_batch : les valeurs top-k sont celles de
+    l'explication complète, et les clients inconnus sont listés à part.
+    """
+    full = client.get("/shap_explanation/100025").json()
+
+    response = client.post("/shap_explanation_batch",
+                           json={"client_ids": [100025, 999999999], "top_k": 5})
+    assert response.status_code == 200
+    json_response = response.json()
+    assert json_response["not_found"] == [999999999]
+    assert json_response["feature_names"] == full["feature_names"]
+
+    explanation = json_response["explanations"][0]
+    assert len(explanation["shap_values"]) == 5
+    for index, value in zip(explanation["feature_indices"], explanation["shap_values"]):
+        assert abs(full["shap_values"][index] - value) < 1e-5
+    magnitudes = [abs(value) for value in explanation["shap_values"]]
+    assert magnitudes == sorted(magnitudes, reverse=True)
+    assert magnitudes[0] == max(abs(value) for value in full["shap_values"])
+
+
+# --- Test 6 : Vérifier la sonde de disponibilité ---
+def test_ready_after_startup():
+    """
+    Teste l'endpoint /ready : une fois le chargement en arrière-plan terminé,
+    l'API est prête et chaque phase du démarrage a été chronométrée.
+    """
+    from app.main import startup
+    assert startup.wait(timeout=60)
+
+    response = client.get("/ready")
+    assert response.status_code == 200
+    report = response.json()
+    assert report["ready"] is True
+    assert report["error"] is None
+    assert "modèle" in report["timings_ms"]
+    assert "chauffe" in report["timings_ms"]
+
+
+# --- Test 7 : Vérifier l'exposition des métriques Prometheus ---
+def test_metrics_endpoint():
+    """
+    Teste l'endpoint /metrics : après une prédiction et une erreur 404, les
+    durées par étape de /predict et le compteur d'erreurs sont exposés.
+    """
+    client_data = {
+        "SK_ID_CURR": 100025,
+        "AMT_INCOME_TOTAL": 202500.0,
+        "AMT_CREDIT": 1293502.5,
+        "AMT_ANNUITY": 35698.5,
+        "DAYS_BIRTH": -10000,
+        "DAYS_EMPLOYED": -2000
+    }
+    assert client.post("/predict", json=client_data).status_code == 200
+    assert client.get("/shap_explanation/999999999").status_code == 404
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    for stage in ("fetch", "align", "score", "log"):
+        assert f'scoring_api_stage_duration_seconds_count{{endpoint="predict",stage="{stage}"}}' in text
+    assert 'scoring_api_errors_total{route="/shap_explanation/{client_id}",status="404"}' in text
+    assert 'scoring_api_requests_in_flight{route="/metrics"} 1' in text
+
+
+# --- Test 8 : Vérifier l'explication SHAP au format Arrow (en-tête Accept) ---
+def test_shap_explanation_arrow():
+    """
+    Teste que l'en-tête Accept sélectionne le flux Arrow IPC, avec les mêmes
+    valeurs que la réponse JSON par défaut.
+    """
+    import pyarrow as pa
+
+    full = client.get("/shap_explanation/100025")
+    assert full.headers["content-type"].startswith("application/json")
+    full = full.json()
+
+    response = client.get("/shap_explanation/100025",
+                          headers={"Accept": "application/vnd.apache.arrow.stream"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/vnd.apache.arrow.stream")
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column("SK_ID_CURR").to_pylist() == [100025]
+    shap_values = table.column("shap_values").to_pylist()[0]
+    assert max(abs(a - b) for a, b in zip(shap_values, full["shap_values"])) < 1e-5
+
+
+# --- Test 9 : Vérifier le rechargement à chaud du modèle ---
+def test_model_reload():
+    """
+    Teste que POST /model/reload remplace le modèle courant sans interrompre
+    le service, et que la nouvelle version est renvoyée avec les prédictions.
+    """
+    from app.main import registry
+
+    client_data = {
+        "SK_ID_CURR": 100025,
+        "AMT_CREDIT": 1132573.5,
+        "AMT_INCOME_TOTAL": 202500,
+        "AMT_ANNUITY": 37561.5,
+        "DAYS_BIRTH": -14815,
+        "DAYS_EMPLOYED": -1652
+    }
+    before = client.post("/predict", json=client_data).json()
+
+    assert client.post("/model/reload", json={"file_name": "../app/main.py"}).status_code == 400
+    response = client.post("/model/reload", json={"version": "v-test"})
+    assert response.status_code == 202
+    assert registry.reload.wait(timeout=60)
+
+    info = client.get("/model").json()
+    assert info["reload"]["error"] is None
+    assert info["current"]["version"] == "v-test"
+    after = client.post("/predict", json=client_data).json()
+    assert after["model_version"] == "v-test"
+    assert abs(after["score"] - before["score"]) < 1e-9
+
+
+# --- Test 10 : Vérifier l'export du journal (Range, curseur) ---
+def test_download_logs_range_and_cursor():
+    """
+    Teste qu'une requête Range reçoit une partie du CSV (206) et que l'export
+    filtré renvoie un curseur qui ne redonne pas les lignes déjà reçues.
+    """
+    client_data = {
+        "SK_ID_CURR": 100025,
+        "AMT_CREDIT": 1132573.5,
+        "AMT_INCOME_TOTAL": 202500,
+        "AMT_ANNUITY": 37561.5,
+        "DAYS_BIRTH": -14815,
+        "DAYS_EMPLOYED": -1652
+    }
+    assert client.post("/predict", json=client_data).status_code == 200
+
+    response = client.get("/download_logs", headers={"Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.content == b"SK_ID_CURR"
+
+    # Seuls les segments fermés sont exportés : on force ici la rotation
+    import app.main as main
+    main.prediction_log.flush(rotate=True)
+    response = client.get("/download_logs", params={"columns": "SK_ID_CURR,MODEL_VERSION"})
+    assert response.status_code == 200
+    assert response.text.splitlines()[0] == '"SK_ID_CURR","MODEL_VERSION"'
+    cursor = response.headers["X-Next-Cursor"]
+
+    assert client.post("/predict", json=client_data).status_code == 200
+    response = client.get("/download_logs", params={"cursor": cursor})
+    assert response.headers["X-Row-Count"] == "0"
+    main.prediction_log.flush(rotate=True)
+    response = client.get("/download_logs", params={"cursor": cursor})
+    assert response.headers["X-Row-Count"] == "1"
+    assert client.get("/download_logs", params={"start": "hier"}).status_code == 400
+
+
+# --- Test 11 : Vérifier le suivi de la dérive en ligne ---
+def test_drift_endpoint():
+    """
+    Teste que les prédictions alimentent les histogrammes de dérive et que
+    GET /drift renvoie PSI et KS par feature et pour le score.
+    """
+    import sqlite3
+    import numpy as np
+    import app.main as main
+    from app.drift import DriftMonitor, ReferenceProfile
+
+    conn = sqlite3.connect(main.DATA_PATH)
+    names = ["AMT_CREDIT", "AMT_INCOME_TOTAL", "DAYS_BIRTH"]
+    rows = np.array(conn.execute(f"SELECT {', '.join(names)} FROM features").fetchall(), dtype=np.float64)
+    conn.close()
+    profile = ReferenceProfile.from_columns(dict(zip(names, rows.T)), scores=np.linspace(0, 0.3, len(rows)),
+                                            metadata={"model_fingerprint": main.registry.current.fingerprint})
+
+    previous = main.drift_monitor
+    main.drift_monitor = DriftMonitor(profile)
+    try:
+        client_data = {
+            "SK_ID_CURR": 100025,
+            "AMT_CREDIT": 1132573.5,
+            "AMT_INCOME_TOTAL": 202500,
+            "AMT_ANNUITY": 37561.5,
+            "DAYS_BIRTH": -14815,
+            "DAYS_EMPLOYED": -1652
+        }
+        assert client.post("/predict", json=client_data).status_code == 200
+        assert client.post("/predict_batch", json=[client_data, dict(client_data, SK_ID_CURR=100002)]).status_code == 200
+
+        report = client.get("/drift", params={"top": 2}).json()
+        assert report["rows"] == 3
+        assert report["features_monitored"] == 3
+        assert len(report["features"]) == 2
+        assert {"psi", "ks", "null_rate", "reference_null_rate", "drifted"} <= set(report["features"][0])
+        assert sum(report["score"]["histogram"]) == 3
+        assert report["score"]["comparable"] is True and "psi" in report["score"]
+        assert client.get("/drift", params={"window": 10 ** 9}).status_code == 400
+    finally:
+        main.drift_monitor = previous
@@ -0,0 +1,63 @@
+# tests/test_metrics.py
+
+import sys
+import os
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.metrics import Registry
+from app.profiling import SamplingProfiler
+
+
+# --- Test 1 : Rendu au format texte de Prometheus ---
+def test_registry_render():
+    """
+    Teste que les histogrammes sont cumulatifs (avec +Inf, _sum et _count) et
+    que les valeurs des labels sont échappées.
+    """
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latence.", ("route",), buckets=(0.1, 1.0))
+    counter = registry.counter("errors_total", "Erreurs.", ("route",))
+    for value in (0.05, 0.5, 2.0):
+        histogram.observe(value, ("/predict",))
+    counter.inc(('say "hi"',))
+
+    lines = registry.render().splitlines()
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{route="/predict",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/predict",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{route="/predict",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{route="/predict"} 3' in lines
+    assert 'errors_total{route="say \\"hi\\""} 1' in lines
+
+
+# --- Test 2 : Le profileur échantillonne les threads actifs ---
+def test_sampling_profiler():
+    """
+    Teste que le profileur, démarré et arrêté à chaud, relève les piles d'un
+    thread occupé au format collapsed.
+    """
+    stop = threading.Event()
+
+    def busy_loop():
+        while not stop.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=busy_loop)
+    worker.start()
+    profiler = SamplingProfiler(interval_ms=1)
+    try:
+        profiler.start()
+        time.sleep(0.2)
+        collapsed = profiler.stop()
+    finally:
+        stop.set()
+        worker.join()
+
+    assert not profiler.running
+    assert profiler.stats()["samples"] > 0
+    assert "busy_loop" in collapsed
+    stack, count = collapsed.splitlines()[0].rsplit(" ", 1)
+    assert int(count) > 0
@@ -0,0 +1,61 @@
+# tests/test_prediction_log.py
+
+import sys
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.prediction_log import PredictionLogWriter, list_segments, read_segments
+
+COLUMNS = ["SK_ID_CURR", "AMT_CREDIT"]
+
+
+# --- Test 1 : Les lignes sont écrites par paquets dans le CSV et les segments ---
+def test_writer_flushes_csv_and_segments(tmp_path):
+    writer = PredictionLogWriter(
+        csv_path=tmp_path / "predictions_log.csv",
+        segments_dir=tmp_path / "segments",
+        flush_rows=1000, flush_interval=60, segment_max_rows=3,
+    )
+    for i in range(5):
+        writer.log(COLUMNS, np.array([100000.0 + i, 10.0 * i]), {"SCORE": [0.1 * i], "PREDICTION": [0]})
+    writer.flush(rotate=True)
+    writer.stop()
+
+    csv = pd.read_csv(tmp_path / "predictions_log.csv")
+    assert len(csv) == 5
+    assert csv.columns.tolist() == COLUMNS + ["SCORE", "PREDICTION", "TIMESTAMP"]
+
+    assert len(list_segments(tmp_path / "segments")) == 1
+    segments = read_segments(tmp_path / "segments")
+    np.testing.assert_allclose(segments["AMT_CREDIT"], [0.0, 10.0, 20.0, 30.0, 40.0])
+    assert writer.stats()["rows_written"] == 5
+
+
+# --- Test 2 : Avec la politique 'drop', une file pleine rejette les lignes ---
+def test_writer_drop_policy(tmp_path):
+    release = threading.Event()
+    writing = threading.Event()
+
+    class SlowWriter(PredictionLogWriter):
+        def _write(self, items):
+            writing.set()
+            release.wait(5)
+            super()._write(items)
+
+    writer = SlowWriter(csv_path=tmp_path / "log.csv", queue_size=1, flush_rows=1, backpressure="drop")
+    writer.log(COLUMNS, np.zeros(2))
+    writing.wait(5)                      # le thread d'écriture est occupé
+    writer.log(COLUMNS, np.zeros(2))     # occupe l'unique place de la file
+    writer.log(COLUMNS, np.zeros(2))     # rejetée
+    release.set()
+    writer.stop()
+
+    stats = writer.stats()
+    assert stats["rows_dropped"] == 1
+    assert stats["rows_written"] == 2
+    assert len(pd.read_csv(tmp_path / "log.csv")) == 2
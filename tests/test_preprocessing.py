@@ -0,0 +1,94 @@
+# tests/test_preprocessing.py
+
+import sqlite3
+import sys
+import os
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.feature_store import SQLiteFeatureStore
+from app.models import NewLoanRequest
+from app.preprocessing import ColumnPlan, fetch_source_row, fetch_source_rows, prepare_data_for_prediction
+
+
+@pytest.fixture
+def store(tmp_path):
+    """
+    Base de test dont le schéma diffère de celui du modèle : une colonne
+    inutilisée (TARGET) et une feature du modèle absente (EXT_SOURCE_3).
+    """
+    path = tmp_path / "feature_store.db"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE features (SK_ID_CURR INTEGER, TARGET INTEGER, AMT_CREDIT REAL, "
+        "AMT_ANNUITY REAL, EXT_SOURCE_1 REAL, DAYS_BIRTH INTEGER)"
+    )
+    conn.execute("INSERT INTO features VALUES (100002, 1, 406597.5, 24700.5, NULL, -9461)")
+    conn.commit()
+    conn.close()
+    return SQLiteFeatureStore(path)
+
+
+FEATURE_NAMES = ["EXT_SOURCE_3", "DAYS_BIRTH", "AMT_CREDIT", "EXT_SOURCE_1", "AMT_ANNUITY"]
+
+
+# --- Test 1 : Les écarts de schéma sont détectés à la construction du plan ---
+def test_column_plan_reports_schema_mismatch(store):
+    plan = ColumnPlan(store.columns, FEATURE_NAMES, NewLoanRequest.model_fields)
+    assert plan.missing_features == ["EXT_SOURCE_3"]
+    assert plan.unused_columns == ["TARGET"]
+    assert "AMT_CREDIT" in plan.override_positions
+    assert "AMT_INCOME_TOTAL" not in plan.override_positions
+
+
+# --- Test 2 : Le plan donne la même ligne que l'ancien chemin pandas ---
+def test_column_plan_matches_dataframe_path(store):
+    new_loan_data = {
+        "SK_ID_CURR": 100002, "AMT_CREDIT": 500000.0, "AMT_INCOME_TOTAL": 202500.0,
+        "AMT_ANNUITY": None, "DAYS_BIRTH": -10000, "DAYS_EMPLOYED": -637, "CNT_CHILDREN": None,
+    }
+    expected = prepare_data_for_prediction(100002, new_loan_data, store.db_path, store=store)
+    expected = expected.fillna(0).reindex(columns=FEATURE_NAMES, fill_value=0)
+
+    plan = ColumnPlan(store.columns, FEATURE_NAMES, NewLoanRequest.model_fields)
+    source_row = fetch_source_row(store, 100002)
+    plan.apply_overrides(source_row, new_loan_data)
+    model_rows = plan.to_model_rows(source_row)
+
+    assert model_rows.shape == (1, len(FEATURE_NAMES))
+    np.testing.assert_array_equal(model_rows[0], expected.iloc[0].to_numpy(dtype=np.float64))
+
+
+# --- Test 3 : Une colonne TEXT de la base ne transforme pas la requête en 404 ---
+def test_fetch_source_row_with_text_column(tmp_path):
+    """
+    Teste qu'une colonne non numérique inutilisée par le modèle devient NaN,
+    et qu'une valeur non numérique dans une feature du modèle lève
+    RuntimeError (erreur serveur) plutôt que ValueError (client inconnu).
+    """
+    path = tmp_path / "feature_store.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE features (SK_ID_CURR INTEGER, NAME_CONTRACT_TYPE TEXT, AMT_CREDIT REAL)")
+    conn.execute("INSERT INTO features VALUES (100002, 'Cash loans', 406597.5)")
+    conn.execute("INSERT INTO features VALUES (100003, 'Revolving loans', 'inconnu')")
+    conn.commit()
+    conn.close()
+    store = SQLiteFeatureStore(path)
+
+    plan = ColumnPlan(store.columns, ["AMT_CREDIT"], NewLoanRequest.model_fields)
+    source_row = fetch_source_row(store, 100002, plan)
+    assert source_row[0] == 100002 and np.isnan(source_row[1]) and source_row[2] == 406597.5
+    source_rows, found = fetch_source_rows(store, [100002, 999], plan)
+    np.testing.assert_array_equal(source_rows, source_row[None, :])
+    assert found.tolist() == [True, False]
+
+    with pytest.raises(RuntimeError):
+        fetch_source_row(store, 100003, plan)
+    with pytest.raises(RuntimeError):
+        fetch_source_row(store, 100002)
+    with pytest.raises(ValueError):
+        fetch_source_row(store, 999, plan)
+    store.close()
@@ -0,0 +1,108 @@
+# tests/test_registry.py
+
+import sys
+import os
+import threading
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.batching import MicroBatcherStopped
+from app.registry import ModelBundle, ModelRegistry
+
+
+class FakeBundle:
+    def __init__(self, version):
+        self.version = version
+        self.fingerprint = f"fp-{version}"
+        self.closed = threading.Event()
+
+    def close(self):
+        self.closed.set()
+
+    def info(self):
+        return {"version": self.version}
+
+
+# --- Test 1 : L'échange remplace le modèle courant et ferme l'ancien après le délai de grâce ---
+def test_swap_closes_previous_after_grace():
+    """
+    Teste que swap() change le modèle courant tout de suite, mais ne ferme
+    l'ancien qu'après 'grace_seconds'.
+    """
+    registry = ModelRegistry(grace_seconds=0.05)
+    first, second = FakeBundle("v1"), FakeBundle("v2")
+    assert registry.swap(first) is None
+    assert registry.swap(second) is first
+    assert registry.current is second
+    assert not first.closed.is_set()
+    assert first.closed.wait(timeout=5)
+    assert [entry["version"] for entry in registry.history] == ["v1", "v2"]
+
+
+# --- Test 2 : Un seul rechargement à la fois, un échec garde le modèle courant ---
+def test_reload_in_background():
+    """
+    Teste qu'un second rechargement est refusé tant que le premier tourne,
+    et qu'un chargeur en erreur laisse le modèle courant en place.
+    """
+    registry = ModelRegistry(grace_seconds=0)
+    registry.swap(FakeBundle("v1"))
+    release = threading.Event()
+
+    def slow_loader(tracker):
+        release.wait(5)
+        return FakeBundle("v2")
+
+    assert registry.reload_in_background(slow_loader)
+    assert not registry.reload_in_background(slow_loader)
+    release.set()
+    assert registry.reload.wait(timeout=5)
+    assert registry.current.version == "v2"
+
+    def broken_loader(tracker):
+        with tracker.phase("modèle"):
+            raise ValueError("modèle incompatible")
+
+    assert registry.reload_in_background(broken_loader)
+    assert registry.reload.wait(timeout=5)
+    assert registry.current.version == "v2"
+    assert "incompatible" in registry.stats()["reload"]["error"]
+
+
+class FakeBooster:
+    def predict(self, rows):
+        return np.asarray(rows, dtype=np.float64).sum(axis=1)
+
+
+class FakeModel:
+    feature_name_ = ["a", "b"]
+    booster_ = FakeBooster()
+
+
+# --- Test 3 : Une requête qui tient l'ancien bundle aboutit après l'arrêt de son micro-batcher ---
+def test_swap_with_micro_batching():
+    """
+    Teste qu'une fois l'ancien bundle fermé, son micro-batcher refuse les
+    nouvelles lignes au lieu de les laisser sans consommateur, et que
+    score_one() retombe sur le calcul direct plutôt que d'attendre.
+    """
+    registry = ModelRegistry(grace_seconds=0.01)
+    old = ModelBundle(FakeModel(), "v1", "fp-v1")
+    old.enable_micro_batching(max_batch_size=8, max_wait_ms=1.0, timeout=2.0)
+    registry.swap(old)
+    assert old.score_one(np.array([[1.0, 2.0]])) == 3.0
+
+    new = ModelBundle(FakeModel(), "v2", "fp-v2")
+    new.enable_micro_batching(max_batch_size=8, max_wait_ms=1.0, timeout=2.0)
+    registry.swap(new)
+    old.micro_batcher._worker.join(timeout=5)
+    assert not old.micro_batcher._worker.is_alive()
+
+    with pytest.raises(MicroBatcherStopped):
+        old.micro_batcher.submit(np.array([[1.0, 2.0]]))
+    assert old.score_one(np.array([[1.0, 2.0]])) == 3.0
+    assert registry.current.score_one(np.array([[2.0, 2.0]])) == 4.0
+    new.close()
@@ -0,0 +1,50 @@
+# tests/test_serialization.py
+
+import sys
+import os
+import json
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import serialization
+from app.explanations import ARROW_MEDIA_TYPE
+from app.serialization import JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, negotiate
+
+
+# --- Test 1 : Choix du format selon l'en-tête Accept ---
+def test_negotiate_accept_header():
+    """
+    Teste que les préférences 'q' sont respectées et que JSON reste le
+    format par défaut (sans en-tête, '*/*' ou type non proposé).
+    """
+    offered = [JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, ARROW_MEDIA_TYPE]
+    assert negotiate(None, offered) == JSON_MEDIA_TYPE
+    assert negotiate("*/*", offered) == JSON_MEDIA_TYPE
+    assert negotiate("text/html", offered) == JSON_MEDIA_TYPE
+    assert negotiate(ARROW_MEDIA_TYPE, offered) == ARROW_MEDIA_TYPE
+    assert negotiate(f"application/json;q=0.5, {ARROW_MEDIA_TYPE}", offered) == ARROW_MEDIA_TYPE
+    assert negotiate("application/x-msgpack, application/json;q=0.9", offered) == MSGPACK_MEDIA_TYPE
+    # MessagePack non installé : il n'est pas proposé
+    assert negotiate("application/msgpack", [JSON_MEDIA_TYPE, ARROW_MEDIA_TYPE]) == JSON_MEDIA_TYPE
+
+
+# --- Test 2 : Les tableaux NumPy sont encodés comme leurs listes ---
+def test_dumps_json_numpy(monkeypatch):
+    """
+    Teste que l'encodage direct des tableaux donne le même JSON que .tolist(),
+    avec orjson comme avec le module json standard.
+    """
+    content = {
+        "base_value": -1.25,
+        "shap_values": np.array([0.1, -0.2, 3.5e-7]),
+        "feature_indices": np.array([2, 0, 1], dtype=np.int64),
+        "rows": np.arange(6, dtype=np.float32).reshape(2, 3)[:, 1],  # non contigu
+        "count": np.int64(3),
+    }
+    expected = {key: value.tolist() if hasattr(value, "tolist") else value for key, value in content.items()}
+
+    assert json.loads(serialization.dumps_json(content)) == expected
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert json.loads(serialization.dumps_json(content)) == expected
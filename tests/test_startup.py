@@ -0,0 +1,53 @@
+# tests/test_startup.py
+
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.startup import StartupTracker
+
+
+# --- Test 1 : Un chargement réussi rend l'API prête ---
+def test_background_loading_ready():
+    """
+    Teste que les phases exécutées dans le thread de fond sont chronométrées
+    et que l'API n'est prête qu'à la fin du chargement.
+    """
+    startup = StartupTracker()
+    assert not startup.ready.is_set()
+    assert startup.report()["phase"] == "en attente"
+
+    def load():
+        with startup.phase("modèle"):
+            pass
+        with startup.phase("chauffe"):
+            pass
+
+    startup.run_in_background(load).join(timeout=5)
+    assert startup.wait(timeout=5)
+    report = startup.report()
+    assert report["ready"] is True
+    assert report["phase"] == "prêt"
+    assert list(report["timings_ms"]) == ["modèle", "chauffe"]
+
+
+# --- Test 2 : Une erreur de chargement termine le démarrage sans le rendre prêt ---
+def test_background_loading_error():
+    """
+    Teste qu'une exception pendant le chargement est rapportée : le démarrage
+    est terminé (les requêtes n'attendent plus) mais l'API n'est pas prête.
+    """
+    startup = StartupTracker()
+
+    def load():
+        with startup.phase("modèle"):
+            raise FileNotFoundError("model.pkl")
+
+    startup.run_in_background(load).join(timeout=5)
+    assert startup.wait(timeout=5)
+    report = startup.report()
+    assert report["ready"] is False
+    assert report["phase"] == "erreur"
+    assert "model.pkl" in report["error"]
+    assert "modèle" in report["timings_ms"]
@@ -0,0 +1,65 @@
+# tests/test_tree_engine.py
+
+import sys
+import os
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.tree_engine import TreeEnsemble
+
+
+@pytest.fixture(scope="module")
+def trained():
+    """
+    Petit modèle LightGBM entraîné sur des données avec valeurs manquantes et
+    zéros, pour couvrir les différentes règles de direction par défaut.
+    """
+    rng = np.random.default_rng(42)
+    n = 2000
+    X = pd.DataFrame(rng.normal(size=(n, 8)), columns=[f"FEAT_{i}" for i in range(8)])
+    X.iloc[rng.random(n) < 0.15, 0] = np.nan
+    X.iloc[rng.random(n) < 0.30, 1] = 0.0
+    X["FEAT_2"] = rng.integers(0, 5, n)
+    y = ((X["FEAT_0"].fillna(1) + X["FEAT_1"] - 0.3 * X["FEAT_2"] + rng.normal(size=n)) > 0).astype(int)
+    model = lgb.LGBMClassifier(n_estimators=60, num_leaves=15, verbose=-1).fit(X, y)
+    return model, X
+
+
+# --- Test 1 : Parité avec predict_proba (lot et ligne seule) ---
+def test_tree_engine_matches_predict_proba(trained):
+    model, X = trained
+    engine = TreeEnsemble.from_booster(model)
+    assert engine.num_trees == model.booster_.num_trees()
+
+    expected = model.predict_proba(X)[:, 1]
+    np.testing.assert_allclose(engine.predict(X.to_numpy()), expected, atol=1e-6)
+    np.testing.assert_allclose(engine.predict(X.to_numpy()[0]), expected[:1], atol=1e-6)
+
+
+# --- Test 2 : Parité sur des lignes entièrement manquantes ou nulles ---
+def test_tree_engine_missing_values(trained):
+    model, X = trained
+    engine = TreeEnsemble.from_booster(model)
+    rows = np.vstack([np.full(X.shape[1], np.nan), np.zeros(X.shape[1])])
+    expected = model.booster_.predict(rows)
+    np.testing.assert_allclose(engine.predict(rows), expected, atol=1e-6)
+
+
+# --- Test 3 : Les arbres compilés sont persistés et relus en mmap ---
+def test_tree_engine_save_and_load(trained, tmp_path):
+    model, X = trained
+    engine = TreeEnsemble.from_booster(model)
+    engine.save(tmp_path / "engine", fingerprint="abc")
+
+    # Un autre modèle (empreinte différente) ne réutilise pas les tableaux
+    assert TreeEnsemble.load(tmp_path / "engine", fingerprint="autre") is None
+
+    shared = TreeEnsemble.load(tmp_path / "engine", fingerprint="abc")
+    assert isinstance(shared.threshold, np.memmap)
+    assert not shared.threshold.flags.writeable
+    np.testing.assert_allclose(shared.predict(X.to_numpy()), engine.predict(X.to_numpy()))